@@ -0,0 +1,121 @@
+# arrivals.py
+# Vehicle demand generated ahead of time from a seeded NumPy generator.
+#
+# Each (approach, vehicle type) pair is an independent arrival process with a
+# fixed chance per tick, so the gaps between arrivals are geometric (the
+# discrete-time Poisson process). Arrivals are generated a block of ticks at a
+# time and read back through a cursor; a tick without arrivals costs one
+# comparison. The same seed always gives the same demand, whatever the
+# controller does with it.
+import numpy as np
+import config
+from scenario import default_scenario
+
+PATHS = ('NS', 'EW')
+VEHICLE_TYPES = ('Ambulance', 'Police', 'Car')  # Same-tick arrivals spawn in this order
+
+
+def default_rates(scenario=None):
+    """Per-tick arrival chances per (path, type) that match `SimulationEngine._spawn_vehicle`."""
+    if scenario is None:
+        scenario = default_scenario()
+    # The engine picks one path per tick, so each approach gets half of every rate
+    rates = {}
+    for path in PATHS:
+        rates[(path, 'Ambulance')] = scenario.ambulance_spawn_rate / 2
+        rates[(path, 'Police')] = (1 - scenario.ambulance_spawn_rate) * scenario.police_spawn_rate / 2
+        rates[(path, 'Car')] = scenario.car_spawn_rate / 2
+    return rates
+
+
+class ArrivalStream:
+    """Pre-generated arrivals for every approach and type, consumed one tick at a time.
+
+    `next()` returns the arrivals of the next tick as `(path, type)` pairs.
+    `idle_ticks()` and `skip()` let event-driven runs jump straight to the
+    tick before the next arrival. `rewind()` replays the demand from the start.
+    Unless `rates` are given, they are the `default_rates` of `scenario`
+    (config.py's by default).
+    """
+    def __init__(self, seed=None, rates=None, block_ticks=config.ARRIVAL_BLOCK_TICKS, scenario=None):
+        self.seed = seed
+        self.rates = default_rates(scenario) if rates is None else dict(rates)
+        self.block_ticks = block_ticks
+        self.kinds = [(path, vehicle_type) for path in PATHS for vehicle_type in VEHICLE_TYPES
+                      if self.rates.get((path, vehicle_type), 0) > 0]
+        self.rewind()
+
+    def rewind(self):
+        """Restarts the stream at tick 0 with a freshly seeded generator."""
+        self.rng = np.random.default_rng(self.seed)
+        self.tick = 0  # The tick the next call to `next()` returns
+        self.block_end = 0
+        # The first arrival of each kind that has not been put in a block yet
+        self.pending = [int(self.rng.geometric(self.rates[kind])) - 1 for kind in self.kinds]
+        self.ticks = []
+        self.arrivals = []
+        self.cursor = 0
+        self.next_tick = self._load_next()
+
+    def next(self):
+        """Returns the arrivals of the current tick and moves on to the next one."""
+        tick = self.tick
+        self.tick += 1
+        if tick != self.next_tick:
+            return ()
+
+        start = self.cursor
+        end = start + 1
+        while end < len(self.ticks) and self.ticks[end] == tick:
+            end += 1
+        self.cursor = end
+        self.next_tick = self._load_next()
+        return self.arrivals[start:end]
+
+    def idle_ticks(self):
+        """How many upcoming ticks have no arrivals."""
+        return self.next_tick - self.tick
+
+    def skip(self, ticks):
+        """Moves past `ticks` ticks without arrivals (see `idle_ticks`)."""
+        if ticks > self.idle_ticks():
+            raise ValueError(f"Cannot skip {ticks} ticks: an arrival is due in {self.idle_ticks()}")
+        self.tick += ticks
+
+    def _load_next(self):
+        """Returns the tick of the next unread arrival, generating blocks as needed."""
+        while self.cursor == len(self.ticks):
+            if not self.kinds:
+                return float('inf')
+            self._generate_block()
+        return self.ticks[self.cursor]
+
+    def _generate_block(self):
+        """Generates every arrival in the next `block_ticks` ticks, in spawn order."""
+        start, end = self.block_end, self.block_end + self.block_ticks
+        ticks = []
+        kinds = []
+        for index, kind in enumerate(self.kinds):
+            rate = self.rates[kind]
+            first = self.pending[index]
+            # Draw geometric gaps in bulk until the process has left the block
+            kind_ticks = [np.array([first])]
+            last = first
+            while last < end:
+                gaps = self.rng.geometric(rate, size=int(rate * self.block_ticks) + 16)
+                more = last + np.cumsum(gaps)
+                kind_ticks.append(more)
+                last = int(more[-1])
+            kind_ticks = np.concatenate(kind_ticks)
+            inside = kind_ticks < end
+            self.pending[index] = int(kind_ticks[np.argmin(inside)])
+            ticks.append(kind_ticks[inside])
+            kinds.append(np.full(inside.sum(), index))
+
+        ticks = np.concatenate(ticks)
+        kinds = np.concatenate(kinds)
+        order = np.lexsort((kinds, ticks))
+        self.ticks = ticks[order].tolist()
+        self.arrivals = [self.kinds[k] for k in kinds[order].tolist()]
+        self.cursor = 0
+        self.block_end = end
@@ -0,0 +1,323 @@
+# benchmark.py
+# Measures the simulation's hot paths and writes the numbers to a JSON file.
+#
+#     python benchmark.py                       # writes benchmark.json
+#     python benchmark.py --quick --compare old.json
+#
+# Every section is seeded, so two runs of the same commit differ only by
+# machine noise and results from different commits can be compared directly.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+import config
+from engine import SimulationEngine
+from vectorized import VectorizedEngine, VehicleArrays
+from controller import FixedTimeController, QLearningAgent, QLearningController
+from tabular import FlatQLearningAgent, SparseQLearningAgent
+from arrivals import ArrivalStream
+from network import GridNetwork
+from controller_bank import FixedTimeBank, QLearningBank
+
+VEHICLE_COUNTS = (10, 100, 1000, 10000)
+DRAW_VEHICLE_COUNTS = (10, 100, 1000)
+ENGINES = {'objects': SimulationEngine, 'arrays': VectorizedEngine}
+GRID_SIZES = (10, 30)  # Grids of N x N intersections for the controller bank benchmark
+STARTUP_MODULES = ('engine', 'training', 'env', 'main')  # Headless entry points; none should load pygame
+AGENTS = {'nested': QLearningAgent, 'flat': FlatQLearningAgent,
+          'sparse': SparseQLearningAgent}  # Decision timings of all but 'nested' get a prefix
+
+
+def make_controller(mode, epsilon=config.EPSILON, agent_class=QLearningAgent):
+    """Creates a FIXED or AI controller with the settings from config."""
+    if mode == 'FIXED':
+        return FixedTimeController(green_time=config.FIXED_GREEN_TIME, yellow_time=config.FIXED_YELLOW_TIME)
+    agent = agent_class(alpha=config.ALPHA, gamma=config.GAMMA, epsilon=epsilon,
+                        min_epsilon=config.MIN_EPSILON, decay=config.EPSILON_DECAY)
+    return QLearningController(agent=agent, decision_interval=config.AI_DECISION_INTERVAL,
+                               yellow_time=config.AI_YELLOW_TIME)
+
+
+def populate(sim, count):
+    """Resets `sim` and fills it with `count` cars: a queue at the red NS light and a moving EW platoon."""
+    sim.reset()
+    sim.intersection.set_phase('EW_GREEN')
+    for path, lane in sim.lanes.items():
+        n = (count + 1) // 2 if path == 'NS' else count // 2
+        if path == 'NS':
+            # Bumper to bumper, the front car waiting at the stop line
+            front = config.INTERSECTION_POS[1] - config.STOP_LINE_OFFSET - config.CAR_HEIGHT
+            spacing = config.CAR_HEIGHT + config.MIN_FOLLOW_DISTANCE
+        else:
+            # Spread out behind the left edge, so nobody leaves during a measurement
+            front = 0.0
+            spacing = config.CAR_HEIGHT + config.MIN_FOLLOW_DISTANCE + 20
+        positions = front - spacing * np.arange(n - 1, -1, -1, dtype=float)  # Rear to front
+
+        if isinstance(lane, VehicleArrays):
+            for _ in range(n):
+                sim._add_vehicle(path, 'Car')
+            setattr(lane, 'y' if path == 'NS' else 'x', positions)
+        else:
+            # Front first, so every car joins at the rear without scanning the lane
+            for pos in positions[::-1].tolist():
+                car = sim.vehicle_class(path, vehicle_type='Car')
+                setattr(car, lane.axis, pos)
+                lane.add(car)
+
+
+def timed(function, repeats, min_time=0.2):
+    """Returns the mean seconds per call of `function()`, after one warm-up call."""
+    function()
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while calls < repeats or elapsed < min_time:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def bench_update_vehicles(counts=VEHICLE_COUNTS, ticks=50, min_time=0.5):
+    """Ticks per second of `_update_vehicles` alone, per engine and vehicle count."""
+    results = []
+    for engine_name, engine_class in ENGINES.items():
+        sim = engine_class(make_controller('FIXED'))
+        for count in counts:
+            # Short batches from a fresh scene, so the platoon never reaches the screen edge
+            elapsed = 0.0
+            done = 0
+            while done < 2 * ticks or elapsed < min_time:
+                populate(sim, count)
+                start = time.perf_counter()
+                for _ in range(ticks):
+                    sim._update_vehicles()
+                elapsed += time.perf_counter() - start
+                done += ticks
+            results.append({'engine': engine_name, 'vehicles': count,
+                            'ticks_per_second': done / elapsed})
+    return results
+
+
+def bench_decisions(repeats=2000):
+    """Microseconds per Q-learning decision and for each of its parts, for every agent in AGENTS."""
+    results = {}
+    for name, agent_class in AGENTS.items():
+        random.seed(0)
+        np.random.seed(0)
+        controller = make_controller('AI', epsilon=0.1, agent_class=agent_class)
+        agent = controller.agent
+        sim = SimulationEngine(controller)
+        populate(sim, 40)
+        sim._update_vehicles()
+        intersection = sim.intersection
+
+        state = agent.get_state(intersection)
+        next_state = state  # Any state will do; only the cost is measured
+
+        def decide():
+            # Force a decision tick: green, timer about to expire
+            controller.is_yellow = False
+            controller.timer = 1
+            controller.update(intersection, -100)
+
+        prefix = '' if name == 'nested' else name + '_'
+        results.update({
+            prefix + 'controller_update_us': timed(decide, repeats) * 1e6,
+            prefix + 'get_state_us': timed(lambda: agent.get_state(intersection), repeats) * 1e6,
+            prefix + 'choose_action_us': timed(lambda: agent.choose_action(state), repeats) * 1e6,
+            prefix + 'update_q_table_us': timed(lambda: agent.update_q_table(state, 1, -100, next_state), repeats) * 1e6,
+        })
+    return results
+
+
+def bench_draw(counts=DRAW_VEHICLE_COUNTS, frames=100):
+    """Milliseconds per `Simulation._draw` frame on the dummy video driver."""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from simulation import Simulation
+
+    sim = Simulation(make_controller('FIXED'), mode='FIXED')
+    results = []
+    try:
+        for count in counts:
+            populate(sim, count)
+            sim.dirty_rects = None
+            sim._draw()  # The first frame is a full repaint
+
+            # Vehicles move between frames, but only the drawing is timed
+            elapsed = 0.0
+            for _ in range(frames):
+                sim.frame_count += 1
+                sim._update_vehicles()
+                start = time.perf_counter()
+                sim._draw()
+                elapsed += time.perf_counter() - start
+            results.append({'vehicles': count, 'frame_ms': elapsed / frames * 1e3})
+    finally:
+        pygame.quit()
+    return results
+
+
+def bench_episodes(ticks=config.SIM_FPS * 60, seed=0):
+    """End-to-end headless throughput for FIXED and AI control, stepped and event-driven."""
+    results = []
+    for mode in ('FIXED', 'AI'):
+        for event_driven in (False, True):
+            random.seed(seed)
+            np.random.seed(seed)
+            sim = SimulationEngine(make_controller(mode), arrivals=ArrivalStream(seed=seed))
+            start = time.perf_counter()
+            sim.run(ticks, event_driven=event_driven)
+            seconds = time.perf_counter() - start
+            results.append({'mode': mode, 'event_driven': event_driven, 'ticks': ticks,
+                            'ticks_per_second': ticks / seconds,
+                            'episodes_per_hour': 3600.0 / seconds,
+                            'cars_passed': sim.cars_passed})
+    return results
+
+
+def bench_controller_bank(sizes=GRID_SIZES, ticks=200, seed=0):
+    """Microseconds per tick spent on signal control for a grid: per-node controllers vs one bank."""
+    results = []
+    for size in sizes:
+        nodes = size * size
+        for mode in ('FIXED', 'AI'):
+            row = {'nodes': nodes, 'mode': mode}
+            for name in ('objects', 'bank'):
+                random.seed(seed)
+                np.random.seed(seed)
+                agent = make_controller('AI', epsilon=0.1).agent  # One shared agent per network
+                if name == 'bank':
+                    bank = FixedTimeBank(nodes) if mode == 'FIXED' else QLearningBank(nodes, agent)
+                    network = GridNetwork(size, size, controller_bank=bank, seed=seed)
+                elif mode == 'FIXED':
+                    network = GridNetwork(size, size, lambda: make_controller('FIXED'), seed=seed)
+                else:
+                    network = GridNetwork(size, size, lambda: QLearningController(
+                        agent, config.AI_DECISION_INTERVAL, config.AI_YELLOW_TIME), seed=seed)
+
+                # Only the controller stage is timed; vehicles still move between updates
+                elapsed = 0.0
+                for _ in range(ticks):
+                    network.frame_count += 1
+                    rewards = network._update_vehicles()
+                    start = time.perf_counter()
+                    if network.controller_bank is not None:
+                        network.controller_bank.update(network, rewards)
+                    else:
+                        for controller, intersection, reward in zip(network.controllers, network.intersections,
+                                                                    rewards.tolist()):
+                            controller.update(intersection, reward)
+                    elapsed += time.perf_counter() - start
+                    network._spawn_vehicles()
+                row[name + '_us'] = elapsed / ticks * 1e6
+            results.append(row)
+    return results
+
+
+def bench_startup(modules=STARTUP_MODULES, repeats=5):
+    """Cold import time of headless entry points in fresh interpreters, and whether pygame came along."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for module in modules:
+        code = ("import sys, time; start = time.perf_counter(); import " + module +
+                "; print(time.perf_counter() - start, 'pygame' in sys.modules)")
+        times = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                    cwd=here, check=True).stdout.split()
+            times.append(float(output[-2]))
+        results.append({'module': module, 'import_ms': min(times) * 1e3, 'pygame': output[-1] == 'True'})
+    return results
+
+
+def environment():
+    """Describes the code and machine the numbers were taken on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def run_all(quick=False, draw=True):
+    """Runs every benchmark and returns the results as one JSON-ready dict."""
+    results = {'environment': environment()}
+    results['update_vehicles'] = bench_update_vehicles(VEHICLE_COUNTS[:3] if quick else VEHICLE_COUNTS)
+    results['decisions'] = bench_decisions(200 if quick else 2000)
+    if draw:
+        results['draw'] = bench_draw(DRAW_VEHICLE_COUNTS[:2] if quick else DRAW_VEHICLE_COUNTS,
+                                     frames=20 if quick else 100)
+    results['episodes'] = bench_episodes(ticks=config.SIM_FPS * (10 if quick else 60))
+    results['controller_bank'] = bench_controller_bank(GRID_SIZES[:1] if quick else GRID_SIZES)
+    results['startup'] = bench_startup(repeats=2 if quick else 5)
+    return results
+
+
+def _flatten(results):
+    """Maps a readable name to every number in a results dict, for comparisons."""
+    flat = {}
+    for row in results.get('update_vehicles', []):
+        flat[f"update_vehicles {row['engine']} {row['vehicles']} (ticks/s)"] = row['ticks_per_second']
+    for name, value in results.get('decisions', {}).items():
+        flat[f"decisions {name}"] = value
+    for row in results.get('draw', []):
+        flat[f"draw {row['vehicles']} (ms)"] = row['frame_ms']
+    for row in results.get('episodes', []):
+        mode = row['mode'] + (' event-driven' if row['event_driven'] else '')
+        flat[f"episodes {mode} (ticks/s)"] = row['ticks_per_second']
+    for row in results.get('controller_bank', []):
+        for name in ('objects', 'bank'):
+            flat[f"controllers {row['mode']} {row['nodes']} nodes {name} (us/tick)"] = row[name + '_us']
+    for row in results.get('startup', []):
+        flat[f"startup {row['module']} (ms)"] = row['import_ms']
+    return flat
+
+
+def compare(old, new):
+    """Prints every metric of two result dicts side by side with the new/old ratio."""
+    old, new = _flatten(old), _flatten(new)
+    for name, value in new.items():
+        if name in old and old[name]:
+            print(f"{name:<48} {old[name]:>12.2f} {value:>12.2f} {value / old[name]:>7.2f}x")
+        else:
+            print(f"{name:<48} {'-':>12} {value:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the traffic simulation.")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the results")
+    parser.add_argument('--quick', action='store_true', help="fewer sizes and repeats, for a smoke test")
+    parser.add_argument('--no-draw', action='store_true', help="skip the pygame frame benchmark")
+    parser.add_argument('--compare', metavar='PREVIOUS', help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = run_all(quick=args.quick, draw=not args.no_draw)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    else:
+        compare({}, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# checkpoint.py
+# Saves and restores a Q-learning agent's table, epsilon and visit counts.
+#
+# File layout: a 64-byte header (magic, version, Q-table dtype, epsilon,
+# shape) followed by the raw Q-table and then the int64 visit counts, both
+# in C order. Loading memory-maps both arrays, so startup does no reading
+# until a state is actually looked up.
+import os
+import struct
+import threading
+import numpy as np
+import config
+
+MAGIC = b'UFQT'
+VERSION = 1
+HEADER_SIZE = 64
+MAX_DIMS = 8
+_HEADER = struct.Struct('<4sHH8sd')  # magic, version, ndim, dtype string, epsilon
+_DIM = struct.Struct('<I')
+
+
+def save_checkpoint(path, q_table, visits, epsilon):
+    """Writes the arrays to `path` atomically: a crash never leaves a half-written checkpoint."""
+    q_table = np.ascontiguousarray(q_table)
+    visits = np.ascontiguousarray(visits, dtype=np.int64)
+    if visits.shape != q_table.shape:
+        raise ValueError(f"Visit counts {visits.shape} do not match the Q-table {q_table.shape}")
+    if q_table.ndim > MAX_DIMS:
+        raise ValueError(f"Q-tables with more than {MAX_DIMS} dimensions are not supported")
+
+    header = _HEADER.pack(MAGIC, VERSION, q_table.ndim, q_table.dtype.str.encode(), epsilon)
+    header += b''.join(_DIM.pack(dim) for dim in q_table.shape)
+    header = header.ljust(HEADER_SIZE, b'\0')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        q_table.tofile(f)
+        visits.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Memory-maps a checkpoint and returns `(q_table, visits, epsilon)`.
+
+    The arrays are copy-on-write: the agent can keep learning in them and the file is never modified.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"{path} is too short to be a Q-table checkpoint")
+
+    magic, version, ndim, dtype, epsilon = _HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a Q-table checkpoint")
+    if version != VERSION:
+        raise ValueError(f"{path} has unsupported checkpoint version {version}")
+
+    shape = tuple(_DIM.unpack_from(header, _HEADER.size + i * _DIM.size)[0] for i in range(ndim))
+    dtype = np.dtype(dtype.rstrip(b'\0').decode())
+    q_table = np.memmap(path, dtype=dtype, mode='c', offset=HEADER_SIZE, shape=shape)
+    visits = np.memmap(path, dtype=np.int64, mode='c',
+                       offset=HEADER_SIZE + q_table.nbytes, shape=shape)
+    return q_table, visits, epsilon
+
+
+def save_agent(agent, path=config.CHECKPOINT_PATH):
+    """Saves an agent's Q-table, visit counts and epsilon."""
+    save_checkpoint(path, agent.q_table, agent.visits, agent.epsilon)
+
+
+def load_agent(agent, path=config.CHECKPOINT_PATH):
+    """Warm-starts an agent from a checkpoint. Returns False if there is none yet."""
+    if not os.path.exists(path):
+        return False
+    q_table, visits, epsilon = load_checkpoint(path)
+    if q_table.shape != agent.q_table.shape:
+        raise ValueError(f"Checkpoint Q-table {q_table.shape} does not match the agent {agent.q_table.shape}")
+    agent.q_table = q_table
+    agent.visits = visits
+    agent.epsilon = epsilon
+    return True
+
+
+class Autosaver:
+    """Periodically checkpoints an agent from a background thread.
+
+    `tick()` is called once per simulation tick. When a save is due it only
+    copies the arrays (a memcpy); the file write happens off the sim loop.
+    A save is skipped if the previous one is still being written.
+    """
+    def __init__(self, agent, path=config.CHECKPOINT_PATH, interval=config.AUTOSAVE_INTERVAL):
+        self.agent = agent
+        self.path = path
+        self.interval = interval
+        self.ticks = 0
+        self.thread = None
+
+    def tick(self, ticks=1):
+        self.ticks += ticks
+        if self.ticks >= self.interval:
+            self.save()
+
+    def save(self, wait=False):
+        """Starts a background save of the agent's current state."""
+        if self.thread is not None and self.thread.is_alive():
+            if not wait:
+                return
+            self.thread.join()
+        self.ticks = 0
+
+        # Stop sharing pages with a memory-mapped checkpoint before replacing the file,
+        # which some platforms refuse while a mapping is open.
+        if isinstance(self.agent.q_table, np.memmap):
+            self.agent.q_table = np.array(self.agent.q_table)
+        if isinstance(self.agent.visits, np.memmap):
+            self.agent.visits = np.array(self.agent.visits)
+
+        snapshot = (self.path, self.agent.q_table.copy(), self.agent.visits.copy(), self.agent.epsilon)
+        self.thread = threading.Thread(target=save_checkpoint, args=snapshot, daemon=True)
+        self.thread.start()
+        if wait:
+            self.thread.join()
+
+    def close(self):
+        """Learns from any pending transitions, writes a final checkpoint and waits for it to reach the disk."""
+        if hasattr(self.agent, 'flush'):
+            self.agent.flush()
+        self.save(wait=True)
@@ -5,6 +5,10 @@
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 1000
 SIM_FPS = 60  # Frames per second for the simulation
+RENDER_FPS = 60  # Frames per second drawn on screen, whatever the simulation speed
+SIM_SPEED_MULTIPLIER = 1  # Simulated time per real second; +/- change it at runtime
+MIN_SPEED_MULTIPLIER = 0.25
+MAX_SPEED_MULTIPLIER = 1024
 
 # --- COLORS (VIBRANT LIGHT THEME OVERHAUL) ---
 COLOR_SKY = (245, 245, 245)      # Very light off-white/grey for a clean background
@@ -27,6 +31,9 @@ COLOR_TIRE = (0, 0, 0)           # Black for wheels
 COLOR_STATS_BACKGROUND = (255, 255, 255) # White panel background
 COLOR_ACCENT_UI = (0, 110, 200)          # Deep Blue accent for UI elements
 
+# Rendered HUD text surfaces kept for reuse (least recently used are dropped)
+TEXT_CACHE_SIZE = 256
+
 # Traffic Light Casing
 COLOR_CASING = (100, 100, 100)   # Dark grey casing for contrast
 LIGHT_RADIUS = 10 # Slightly larger lights
@@ -73,6 +80,9 @@ ROAD_WIDTH = 80  # Total width of one road (two lanes)
 LANE_WIDTH = ROAD_WIDTH // 2 # Two lanes per direction
 STOP_LINE_OFFSET = 50  # Where cars stop relative to the intersection center
 
+# --- SCENARIOS ---
+SCENARIO_PATH = None  # JSON file overriding the simulation settings here (see scenario.py), e.g. 'rush_hour.json'
+
 # --- FIXED CONTROLLER SETTINGS ---
 FIXED_GREEN_TIME = 180
 FIXED_YELLOW_TIME = 60
@@ -96,9 +106,77 @@ MIN_EPSILON = 0.05
 
 REWARD_WAITING = -0.1
 
-
-
-
-
-
-
+# Tabular core: 'nested' (controller.QLearningAgent) or 'flat' (tabular.FlatQLearningAgent).
+# tabular.SparseQLearningAgent has no dense table to checkpoint or merge, so it is built directly instead.
+Q_AGENT = 'nested'
+REPLAY_SIZE = 10000       # Transitions the flat agent keeps for replay
+REPLAY_BATCH_SIZE = 64    # Replayed transitions learned with every batch of new ones
+REPLAY_UPDATE_EVERY = 16  # New transitions collected before each batched update
+
+# Sparse core (tabular.SparseQLearningAgent): finer and richer states in a hashed table
+SPARSE_QUEUE_BIN_SIZE = 1       # Cars per queue bin
+SPARSE_MAX_QUEUE_BIN = 40
+SPARSE_PHASE_AGE_BINS = 8       # Decisions spent in the current phase, capped
+SPARSE_MAX_STATES = None        # States stored before the least visited are evicted; None never evicts
+SPARSE_EVICT_FRACTION = 0.25    # Share of stored states dropped per eviction
+
+# --- VEHICLE POOL ---
+VEHICLE_POOL_LIMIT = 4096  # Most exited vehicles kept for reuse per engine
+
+# --- HEADLESS TRAINING ---
+HEADLESS = False  # main.py runs without a display (as with --headless) and never imports pygame
+EPISODE_TICKS = SIM_FPS * 60 * 5  # Five simulated minutes per training episode
+EVENT_RETRY_LIMIT = 16  # Event-driven runs: most ticks to wait before retrying a failed jump
+
+# --- PARALLEL TRAINING ---
+TRAIN_WORKERS = None           # Worker processes; None uses one per CPU core
+TRAIN_ROUNDS = 50              # Merge/broadcast cycles
+TRAIN_EPISODES_PER_ROUND = 2   # Episodes each worker runs between merges
+TRAIN_MERGE = 'visits'         # 'visits' (visit-weighted) or 'mean' Q-table averaging
+
+# --- HYPERPARAMETER SWEEPS ---
+SWEEP_SPACE = {  # Values tried per setting; sweep.py --random also takes (low, high) ranges
+    'ALPHA': [0.05, 0.1, 0.2],
+    'GAMMA': [0.8, 0.9, 0.95],
+    'EPSILON_DECAY': [0.8, 0.9, 0.95],
+    'AI_DECISION_INTERVAL': [60, 120, 180],
+    'QUEUE_BIN_SIZE': [3, 5, 8],
+}
+SWEEP_EPISODES = 20                  # Training episodes per configuration
+SWEEP_EPISODE_TICKS = SIM_FPS * 60 * 2  # Two simulated minutes per sweep episode
+SWEEP_WORKERS = None                 # Worker processes; None uses one per CPU core
+SWEEP_RUNG_EPISODES = 5              # Episodes between early-stopping checks; 0 never stops
+SWEEP_MIN_PEERS = 3                  # Runs that must have reached a check before any is stopped there
+SWEEP_STOP_QUANTILE = 0.5            # Stop runs waiting longer than this quantile of their peers
+SWEEP_OUTPUT_PATH = 'sweep.json'
+
+# --- EXTERNAL CONTROL ---
+ENV_EPISODE_TICKS = EPISODE_TICKS   # Ticks before a TrafficEnv episode is done
+ENV_SOCKET_PATH = 'urbanflow.sock'  # Unix socket server.py listens on
+ENV_MAX_BATCH = 1 << 16             # Most records server.py accepts in one request
+
+# --- Q-TABLE CHECKPOINTS ---
+CHECKPOINT_PATH = 'q_table.ckpt'
+AUTOSAVE_INTERVAL = SIM_FPS * 30  # Ticks between background autosaves
+
+# --- ROAD NETWORK ---
+GRID_SPACING = SCREEN_WIDTH  # Pixels between neighbouring intersections of a GridNetwork
+
+# --- ARRIVAL STREAMS ---
+ARRIVAL_BLOCK_TICKS = SIM_FPS * 60  # Ticks of demand an ArrivalStream generates at a time
+
+# --- PROFILING ---
+PROFILE_STAGES = False       # Time every stage of the loop and show an overlay next to the stats panel
+PROFILE_WINDOW = 600         # Samples per stage behind the rolling mean and p99
+PROFILE_OVERLAY_REFRESH = 30 # Frames between overlay updates
+
+# --- TRACES ---
+TRACE_PATH = None            # Record every displayed tick to this file for replay.py, e.g. 'run.trace'
+TRACE_BUFFER_TICKS = SIM_FPS * 10  # Ticks collected in memory between bulk writes
+
+# --- STATISTICS ---
+STATS_WAIT_BIN_TICKS = SIM_FPS // 4     # Wait histogram resolution (a quarter second)
+STATS_WAIT_BINS = 4 * 60 * 10           # Waits up to ten minutes get their own bin
+STATS_HISTORY_MINUTES = 60              # Minutes of throughput history kept per approach
+STATS_QUEUE_SAMPLE_TICKS = SIM_FPS      # Ticks between queue-length samples
+STATS_QUEUE_SAMPLES = 3600              # Queue-length samples kept per approach (an hour)
@@ -12,12 +12,29 @@ class FixedTimeController:
         self.timer = self.green_time
         self.current_phase = 0  # 0 = NS_GREEN, 1 = EW_GREEN
         self.is_yellow = False
+        self.decisions = 0  # Phase changes made so far
+
+    def reset(self):
+        """Returns the controller to its initial NS_GREEN state for a new episode."""
+        self.timer = self.green_time
+        self.current_phase = 0
+        self.is_yellow = False
+        self.decisions = 0
+
+    def idle_ticks(self):
+        """How many upcoming updates will do nothing but count the timer down."""
+        return max(self.timer - 1, 0)
+
+    def skip(self, ticks):
+        """Applies `ticks` idle updates at once (see `idle_ticks`)."""
+        self.timer -= ticks
 
     def update(self, intersection, reward=None):
         self.timer -= 1
         
         if self.is_yellow and self.timer <= 0:
             # Yellow phase finished, switch to new green
+            self.decisions += 1
             self.is_yellow = False
             self.current_phase = 1 - self.current_phase  # Flip phase
             self.timer = self.green_time
@@ -28,6 +45,7 @@ class FixedTimeController:
                 
         elif not self.is_yellow and self.timer <= 0:
             # Green phase finished, switch to yellow
+            self.decisions += 1
             self.is_yellow = True
             self.timer = self.yellow_time
             if self.current_phase == 0:
@@ -37,25 +55,29 @@ class FixedTimeController:
 
 class QLearningAgent:
     """The AI agent that learns using Q-learning."""
-    def __init__(self, alpha, gamma, epsilon, min_epsilon, decay):
+    def __init__(self, alpha, gamma, epsilon, min_epsilon, decay, queue_bin_size=config.QUEUE_BIN_SIZE):
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
         self.min_epsilon = min_epsilon
         self.epsilon_decay = decay
+        self.queue_bin_size = queue_bin_size  # Cars per queue bin
+        self.max_queue_bin = config.MAX_QUEUE_BIN
+        self.num_actions = config.NUM_ACTIONS
         
         # Initialize Q-table: (ns_bins, ew_bins, phase) x (actions)
-        state_space = (config.MAX_QUEUE_BIN + 1, config.MAX_QUEUE_BIN + 1, config.NUM_PHASES)
-        action_space = config.NUM_ACTIONS
+        state_space = (self.max_queue_bin + 1, self.max_queue_bin + 1, config.NUM_PHASES)
+        action_space = self.num_actions
         self.q_table = np.zeros(state_space + (action_space,))
+        self.visits = np.zeros(state_space + (action_space,), dtype=np.int64)  # Updates per state-action
 
-    def get_state(self, intersection):
-        """Discretizes the continuous queue lengths into bins."""
+    def get_state(self, intersection, phase_age=0):
+        """Discretizes the continuous queue lengths into bins; this table has no use for `phase_age`."""
         ns_queue = len(intersection.ns_queue)
         ew_queue = len(intersection.ew_queue)
         
-        ns_bin = min(math.ceil(ns_queue / config.QUEUE_BIN_SIZE), config.MAX_QUEUE_BIN)
-        ew_bin = min(math.ceil(ew_queue / config.QUEUE_BIN_SIZE), config.MAX_QUEUE_BIN)
+        ns_bin = min(math.ceil(ns_queue / self.queue_bin_size), self.max_queue_bin)
+        ew_bin = min(math.ceil(ew_queue / self.queue_bin_size), self.max_queue_bin)
         
         phase = 0 if intersection.current_phase.startswith('NS') else 1
         
@@ -64,7 +86,7 @@ class QLearningAgent:
     def choose_action(self, state):
         """Chooses an action using an epsilon-greedy policy."""
         if random.uniform(0, 1) < self.epsilon:
-            return random.randint(0, config.NUM_ACTIONS - 1)  # Explore
+            return random.randint(0, self.num_actions - 1)  # Explore
         else:
             return np.argmax(self.q_table[state])  # Exploit
 
@@ -76,6 +98,34 @@ class QLearningAgent:
         # Q-learning formula
         new_value = old_value + self.alpha * (reward + self.gamma * next_max - old_value)
         self.q_table[state][action] = new_value
+        self.visits[state][action] += 1
+
+    def choose_actions(self, states):
+        """Chooses epsilon-greedy actions for a batch of states, one row per state."""
+        states = np.asarray(states)
+        greedy = np.argmax(self.q_table[tuple(states.T)], axis=1)
+        explore = np.random.random(len(states)) < self.epsilon
+        random_actions = np.random.randint(0, self.num_actions, len(states))
+        return np.where(explore, random_actions, greedy)
+
+    def update_q_table_batch(self, states, actions, rewards, next_states):
+        """Applies a batch of Q-learning updates: one step per state-action, by the mean TD error of its transitions.
+
+        Summing instead would step a state-action that appears k times in the
+        batch by k * alpha, which diverges once lockstep envs repeat states.
+        """
+        index = tuple(np.asarray(states).T) + (np.asarray(actions),)
+        next_max = np.max(self.q_table[tuple(np.asarray(next_states).T)], axis=1)
+        td_error = rewards + self.gamma * next_max - self.q_table[index]
+
+        # Summed errors and counts per state-action, then one averaged step each
+        total_error = np.zeros(self.q_table.shape)
+        counts = np.zeros(self.visits.shape, dtype=np.int64)
+        np.add.at(total_error, index, td_error)
+        np.add.at(counts, index, 1)
+        touched = counts > 0
+        self.q_table[touched] += self.alpha * total_error[touched] / counts[touched]
+        self.visits += counts
 
     def decay_epsilon(self):
         """Reduces epsilon to decrease exploration over time."""
@@ -92,6 +142,25 @@ class QLearningController:
         self.is_yellow = False
         self.last_state = None
         self.last_action = None
+        self.phase_age = 0  # Decisions made since the phase last changed
+        self.decisions = 0  # Keep/switch choices made so far
+
+    def reset(self):
+        """Clears the decision timer and pending transition; the agent keeps what it learned."""
+        self.timer = self.decision_interval
+        self.is_yellow = False
+        self.last_state = None
+        self.last_action = None
+        self.phase_age = 0
+        self.decisions = 0
+
+    def idle_ticks(self):
+        """How many upcoming updates will do nothing but count the timer down."""
+        return max(self.timer - 1, 0)
+
+    def skip(self, ticks):
+        """Applies `ticks` idle updates at once (see `idle_ticks`)."""
+        self.timer -= ticks
 
     def update(self, intersection, total_wait_time_reward):
         # Handle yellow light logic
@@ -113,7 +182,10 @@ class QLearningController:
         
         # Time to make a new decision
         if self.timer <= 0:
-            current_state = self.agent.get_state(intersection)
+            self.decisions += 1
+            # Only this controller changes the phase, so its age is the run of keeps since the last switch
+            self.phase_age = self.phase_age + 1 if self.last_action == 0 else 0
+            current_state = self.agent.get_state(intersection, self.phase_age)
             
             # Update Q-table based on the *last* action and the reward we just received
             if self.last_state is not None:
@@ -0,0 +1,131 @@
+# controller_bank.py
+# The signal controllers of every node of a `GridNetwork`, held in arrays and updated in one call.
+#
+# A bank follows its per-node controller tick for tick: `FixedTimeBank` is
+# `FixedTimeController` and `QLearningBank` is `QLearningController`, but the
+# timers, phases, yellow flags and pending transitions of all N nodes are
+# arrays, so a tick costs a few NumPy operations whatever N is.
+#
+#     bank = QLearningBank(rows * cols, agent)
+#     network = GridNetwork(rows, cols, controller_bank=bank)
+#     network.run(ticks)
+import numpy as np
+import config
+from network import NS, EW
+
+
+class FixedTimeBank:
+    """`FixedTimeController` for `num_nodes` nodes; timings may be scalars or one per node."""
+    def __init__(self, num_nodes, green_time=config.FIXED_GREEN_TIME, yellow_time=config.FIXED_YELLOW_TIME):
+        self.num_nodes = num_nodes
+        self.green_time = np.broadcast_to(np.asarray(green_time, dtype=np.int64), (num_nodes,))
+        self.yellow_time = np.broadcast_to(np.asarray(yellow_time, dtype=np.int64), (num_nodes,))
+        self.decisions = 0  # Phase changes made so far, over all nodes
+        self.reset()
+
+    def reset(self):
+        """Returns every node to NS_GREEN with a full green timer."""
+        self.timer = self.green_time.copy()
+        self.decisions = 0
+        self.current_phase = np.zeros(self.num_nodes, dtype=np.int64)  # 0 = NS, 1 = EW
+        self.is_yellow = np.zeros(self.num_nodes, dtype=bool)
+
+    def update(self, network, rewards=None):
+        """One `FixedTimeController.update` per node; changed phases are written to `network`."""
+        self.timer -= 1
+        due = self.timer <= 0
+        if not due.any():
+            return
+
+        # Yellow finished: switch to the other green. Green finished: go yellow.
+        end_yellow = due & self.is_yellow
+        end_green = due & ~self.is_yellow
+        self.current_phase[end_yellow] = 1 - self.current_phase[end_yellow]
+        self.timer[end_yellow] = self.green_time[end_yellow]
+        self.timer[end_green] = self.yellow_time[end_green]
+        self.is_yellow[due] = end_green[due]
+
+        self.decisions += int(due.sum())
+        nodes = np.flatnonzero(due)
+        network.set_phases(2 * self.current_phase[nodes] + self.is_yellow[nodes], nodes)
+
+
+class QLearningBank:
+    """`QLearningController` for `num_nodes` nodes sharing one agent.
+
+    Every tick, the nodes whose decision timer runs out are decided together:
+    their states are binned from the network's queue lengths, the agent
+    learns from their previous transitions with `update_q_table_batch` and
+    picks their next actions with `choose_actions`. The agent must take
+    `(ns_bin, ew_bin, phase)` state rows: `QLearningAgent` or
+    `FlatQLearningAgent`, whose batch updates take one averaged step per
+    state-action, so nodes deciding the same state at once do not add up
+    their steps. Exploration draws come from NumPy's generator, so a
+    bank explores differently from per-node controllers, which draw from
+    `random`; greedy runs of a single node match exactly.
+    """
+    def __init__(self, num_nodes, agent, decision_interval=config.AI_DECISION_INTERVAL,
+                 yellow_time=config.AI_YELLOW_TIME):
+        if hasattr(agent, 'encoder'):
+            raise ValueError("QLearningBank needs an agent with (ns_bin, ew_bin, phase) states")
+        self.num_nodes = num_nodes
+        self.agent = agent
+        self.decision_interval = decision_interval
+        self.yellow_time = yellow_time
+        self.decisions = 0  # Keep/switch choices made so far, over all nodes
+        self.reset()
+
+    def reset(self):
+        """Clears every node's timer and pending transition; the agent keeps what it learned."""
+        n = self.num_nodes
+        self.decisions = 0
+        self.timer = np.full(n, self.decision_interval, dtype=np.int64)
+        self.current_phase = np.zeros(n, dtype=np.int64)  # 0 = NS, 1 = EW
+        self.is_yellow = np.zeros(n, dtype=bool)
+        self.last_state = np.zeros((n, 3), dtype=np.int64)
+        self.last_action = np.full(n, -1, dtype=np.int64)  # -1 until the node's first decision
+
+    def get_states(self, network, nodes):
+        """`QLearningAgent.get_state` for `nodes`, as rows of `(ns_bin, ew_bin, phase)`."""
+        queues = network.queue_lengths[2 * nodes[:, None] + np.array([NS, EW])]
+        bins = np.minimum(-(-queues // self.agent.queue_bin_size), config.MAX_QUEUE_BIN)
+        return np.column_stack((bins, self.current_phase[nodes]))
+
+    def update(self, network, rewards):
+        """One `QLearningController.update` per node, with `rewards[node]` as that node's reward."""
+        self.timer -= 1
+        yellow = self.is_yellow.copy()
+
+        # 1. Yellow finished: switch to the other green and start a new decision timer
+        end_yellow = yellow & (self.timer <= 0)
+        if end_yellow.any():
+            nodes = np.flatnonzero(end_yellow)
+            self.is_yellow[nodes] = False
+            self.current_phase[nodes] = 1 - self.current_phase[nodes]
+            self.timer[nodes] = self.decision_interval
+            network.set_phases(2 * self.current_phase[nodes], nodes)
+
+        # 2. Green nodes whose timer ran out decide together
+        nodes = np.flatnonzero(~yellow & (self.timer <= 0))
+        if len(nodes) == 0:
+            return
+        self.decisions += len(nodes)
+        states = self.get_states(network, nodes)
+
+        # Learn from each node's last transition, with the reward it just received
+        learned = self.last_action[nodes] >= 0
+        if learned.any():
+            self.agent.update_q_table_batch(self.last_state[nodes[learned]], self.last_action[nodes[learned]],
+                                            np.asarray(rewards, dtype=float)[nodes[learned]], states[learned])
+
+        actions = np.asarray(self.agent.choose_actions(states))
+        self.last_state[nodes] = states
+        self.last_action[nodes] = actions
+
+        # Execute: switch through yellow, or keep the phase for another interval
+        switch = nodes[actions == 1]
+        self.is_yellow[switch] = True
+        self.timer[switch] = self.yellow_time
+        self.timer[nodes[actions != 1]] = self.decision_interval
+        if len(switch):
+            network.set_phases(2 * self.current_phase[switch] + 1, switch)
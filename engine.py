@@ -0,0 +1,626 @@
+# engine.py
+# Headless simulation core: vehicle physics, the intersection and the tick loop.
+# Nothing in this module touches pygame, so it can run on servers without a display.
+import math
+import random
+import time
+import config
+from collections import deque
+from scenario import default_scenario
+
+class TrafficLight:
+    """Holds the state of a single traffic light (Red, Yellow, Green)."""
+    def __init__(self):
+        self.state = 'red'  # 'red', 'yellow', 'green'
+        self.timer = 0
+
+
+class Vehicle:
+    """Represents a single vehicle (car, police, or ambulance) in the simulation.
+
+    Vehicles have fixed slots and no `__dict__`; subclasses declare
+    `__slots__ = ()` unless they add attributes. `spawn` re-initialises a
+    vehicle in place, so `VehiclePool` can hand exited vehicles out again.
+    """
+    __slots__ = ('path', 'type', 'is_emergency', 'color', 'siren_color', 'speed', 'width', 'height',
+                 'x', 'y', 'stop_pos', 'follow_distance', 'wait_time', 'total_wait', 'is_waiting',
+                 'is_moving', 'leader', 'id')
+
+    def __init__(self, path, vehicle_type='Car', scenario=None):
+        self.spawn(path, vehicle_type, scenario)
+
+    def spawn(self, path, vehicle_type='Car', scenario=None):
+        """Resets every attribute for a new vehicle of `vehicle_type` at the start of `path`."""
+        if scenario is None:
+            scenario = default_scenario()
+        self.path = path  # 'NS' or 'EW'
+        self.type = vehicle_type
+        self.is_emergency = self.type in ['Ambulance', 'Police']
+
+        # Determine speed and color based on type
+        if self.type == 'Ambulance':
+            self.color = config.COLOR_AMBULANCE
+            self.siren_color = config.COLOR_AMBULANCE_SIREN
+        elif self.type == 'Police':
+            self.color = config.COLOR_POLICE
+            self.siren_color = config.COLOR_POLICE_SIREN
+        else: # Car (or any other non-emergency vehicle)
+            self.color = random.choice(config.VEHICLE_COLORS)
+            self.siren_color = None
+        self.speed = scenario.speeds.get(self.type, scenario.car_speed)
+
+        # Size (rotated on EW), starting position and stop line all come precomputed
+        self.width, self.height = scenario.vehicle_size[path]
+        self.x, self.y = scenario.spawn_pos[path]
+        self.stop_pos = scenario.stop_pos[path]
+        self.follow_distance = scenario.min_follow_distance
+
+        self.wait_time = 0
+        self.total_wait = 0  # Ticks of the waits this vehicle has finished, added as each one ends
+        self.is_waiting = False
+        self.is_moving = False
+        self.leader = None  # The vehicle directly ahead in the same lane, kept by `Lane`
+        self.id = None  # Assigned by the engine when the vehicle spawns
+
+    def update(self, is_light_green):
+        """Moves the vehicle or makes it wait."""
+
+        self.is_waiting = False
+        self.is_moving = True
+
+        is_at_stop_line = False
+        car_in_front_stopping = False
+
+        # 1. Check for red light stop position
+        if self.path == 'NS':
+            if self.y < self.stop_pos and (self.y + self.height + self.speed) >= self.stop_pos:
+                is_at_stop_line = True
+        else: # 'EW'
+            if self.x < self.stop_pos and (self.x + self.width + self.speed) >= self.stop_pos:
+                is_at_stop_line = True
+
+        # 2. Check for car in front stop
+        car_front = self.leader
+        if car_front is not None:
+            required_gap = self.follow_distance
+
+            if self.path == 'NS':
+                distance = car_front.y - (self.y + self.height)
+            else: # EW
+                distance = car_front.x - (self.x + self.width)
+
+            if distance < required_gap + self.speed:
+                car_in_front_stopping = True
+
+
+        # 3. Determine if we should stop
+        should_stop = False
+
+        # Emergency vehicles run the red light IF they are the first car in queue.
+        if self.is_emergency and is_at_stop_line and not is_light_green and car_front is None:
+            pass
+        elif is_at_stop_line and not is_light_green:
+            should_stop = True
+        elif car_in_front_stopping:
+            should_stop = True
+
+        # 4. Apply movement
+        if should_stop:
+            self.is_moving = False
+            self.is_waiting = True
+
+            # Ensure car stops exactly at the stop line, or behind the car in front
+            if is_at_stop_line and not is_light_green:
+                 if self.path == 'NS':
+                    self.y = self.stop_pos - self.height
+                 else:
+                    self.x = self.stop_pos - self.width
+            elif car_in_front_stopping:
+                # Stop directly behind the car in front
+                if self.path == 'NS':
+                    self.y = car_front.y - self.height - self.follow_distance
+                else:
+                    self.x = car_front.x - self.width - self.follow_distance
+        else:
+            self.is_waiting = False
+            self.is_moving = True
+            if self.path == 'NS':
+                self.y += self.speed
+            else:
+                self.x += self.speed
+
+        # 5. Update wait time
+        if self.is_waiting:
+            self.wait_time += 1
+        else:
+            self.wait_time = 0
+
+
+class VehiclePool:
+    """A free list of vehicles that have left the road, recycled for new spawns.
+
+    `acquire` re-initialises a free vehicle with `Vehicle.spawn`, or creates
+    one if the list is empty; `release` takes back a vehicle nothing else
+    refers to any more. At most `limit` free vehicles are kept.
+    """
+    __slots__ = ('vehicle_class', 'limit', 'free', 'created')
+
+    def __init__(self, vehicle_class, limit=config.VEHICLE_POOL_LIMIT):
+        self.vehicle_class = vehicle_class
+        self.limit = limit
+        self.free = []
+        self.created = 0  # Vehicles allocated so far, for checking how often the pool runs dry
+
+    def acquire(self, path, vehicle_type, scenario):
+        if self.free:
+            vehicle = self.free.pop()
+            vehicle.spawn(path, vehicle_type, scenario)
+            return vehicle
+        self.created += 1
+        return self.vehicle_class(path, vehicle_type=vehicle_type, scenario=scenario)
+
+    def release(self, vehicle):
+        if len(self.free) < self.limit:
+            vehicle.leader = None
+            self.free.append(vehicle)
+
+
+class Lane:
+    """The vehicles on one approach in rear-to-front order, linked to their leaders."""
+    def __init__(self, path):
+        self.path = path  # 'NS' or 'EW'; the vehicles carry their own geometry
+        self.vehicles = deque()  # Rearmost vehicle first
+        self.axis = 'y' if path == 'NS' else 'x'
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def __iter__(self):
+        return iter(self.vehicles)
+
+    def add(self, vehicle):
+        """Inserts a spawned vehicle behind everything that is further down the road."""
+        # New vehicles start off-screen, so this almost always stops at the rear.
+        # Ties go in front of older vehicles, matching a stable sort by position.
+        pos = getattr(vehicle, self.axis)
+        index = 0
+        for car in self.vehicles:
+            if getattr(car, self.axis) > pos:
+                break
+            index += 1
+
+        vehicle.leader = self.vehicles[index] if index < len(self.vehicles) else None
+        if index > 0:
+            self.vehicles[index - 1].leader = vehicle
+        self.vehicles.insert(index, vehicle)
+
+    def pop_exited(self, exit_pos):
+        """Removes and returns the vehicles at the front that have driven past `exit_pos`."""
+        exited = []
+        while self.vehicles and getattr(self.vehicles[-1], self.axis) > exit_pos:
+            exited.append(self.vehicles.pop())
+        if exited and self.vehicles:
+            self.vehicles[-1].leader = None
+        return exited
+
+
+class Intersection:
+    """Manages the traffic lights and vehicle queues."""
+    light_class = TrafficLight
+
+    def __init__(self, scenario=None):
+        self.scenario = scenario if scenario is not None else default_scenario()
+        self.ns_light = self.light_class()
+        self.ew_light = self.light_class()
+        self.ns_queue = deque()
+        self.ew_queue = deque()
+        self.set_phase('NS_GREEN')  # Start with NS green
+        self.current_phase = 'NS_GREEN'
+
+        self.center_x, self.center_y = self.scenario.intersection_pos
+
+    def set_phase(self, phase):
+        """Sets the state of the traffic lights based on the phase."""
+        self.current_phase = phase
+        if phase == 'NS_GREEN':
+            self.ns_light.state = 'green'
+            self.ew_light.state = 'red'
+        elif phase == 'NS_YELLOW':
+            self.ns_light.state = 'yellow'
+            self.ew_light.state = 'red'
+        elif phase == 'EW_GREEN':
+            self.ns_light.state = 'red'
+            self.ew_light.state = 'green'
+        elif phase == 'EW_YELLOW':
+            self.ns_light.state = 'red'
+            self.ew_light.state = 'yellow'
+
+
+class SimulationEngine:
+    """Runs vehicles and the signal controller tick by tick, without display or frame cap."""
+    vehicle_class = Vehicle
+    lane_class = Lane
+    intersection_class = Intersection
+
+    def __init__(self, controller, arrivals=None, scenario=None):
+        self.controller = controller
+        self.arrivals = arrivals  # Optional arrivals.ArrivalStream; None draws spawns from `random`
+        self.scenario = scenario if scenario is not None else default_scenario()
+        self.vehicle_pool = VehiclePool(self.vehicle_class)
+        self.lanes = {}
+        self.running = True
+        self.autosaver = None  # Optional checkpoint.Autosaver, ticked once per step
+        self.profiler = None  # Optional profiling.StageProfiler; None times nothing
+        self.tracer = None  # Optional tracing.TraceWriter, fed the state after every step
+        self.stats = None  # Optional stats.TrafficStats, fed exits and queue lengths
+        self.reset()
+
+    def reset(self):
+        """Clears all traffic and statistics so a fresh episode can start."""
+        for lane in self.lanes.values():
+            if isinstance(lane, Lane):
+                for car in lane:
+                    self.vehicle_pool.release(car)
+        self.intersection = self.intersection_class(self.scenario)
+        self.lanes = {'NS': self._make_lane('NS'), 'EW': self._make_lane('EW')}
+        self.total_wait_time = 0
+        self.total_reward = 0
+        self.cars_passed = 0
+        self.frame_count = 0
+        self.next_vehicle_id = 0
+        self.emergency_vehicles_present = []
+        if self.stats is not None:
+            self.stats.reset()
+        if hasattr(self.controller, 'reset'):
+            self.controller.reset()
+
+    def _make_lane(self, path):
+        return self.lane_class(path)
+
+    @property
+    def vehicles(self):
+        """Every vehicle currently on the road."""
+        return [car for lane in self.lanes.values() for car in lane]
+
+    def _spawn_vehicle(self):
+        """Randomly spawns new vehicles, including a chance for an ambulance/police."""
+        for path, vehicle_type in self._draw_arrivals():
+            self._add_vehicle(path, vehicle_type)
+
+    def _draw_arrivals(self):
+        """Makes this tick's spawn draws and returns the arrivals as (path, type) pairs."""
+        if self.arrivals is not None:
+            # Pre-generated demand; emergency vehicles still only arrive when none is on the road
+            if self.emergency_vehicles_present:
+                return [arrival for arrival in self.arrivals.next() if arrival[1] == 'Car']
+            return self.arrivals.next()
+
+        arrivals = []
+        scenario = self.scenario
+        path = random.choice(['NS', 'EW'])
+
+        # 1. Spawn Emergency Vehicles (Ambulance/Police)
+        if len(self.emergency_vehicles_present) == 0:
+            if random.random() < scenario.ambulance_spawn_rate:
+                arrivals.append((path, 'Ambulance'))
+            elif random.random() < scenario.police_spawn_rate:
+                arrivals.append((path, 'Police'))
+
+        # 2. Spawn Regular Cars
+        if random.random() < scenario.car_spawn_rate:
+            arrivals.append((path, 'Car'))
+        return arrivals
+
+    def _add_vehicle(self, path, vehicle_type):
+        """Places a newly spawned vehicle at the start of its approach."""
+        vehicle = self.vehicle_pool.acquire(path, vehicle_type, self.scenario)
+        vehicle.id = self.next_vehicle_id
+        self.next_vehicle_id += 1
+        self.lanes[path].add(vehicle)
+
+
+    def _update_vehicles(self):
+        """Updates all vehicles, manages queues, and calculates rewards."""
+        self.intersection.ns_queue.clear()
+        self.intersection.ew_queue.clear()
+        self.emergency_vehicles_present = []
+
+        current_total_wait = 0
+        lights = {'NS': self.intersection.ns_light, 'EW': self.intersection.ew_light}
+        queues = {'NS': self.intersection.ns_queue, 'EW': self.intersection.ew_queue}
+        exit_limits = self.scenario.exit_pos
+        stats = self.stats
+
+        # Each lane is already ordered rear to front, so every car sees its
+        # leader's position from before this tick, in O(1).
+        for path, lane in self.lanes.items():
+            is_green = lights[path].state == 'green'
+            queue = queues[path]
+
+            for car in lane:
+                if car.is_emergency:
+                    self.emergency_vehicles_present.append(car.type)
+
+                waited = car.wait_time
+                car.update(is_green)
+
+                if car.is_waiting:
+                    current_total_wait += car.wait_time
+                    queue.append(car)
+                elif waited:
+                    car.total_wait += waited  # The car has just moved off
+
+            # Remove cars that are off-screen (always the front of the lane)
+            exited = lane.pop_exited(exit_limits[path])
+            for car in exited:
+                self.total_wait_time += car.wait_time
+                self.cars_passed += 1
+                if stats is not None:
+                    stats.record_exit(path, self.frame_count, car.total_wait)
+                self.vehicle_pool.release(car)
+
+        return -current_total_wait
+
+    def step(self, arrivals=None):
+        """Advances the simulation by one tick and returns that tick's reward.
+
+        `arrivals` are spawn draws already made for this tick by `fast_forward`.
+        """
+        if self.profiler is not None:
+            return self._profiled_step(arrivals)
+        self.frame_count += 1
+
+        # 1. Update vehicles and get reward
+        reward = self._update_vehicles()
+        self.total_reward += reward
+
+        # 2. Update controller (AI or Fixed)
+        self.controller.update(self.intersection, reward)
+
+        # 3. Spawn new vehicles
+        if arrivals is None:
+            self._spawn_vehicle()
+        else:
+            for path, vehicle_type in arrivals:
+                self._add_vehicle(path, vehicle_type)
+
+        self._after_step()
+        return reward
+
+    def _profiled_step(self, arrivals=None):
+        """`step`, with every stage timed into `self.profiler`."""
+        profiler = self.profiler
+        self.frame_count += 1
+
+        # 1. Update vehicles and get reward
+        start = time.perf_counter()
+        reward = self._update_vehicles()
+        self.total_reward += reward
+        profiler.record('vehicles', time.perf_counter() - start)
+
+        # 2. Update controller (AI or Fixed); ticks on which it decided are also timed on their own
+        decisions = getattr(self.controller, 'decisions', 0)
+        start = time.perf_counter()
+        self.controller.update(self.intersection, reward)
+        elapsed = time.perf_counter() - start
+        profiler.record('controller', elapsed)
+        if getattr(self.controller, 'decisions', 0) != decisions:
+            profiler.record('decision', elapsed)
+
+        # 3. Spawn new vehicles
+        start = time.perf_counter()
+        if arrivals is None:
+            self._spawn_vehicle()
+        else:
+            for path, vehicle_type in arrivals:
+                self._add_vehicle(path, vehicle_type)
+        profiler.record('spawn', time.perf_counter() - start)
+
+        self._after_step()
+        return reward
+
+    def _after_step(self):
+        """Feeds the optional per-tick hooks: checkpoint autosaves, statistics and the trace."""
+        if self.autosaver is not None:
+            self.autosaver.tick()
+        if self.stats is not None:
+            self.stats.tick(self.frame_count, {'NS': len(self.intersection.ns_queue),
+                                               'EW': len(self.intersection.ew_queue)})
+        if self.tracer is not None:
+            self.tracer.record(self)
+
+    def run(self, ticks, event_driven=False):
+        """Runs a fixed budget of ticks as fast as the CPU allows.
+
+        With `event_driven`, quiet stretches are jumped over by `fast_forward`;
+        the outcome is identical to stepping every tick. After a failed jump
+        attempt the next one waits a few ticks, doubling up to
+        `config.EVENT_RETRY_LIMIT`, so saturated scenes don't pay for the check
+        on every tick.
+        """
+        remaining = ticks
+        retry = 1
+        wait = 0
+        while remaining > 0 and self.running:
+            arrivals = None
+            if event_driven and wait > 0:
+                wait -= 1
+            elif event_driven:
+                skipped, arrivals = self.fast_forward(remaining - 1)
+                remaining -= skipped
+                if skipped or arrivals:
+                    retry = 1
+                else:
+                    wait = retry
+                    retry = min(retry * 2, config.EVENT_RETRY_LIMIT)
+            self.step(arrivals)
+            remaining -= 1
+
+    def fast_forward(self, max_ticks):
+        """Jumps over up to `max_ticks` ticks on which nothing but steady motion and timers change.
+
+        A tick is quiet when every car keeps a steady motion (see
+        `_quiet_horizon`), no car reaches the stop zone, its leader's gap or the
+        screen edge, and the controller only counts down. With an
+        `ArrivalStream` the jump ends right before the next arrival. Otherwise
+        spawn draws are still made tick by tick, so the global RNG stream is
+        unchanged, and the first tick with an arrival ends the jump.
+
+        Returns `(skipped, arrivals)`: the ticks jumped over, and the arrivals
+        already drawn for the next tick (None if its draws are still to be made).
+        Needs `Lane` storage and a controller with `idle_ticks`/`skip`; while a
+        tracer records every tick, nothing is skipped.
+        """
+        if self.tracer is not None or not hasattr(self.controller, 'idle_ticks'):
+            return 0, None
+        horizon = min(max_ticks, self.controller.idle_ticks())
+        if self.arrivals is not None:
+            horizon = min(horizon, self.arrivals.idle_ticks())
+        if horizon <= 0:
+            return 0, None
+
+        motions, horizon = self._quiet_horizon(horizon)
+        if horizon <= 0:
+            return 0, None
+
+        # 1. Find the first tick with an arrival
+        arrivals = None
+        skipped = horizon
+        if self.arrivals is not None:
+            self.arrivals.skip(skipped)
+        else:
+            # Make each quiet tick's spawn draws until one of them produces a vehicle.
+            # The draws are gated on the emergency vehicles on the road now, which is
+            # what the next tick's update would report.
+            self.emergency_vehicles_present = [car.type for lane in self.lanes.values()
+                                               for car in lane if car.is_emergency]
+            for tick in range(horizon):
+                arrivals = self._draw_arrivals()
+                if arrivals:
+                    skipped = tick
+                    break
+            else:
+                arrivals = None
+            if skipped == 0:
+                return 0, arrivals
+
+        # 2. Move every car on by its steady motion; waiting cars wait one more tick per tick
+        self.intersection.ns_queue.clear()
+        self.intersection.ew_queue.clear()
+        queues = {'NS': self.intersection.ns_queue, 'EW': self.intersection.ew_queue}
+        waiting_cars = 0
+        waited = 0
+        for car, axis, motion, is_waiting in motions:
+            if motion:
+                setattr(car, axis, getattr(car, axis) + skipped * motion)
+            car.is_waiting = is_waiting
+            car.is_moving = not is_waiting
+            if is_waiting:
+                waiting_cars += 1
+                waited += car.wait_time
+                car.wait_time += skipped
+                queues[car.path].append(car)
+            else:
+                car.total_wait += car.wait_time
+                car.wait_time = 0
+
+        # 3. Every skipped tick's reward is minus the waiting cars' summed wait after it
+        self.total_reward -= skipped * waited + waiting_cars * skipped * (skipped + 1) // 2
+
+        self.frame_count += skipped
+        self.controller.skip(skipped)
+        if self.autosaver is not None:
+            self.autosaver.tick(skipped)
+        if self.stats is not None:
+            self.stats.tick(self.frame_count, {path: len(queue) for path, queue in queues.items()}, skipped)
+        return skipped, arrivals
+
+    def _quiet_horizon(self, horizon):
+        """Works out every car's steady motion and shortens `horizon` to the first event.
+
+        A car is steady if it cruises at its own speed, or if it waits behind
+        the stop line or right behind its leader, moving with the leader (a
+        fast emergency vehicle stuck behind a car snaps behind it every tick).
+        Returns `(motions, horizon)` with one `(car, axis, motion, is_waiting)`
+        per car in lane order, rear first; `horizon` is 0 if the very next tick
+        has an event.
+        """
+        motions = []
+        lights = {'NS': self.intersection.ns_light, 'EW': self.intersection.ew_light}
+        exit_limits = self.scenario.exit_pos
+        min_gap = self.scenario.min_follow_distance
+
+        for path, lane in self.lanes.items():
+            is_red = lights[path].state != 'green'
+            axis = lane.axis
+            exit_pos = exit_limits[path]
+            lane_motions = []
+
+            # Front to rear, so each leader's motion is known before its follower's
+            leader_motion = 0
+            for car in reversed(lane.vehicles):
+                pos = getattr(car, axis)
+                speed = car.speed
+                length = car.height if path == 'NS' else car.width
+                front = pos + length
+                leader = car.leader
+                is_at_stop_line = pos < car.stop_pos and front + speed >= car.stop_pos
+
+                if is_red and is_at_stop_line:
+                    if car.is_emergency and leader is None:
+                        # Running the red light is left to normal ticks
+                        return [], 0
+                    # Held at the line until the light changes
+                    if pos != car.stop_pos - length:
+                        return [], 0
+                    lane_motions.append((car, axis, 0, True))
+                    leader_motion = 0
+                    continue
+
+                motion = speed
+                is_waiting = False
+                if leader is not None:
+                    distance = getattr(leader, axis) - front
+                    if distance < min_gap + speed:
+                        # Stopping behind the leader every tick, so moving with it
+                        if leader_motion >= speed or distance != min_gap + leader_motion:
+                            return [], 0
+                        motion = leader_motion
+                        is_waiting = True
+                    elif leader_motion < speed:
+                        # Cruising: the gap closes by the speed difference each tick
+                        gap = distance - (min_gap + speed)
+                        horizon = min(horizon, int(gap // (speed - leader_motion)) + 1)
+
+                if motion:
+                    if is_red and pos < car.stop_pos:
+                        # Quiet until the tick on which it would enter the stop zone
+                        horizon = min(horizon, math.ceil((car.stop_pos - front - speed) / motion))
+                    # Quiet while it stays on screen
+                    horizon = min(horizon, int((exit_pos - pos) // motion))
+                    if horizon <= 0:
+                        return [], 0
+                lane_motions.append((car, axis, motion, is_waiting))
+                leader_motion = motion
+
+            lane_motions.reverse()
+            motions.extend(lane_motions)
+        return motions, horizon
+
+    def run_episodes(self, episodes, ticks_per_episode=config.EPISODE_TICKS, event_driven=False):
+        """Runs several independent episodes and returns a summary dict for each one."""
+        results = []
+        for _ in range(episodes):
+            self.reset()
+            self.run(ticks_per_episode, event_driven)
+
+            if hasattr(self.controller, 'agent'):
+                self.controller.agent.decay_epsilon()
+
+            results.append({
+                'ticks': self.frame_count,
+                'cars_passed': self.cars_passed,
+                'total_wait_time': self.total_wait_time,
+                'total_reward': self.total_reward,
+            })
+        return results
@@ -0,0 +1,142 @@
+# env.py
+# A reset/step/observe API around the headless engine, for policies that run outside the loop.
+#
+# The policy makes the keep/switch choices that `QLearningController` makes
+# internally, at the same decision points: `step(action)` applies one choice
+# and runs the simulation to the next decision point. `server.py` serves these
+# environments over a local socket to policies in other processes.
+import numpy as np
+import config
+from arrivals import ArrivalStream
+from engine import SimulationEngine
+from scenario import default_scenario
+from tabular import emergency_waiting
+
+KEEP, SWITCH = 0, 1
+
+# One observation per decision point, as int32 in this order
+OBSERVATION_FIELDS = ('ns_queue', 'ew_queue', 'phase', 'ns_emergency', 'ew_emergency')
+
+
+class ExternalController:
+    """`QLearningController` timing, with each decision left to whoever drives the engine.
+
+    When a decision is due, `update` stops counting and sets `due`; the
+    lights hold until `apply(intersection, action)` is called.
+    """
+    def __init__(self, decision_interval=config.AI_DECISION_INTERVAL, yellow_time=config.AI_YELLOW_TIME):
+        self.decision_interval = decision_interval
+        self.yellow_time = yellow_time
+        self.decisions = 0  # Keep/switch choices made so far
+        self.reset()
+
+    def reset(self):
+        self.timer = self.decision_interval
+        self.is_yellow = False
+        self.due = False
+        self.decisions = 0
+
+    def idle_ticks(self):
+        """How many upcoming updates will do nothing but count the timer down."""
+        return 0 if self.due else max(self.timer - 1, 0)
+
+    def skip(self, ticks):
+        """Applies `ticks` idle updates at once (see `idle_ticks`)."""
+        self.timer -= ticks
+
+    def ticks_to_decision(self):
+        """Updates until the next decision is due."""
+        return 0 if self.due else self.timer + (self.decision_interval if self.is_yellow else 0)
+
+    def update(self, intersection, reward=None):
+        if self.due:
+            return
+        self.timer -= 1
+        if self.is_yellow:
+            if self.timer <= 0:
+                # Yellow finished: switch to the other green and start a new decision timer
+                self.is_yellow = False
+                intersection.set_phase('EW_GREEN' if intersection.current_phase == 'NS_YELLOW' else 'NS_GREEN')
+                self.timer = self.decision_interval
+        elif self.timer <= 0:
+            self.due = True
+
+    def apply(self, intersection, action):
+        """Carries out the due decision: KEEP the phase or SWITCH through yellow."""
+        self.decisions += 1
+        self.due = False
+        if action == SWITCH:
+            self.is_yellow = True
+            self.timer = self.yellow_time
+            intersection.set_phase('NS_YELLOW' if intersection.current_phase.startswith('NS') else 'EW_YELLOW')
+        else:
+            self.timer = self.decision_interval
+
+
+class TrafficEnv:
+    """One intersection driven decision by decision.
+
+    `reset()` starts an episode on fresh seeded demand and returns the first
+    observation. `step(action)` returns `(observation, reward, done)`, where
+    the reward is the one `QLearningController` would learn from: minus the
+    total wait of the queued vehicles on the decision tick. An episode is done
+    once it has run `episode_ticks` ticks. Every reset draws new demand from
+    `seed`, so a seeded env repeats its sequence of episodes. Demand and
+    signal timings come from `scenario` (config.py's by default).
+
+        env = TrafficEnv(seed=1)
+        observation = env.reset()
+        done = False
+        while not done:
+            observation, reward, done = env.step(policy(observation))
+    """
+    def __init__(self, episode_ticks=config.ENV_EPISODE_TICKS, seed=None, event_driven=True, scenario=None):
+        if scenario is None:
+            scenario = default_scenario()
+        self.episode_ticks = episode_ticks
+        self.event_driven = event_driven
+        self.seeds = np.random.SeedSequence(seed)
+        self.scenario = scenario
+        self.controller = ExternalController(scenario.ai_decision_interval, scenario.ai_yellow_time)
+        self.engine = SimulationEngine(self.controller, scenario=scenario)
+        self.done = True  # Until the first reset
+
+    def reset(self):
+        """Starts a new episode and runs it to the first decision point."""
+        self.engine.arrivals = ArrivalStream(seed=self.seeds.spawn(1)[0], scenario=self.scenario)
+        self.engine.reset()
+        self.done = False
+        self._run_to_decision()
+        return self.observe()
+
+    def step(self, action):
+        """Applies `action` (KEEP or SWITCH) and runs to the next decision point or the episode's end."""
+        if self.done:
+            raise RuntimeError("step() called on a finished episode; call reset() first")
+        if action not in (KEEP, SWITCH):
+            raise ValueError(f"Unknown action {action}; expected KEEP (0) or SWITCH (1)")
+        self.controller.apply(self.engine.intersection, action)
+        reward = self._run_to_decision()
+        return self.observe(), reward, self.done
+
+    def observe(self):
+        """The current state as an int32 array in `OBSERVATION_FIELDS` order."""
+        intersection = self.engine.intersection
+        return np.array([
+            len(intersection.ns_queue),
+            len(intersection.ew_queue),
+            0 if intersection.current_phase.startswith('NS') else 1,
+            emergency_waiting(intersection.ns_queue),
+            emergency_waiting(intersection.ew_queue),
+        ], dtype=np.int32)
+
+    def _run_to_decision(self):
+        """Steps until a decision is due or the episode ends; returns the reward of the last tick."""
+        engine = self.engine
+        ticks = min(self.controller.ticks_to_decision(), self.episode_ticks - engine.frame_count)
+        reward = 0
+        if ticks > 0:
+            engine.run(ticks - 1, event_driven=self.event_driven)
+            reward = engine.step()
+        self.done = engine.frame_count >= self.episode_ticks
+        return reward
@@ -1,50 +1,101 @@
 # main.py
-import pygame
+#     python main.py                          # watch the simulation
+#     python main.py --headless --episodes 5  # run it without a display
+#
+# pygame is only imported for the display, so headless runs start without SDL.
+import argparse
 import config
-from simulation import Simulation
+from engine import SimulationEngine
 from controller import FixedTimeController, QLearningController, QLearningAgent
+from tabular import FlatQLearningAgent
+from checkpoint import Autosaver, load_agent
+from tracing import TraceWriter
+from scenario import Scenario, default_scenario
+from stats import TrafficStats
+
+def run_headless(sim, episodes, ticks):
+    """Runs `episodes` episodes of `ticks` ticks without a display and prints a line for each."""
+    sim.stats = TrafficStats()
+    for episode in range(episodes):
+        result = sim.run_episodes(1, ticks, event_driven=True)[0]
+        print(f"Episode {episode + 1}: {result['cars_passed']} cars passed, "
+              f"mean wait {sim.stats.mean_wait() / config.SIM_FPS:.2f} s, reward {result['total_reward']}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the traffic simulation.")
+    parser.add_argument('--headless', action='store_true', default=config.HEADLESS,
+                        help="run without a display (pygame is never imported)")
+    parser.add_argument('--episodes', type=int, default=1, help="headless episodes to run")
+    parser.add_argument('--ticks', type=int, default=config.EPISODE_TICKS, help="ticks per headless episode")
+    args = parser.parse_args()
+
     # --- CHOOSE YOUR MODE ---
     # MODE = "FIXED"
     MODE = "AI"
     # -------------------------
 
+    # Scenario file, or the settings in config.py
+    scenario = Scenario.load(config.SCENARIO_PATH) if config.SCENARIO_PATH else default_scenario()
+
+    autosaver = None
     if MODE == "AI":
         # Create the AI agent
-        agent = QLearningAgent(
+        agent_class = FlatQLearningAgent if config.Q_AGENT == 'flat' else QLearningAgent
+        agent = agent_class(
             alpha=config.ALPHA,
             gamma=config.GAMMA,
             epsilon=config.EPSILON,
             min_epsilon=config.MIN_EPSILON,
             decay=config.EPSILON_DECAY
         )
+
+        # Warm-start from the last saved Q-table and keep saving as it learns
+        if load_agent(agent):
+            print(f"Loaded Q-table from {config.CHECKPOINT_PATH} (epsilon {agent.epsilon:.4f})")
+        autosaver = Autosaver(agent)
         
         # Create the AI controller
         controller = QLearningController(
             agent=agent,
-            decision_interval=config.AI_DECISION_INTERVAL,
-            yellow_time=config.AI_YELLOW_TIME
+            decision_interval=scenario.ai_decision_interval,
+            yellow_time=scenario.ai_yellow_time
         )
         
-        # Note: To train the agent, you would run this `main()` function
-        # many times in a loop, perhaps with visualization turned off.
-        # For this example, we just run it once and watch it learn.
+        # Note: To train the agent without a display, run many episodes with
+        # `python main.py --headless --episodes N` (or training.py) instead.
+        # Without --headless, we just run it once and watch it learn.
         
     else: # MODE == "FIXED"
         controller = FixedTimeController(
-            green_time=config.FIXED_GREEN_TIME,
-            yellow_time=config.FIXED_YELLOW_TIME
+            green_time=scenario.fixed_green_time,
+            yellow_time=scenario.fixed_yellow_time
         )
 
-    # Create and run the simulation
-    sim = Simulation(controller, mode=MODE)
+    # Create and run the simulation; the display modules load only when needed
+    if args.headless:
+        sim = SimulationEngine(controller, scenario=scenario)
+    else:
+        from simulation import Simulation
+        sim = Simulation(controller, mode=MODE, scenario=scenario)
+    sim.autosaver = autosaver
+    if config.TRACE_PATH:
+        # Record every tick for replay.py
+        sim.tracer = TraceWriter(config.TRACE_PATH, scenario=scenario)
     try:
-        sim.run()
+        if args.headless:
+            run_headless(sim, args.episodes, args.ticks)
+        else:
+            sim.run()
     except KeyboardInterrupt:
         print("Simulation stopped.")
     finally:
-        pygame.quit()
+        if autosaver is not None:
+            autosaver.close()
+        if sim.tracer is not None:
+            sim.tracer.close()
+        if not args.headless:
+            import pygame
+            pygame.quit()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,247 @@
+# network.py
+# Grids and corridors of signalized intersections, each with its own controller or all in one bank.
+#
+# Every column of the grid is a one-way NS corridor and every row a one-way
+# EW corridor. A vehicle that crosses one intersection is already on the next
+# intersection's approach, so links hand traffic on without any copying.
+import numpy as np
+import config
+from scenario import default_scenario
+from vectorized import advance, type_speeds, FlatVehicleStore, TYPE_CAR, TYPE_AMBULANCE, TYPE_POLICE
+
+NS, EW = 0, 1
+
+# Which approach gets green in each phase: (NS, EW)
+PHASE_GREEN = {
+    'NS_GREEN': (True, False),
+    'NS_YELLOW': (False, False),
+    'EW_GREEN': (False, True),
+    'EW_YELLOW': (False, False),
+}
+
+# Phases as codes, for the per-node phase array: code = 2 * (EW) + (yellow)
+PHASES = ('NS_GREEN', 'NS_YELLOW', 'EW_GREEN', 'EW_YELLOW')
+PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+PHASE_GREEN_BY_CODE = np.array([PHASE_GREEN[phase] for phase in PHASES])
+
+
+class ApproachQueue:
+    """The length of one approach's queue, so controllers can keep calling `len()` on it."""
+    __slots__ = ('lengths', 'index')
+
+    def __init__(self, lengths, index):
+        self.lengths = lengths
+        self.index = index
+
+    def __len__(self):
+        return int(self.lengths[self.index])
+
+
+class GridIntersection:
+    """One node of a `GridNetwork`, with the interface controllers expect from `Intersection`."""
+    def __init__(self, network, node):
+        self.network = network
+        self.node = node
+        self.row, self.col = divmod(node, network.cols)
+        self.green = network.green[node]  # View into the network's (node, approach) green flags
+        self.ns_queue = ApproachQueue(network.queue_lengths, 2 * node + NS)
+        self.ew_queue = ApproachQueue(network.queue_lengths, 2 * node + EW)
+        self.set_phase('NS_GREEN')  # Start with NS green
+
+        self.center_x = (self.col + 0.5) * network.spacing
+        self.center_y = (self.row + 0.5) * network.spacing
+
+    @property
+    def current_phase(self):
+        return PHASES[self.network.phase[self.node]]
+
+    def set_phase(self, phase):
+        """Sets the state of this node's lights based on the phase."""
+        self.network.phase[self.node] = PHASE_CODES[phase]
+        self.green[:] = PHASE_GREEN[phase]
+
+
+class GridNetwork(FlatVehicleStore):
+    """A `rows` x `cols` grid of intersections; `rows=1` gives an EW corridor.
+
+    NS corridor `c` runs down column `c` and EW corridor `r` along row `r`.
+    Node `r * cols + c` sits where they cross, `spacing` pixels from its
+    neighbours, with the same stop line offset as the single intersection:
+    a 1 x 1 grid with the default spacing has the geometry of `Simulation`.
+    Vehicles enter at the top and left edges and leave at the bottom and
+    right; each entry sees the demand of one approach of the single
+    intersection. `controller_factory()` is called once per node; or a bank
+    from `controller_bank.py` runs every node's controller in one call per tick.
+    Vehicles, demand and the stop line offset come from `scenario`
+    (config.py's by default).
+
+    Vehicles of all corridors live in one `FlatVehicleStore`, ordered by
+    corridor, then rear to front, and are advanced with `vectorized.advance`, so a tick costs
+    one NumPy pass over the vehicles plus one controller update per node (or
+    one bank update).
+    """
+    LANE_FIELD = 'corridor'
+
+    def __init__(self, rows, cols, controller_factory=None, spacing=config.GRID_SPACING, seed=None,
+                 controller_bank=None, scenario=None):
+        if (controller_factory is None) == (controller_bank is None):
+            raise ValueError("Pass either controller_factory or controller_bank")
+        if scenario is None:
+            scenario = default_scenario()
+        self.scenario = scenario
+        self.rows = rows
+        self.cols = cols
+        self.spacing = spacing
+        self.num_nodes = rows * cols
+        self.num_corridors = cols + rows
+        self.rng = np.random.default_rng(seed)
+
+        # Vehicles and demand; the single intersection splits its rates between two approaches
+        self.stop_line_offset = scenario.stop_line_offset
+        self.vehicle_length = scenario.car_height
+        self.min_gap = scenario.min_follow_distance
+        self.type_speeds = type_speeds(scenario)
+        self.car_rate = scenario.car_spawn_rate / 2
+        self.ambulance_rate = scenario.ambulance_spawn_rate / 2
+        self.police_rate = scenario.police_spawn_rate / 2
+
+        # Corridors 0..cols-1 run NS, the rest run EW
+        self.direction = np.array([NS] * cols + [EW] * rows)
+        self.num_stops = np.array([rows] * cols + [cols] * rows)
+        self.exit_pos = self.num_stops * float(spacing)
+
+        # corridor_nodes[corridor, k] is the k-th node along it; past the last one it
+        # points at a spare always-green row, so vehicles there never see a red light
+        depth = max(rows, cols)
+        self.corridor_nodes = np.full((self.num_corridors, depth + 1), self.num_nodes)
+        for c in range(cols):
+            self.corridor_nodes[c, :rows] = np.arange(rows) * cols + c
+        for r in range(rows):
+            self.corridor_nodes[cols + r, :cols] = r * cols + np.arange(cols)
+
+        self.green = np.zeros((self.num_nodes + 1, 2), dtype=bool)
+        self.queue_lengths = np.zeros(2 * (self.num_nodes + 1), dtype=np.int64)
+        self.phase = np.zeros(self.num_nodes, dtype=np.int8)  # PHASES code per node
+        self.intersections = [GridIntersection(self, node) for node in range(self.num_nodes)]
+        if controller_bank is not None and controller_bank.num_nodes != self.num_nodes:
+            raise ValueError(f"Controller bank has {controller_bank.num_nodes} nodes, the grid {self.num_nodes}")
+        self.controller_bank = controller_bank
+        self.controllers = [] if controller_factory is None else [controller_factory() for _ in range(self.num_nodes)]
+        self.reset()
+
+    def reset(self):
+        """Clears all traffic, signals and statistics so a fresh episode can start."""
+        self._clear_vehicles()
+
+        self.green[:] = False
+        self.green[self.num_nodes] = True
+        self.queue_lengths[:] = 0
+        self.set_phases(np.full(self.num_nodes, PHASE_CODES['NS_GREEN']))
+        for controller in self.controllers:
+            if hasattr(controller, 'reset'):
+                controller.reset()
+        if self.controller_bank is not None:
+            self.controller_bank.reset()
+
+        self.total_wait_time = 0
+        self.total_reward = 0
+        self.cars_passed = 0
+        self.frame_count = 0
+
+    def __len__(self):
+        return len(self.pos)
+
+    def set_phases(self, codes, nodes=None):
+        """Sets the phase (PHASES codes) of `nodes`, or of every node, and their lights."""
+        if nodes is None:
+            nodes = slice(0, self.num_nodes)
+        self.phase[nodes] = codes
+        self.green[nodes] = PHASE_GREEN_BY_CODE[codes]
+
+    def step(self):
+        """Advances the whole network by one tick and returns each node's reward."""
+        self.frame_count += 1
+
+        # 1. Update vehicles and get rewards
+        rewards = self._update_vehicles()
+        self.total_reward += rewards.sum()
+
+        # 2. Update every node's controller with its own reward
+        if self.controller_bank is not None:
+            self.controller_bank.update(self, rewards)
+        else:
+            for controller, intersection, reward in zip(self.controllers, self.intersections, rewards.tolist()):
+                controller.update(intersection, reward)
+
+        # 3. Spawn new vehicles at the edges of the grid
+        self._spawn_vehicles()
+        return rewards
+
+    def run(self, ticks):
+        """Runs a fixed budget of ticks as fast as the CPU allows."""
+        for _ in range(ticks):
+            self.step()
+
+    def _update_vehicles(self):
+        """Advances every vehicle by one tick; returns the per-node rewards."""
+        corridor = self.corridor
+        direction = self.direction[corridor]
+
+        # Each vehicle is bound for the first stop line still ahead of it
+        stops = self.num_stops[corridor]
+        ahead = np.floor((self.pos + self.stop_line_offset) / self.spacing - 0.5).astype(np.int64) + 1
+        ahead = np.clip(ahead, 0, stops)
+        node = self.corridor_nodes[corridor, ahead]
+        stop_pos = np.where(ahead < stops, (ahead + 0.5) * self.spacing - self.stop_line_offset, np.inf)
+        is_green = self.green[node, direction]
+
+        # Each vehicle's leader is the next one in the store if it shares the corridor,
+        # however many intersections lie between them
+        has_leader = np.zeros(len(corridor), dtype=bool)
+        has_leader[:-1] = corridor[1:] == corridor[:-1]
+        leader_pos = np.full(len(corridor), np.inf)
+        leader_pos[:-1] = self.pos[1:]
+
+        self.pos, self.wait_time, self.is_waiting = advance(
+            self.pos, self.vehicle_length, self.speed, self.is_emergency, self.wait_time,
+            has_leader, leader_pos, is_green, stop_pos, self.min_gap)
+
+        # Queues and rewards per approach come from the waiting vehicles
+        approach = (2 * node + direction)[self.is_waiting]
+        size = len(self.queue_lengths)
+        self.queue_lengths[:] = np.bincount(approach, minlength=size)
+        waited = np.bincount(approach, weights=self.wait_time[self.is_waiting], minlength=size)
+        rewards = -waited[:2 * self.num_nodes].reshape(-1, 2).sum(axis=1)
+
+        # Remove vehicles that have left the grid
+        exited = self.pos > self.exit_pos[corridor]
+        if exited.any():
+            self.cars_passed += int(exited.sum())
+            self.total_wait_time += int(self.wait_time[exited].sum())
+            self._keep(~exited)
+        return rewards
+
+    def _spawn_vehicles(self):
+        """Draws this tick's arrivals at every entry, following `_spawn_vehicle` per approach."""
+        n = self.num_corridors
+        draws = self.rng.random((3, n))
+
+        # 1. Emergency vehicles only on corridors that have none
+        has_emergency = np.zeros(n, dtype=bool)
+        has_emergency[self.corridor[self.is_emergency]] = True
+        ambulance = ~has_emergency & (draws[0] < self.ambulance_rate)
+        police = ~has_emergency & ~ambulance & (draws[1] < self.police_rate)
+
+        # 2. Regular cars
+        car = draws[2] < self.car_rate
+
+        emergency_corridors = np.flatnonzero(ambulance | police)
+        car_corridors = np.flatnonzero(car)
+        if len(emergency_corridors) == 0 and len(car_corridors) == 0:
+            return
+
+        # Same-corridor spawns keep their order: the emergency vehicle first, then the car
+        new_corridor = np.concatenate((emergency_corridors, car_corridors))
+        new_type = np.concatenate((np.where(ambulance[emergency_corridors], TYPE_AMBULANCE, TYPE_POLICE),
+                                   np.full(len(car_corridors), TYPE_CAR)))
+        self._insert_vehicles(new_corridor, new_type)
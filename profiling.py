@@ -0,0 +1,74 @@
+# profiling.py
+# Per-stage timing for the simulation loop: where does a tick's time go?
+#
+# Profiling is off unless an engine is given a `StageProfiler` (the display
+# does this when config.PROFILE_STAGES is set). Without one, the loop only
+# pays for a single `is None` check per tick.
+import numpy as np
+import config
+
+# Stages in the order the loop runs them
+STAGES = ('events', 'vehicles', 'controller', 'decision', 'spawn', 'draw')
+
+
+class RollingStat:
+    """The last `window` samples of one timer, kept in a ring buffer."""
+    def __init__(self, window):
+        self.samples = np.zeros(window)
+        self.index = 0
+        self.count = 0  # Samples recorded in total, including overwritten ones
+
+    def add(self, seconds):
+        self.samples[self.index] = seconds
+        self.index += 1
+        if self.index == len(self.samples):
+            self.index = 0
+        self.count += 1
+
+    def window(self):
+        """The samples currently in the window (unordered)."""
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def mean(self):
+        samples = self.window()
+        return float(samples.mean()) if len(samples) else 0.0
+
+    def percentile(self, q):
+        samples = self.window()
+        return float(np.percentile(samples, q)) if len(samples) else 0.0
+
+
+class StageProfiler:
+    """Rolling timings for every stage of the simulation loop.
+
+    Stages are timed with `time.perf_counter()` and fed to `record`. The
+    'decision' stage holds the `controller.update` calls on which the
+    controller actually decided (its `decisions` counter went up).
+
+        sim.profiler = StageProfiler()
+        sim.run(ticks)
+        print(sim.profiler.summary())
+    """
+    def __init__(self, window=config.PROFILE_WINDOW):
+        self.stats = {stage: RollingStat(window) for stage in STAGES}
+
+    def record(self, stage, seconds):
+        self.stats[stage].add(seconds)
+
+    def summary(self):
+        """Returns `{stage: {'count', 'mean_ms', 'p99_ms'}}` for every stage timed so far."""
+        return {
+            stage: {
+                'count': stat.count,
+                'mean_ms': stat.mean() * 1e3,
+                'p99_ms': stat.percentile(99) * 1e3,
+            }
+            for stage, stat in self.stats.items() if stat.count
+        }
+
+    def bottleneck(self):
+        """The stage with the largest mean time per tick, or None before anything is timed."""
+        # Every stage but 'decision' runs once per tick (or frame)
+        means = {stage: stat.mean() for stage, stat in self.stats.items()
+                 if stat.count and stage != 'decision'}
+        return max(means, key=means.get) if means else None
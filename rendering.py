@@ -0,0 +1,140 @@
+# rendering.py
+# Caches for the pygame renderer, so per-frame drawing reuses work from earlier frames.
+import pygame
+import config
+from collections import OrderedDict
+
+class TextCache:
+    """Keeps font objects and rendered text surfaces, evicting the least recently used text."""
+    def __init__(self, max_entries=config.TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.fonts = {}  # (name, size, bold) -> pygame Font
+        self.surfaces = OrderedDict()  # (font spec, text, color) -> rendered Surface
+
+    def font(self, name, size, bold=False):
+        """Returns the font for this spec, looking it up only the first time."""
+        spec = (name, size, bold)
+        font = self.fonts.get(spec)
+        if font is None:
+            font = pygame.font.SysFont(name, size, bold=bold)
+            self.fonts[spec] = font
+        return font
+
+    def render(self, text, color, name='Arial', size=18, bold=False):
+        """Returns an antialiased surface for `text`, rendering it only if it is not cached."""
+        key = ((name, size, bold), text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.font(name, size, bold).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """Forgets every font and surface, e.g. after pygame has been shut down and restarted."""
+        self.fonts.clear()
+        self.surfaces.clear()
+
+
+# Shared by every HUD element; fonts are only created on first use, after pygame.font.init()
+text_cache = TextCache()
+
+
+def draw_vehicle_sprite(vehicle_type, color, path, size, is_moving, is_waiting, is_left_flash):
+    """Renders one vehicle look onto a transparent surface, with the `size` (width, height) body at (0, 0)."""
+    is_emergency = vehicle_type in ['Ambulance', 'Police']
+    body_w, body_h = size
+
+    # 1. Vehicle Body with Shadow Effect (more appealing/3D)
+    shadow_offset = 2
+    surface = pygame.Surface((body_w + shadow_offset, body_h + shadow_offset), pygame.SRCALPHA)
+    body_rect = pygame.Rect(0, 0, body_w, body_h)
+    pygame.draw.rect(surface, (100, 100, 100), body_rect.move(shadow_offset, shadow_offset), border_radius=5)
+    pygame.draw.rect(surface, color, body_rect, border_radius=5)
+
+    # 2. Cabin/Roof (using a lighter shade of the body color for contrast)
+    color_r, color_g, color_b = color
+    cabin_color = (min(255, color_r + 30), min(255, color_g + 30), min(255, color_b + 30))
+    if is_emergency: cabin_color = (200, 200, 200) # Fixed light grey for emergency
+
+    if path == 'NS':
+        roof_rect = (2, 10, body_w - 4, 15)
+    else:
+        roof_rect = (10, 2, 15, body_h - 4)
+    pygame.draw.rect(surface, cabin_color, roof_rect, border_radius=2)
+
+    # 3. Wheels (small, black rectangles)
+    if path == 'NS':
+        wheels = [(3, 5, 4, 8), (body_w - 7, 5, 4, 8),
+                  (3, body_h - 13, 4, 8), (body_w - 7, body_h - 13, 4, 8)]
+    else:
+        wheels = [(5, 3, 8, 4), (5, body_h - 7, 8, 4),
+                  (body_w - 13, 3, 8, 4), (body_w - 13, body_h - 7, 8, 4)]
+    for wheel in wheels:
+        pygame.draw.rect(surface, config.COLOR_TIRE, wheel, border_radius=1)
+
+    # 4. Emergency Vehicle Details & Flashing Sirens
+    if is_emergency:
+        siren_left_color = config.COLOR_AMBULANCE_SIREN if vehicle_type == 'Ambulance' else (255, 0, 0)
+        siren_right_color = config.COLOR_AMBULANCE_SIREN if vehicle_type == 'Ambulance' else config.COLOR_POLICE_SIREN
+        flash_color = siren_left_color if is_left_flash else siren_right_color
+
+        if path == 'NS':
+            # Light bar on top
+            light_rect = (body_w // 2 - 5, 0, 10, 3)
+        else:
+            # Light bar on front (right side of the vehicle body)
+            light_rect = (body_w - 3, body_h // 2 - 5, 3, 10)
+        pygame.draw.rect(surface, flash_color, light_rect, border_radius=1)
+        pygame.draw.rect(surface, config.COLOR_DARK_TEXT, light_rect, 1, border_radius=1) # Casing
+
+    # 5. UI/UX: Movement Indicator (Vibrant Arrow)
+    if is_moving and not is_emergency:
+        arrow_size = 5
+        if path == 'NS':
+            # Arrow points down (traveling North to South is Y+)
+            points = [(body_w // 2, body_h),
+                      (body_w // 2 - arrow_size, body_h - arrow_size * 2),
+                      (body_w // 2 + arrow_size, body_h - arrow_size * 2)]
+        else:
+            # Arrow points right (traveling West to East is X+)
+            points = [(body_w, body_h // 2),
+                      (body_w - arrow_size * 2, body_h // 2 - arrow_size),
+                      (body_w - arrow_size * 2, body_h // 2 + arrow_size)]
+        pygame.draw.polygon(surface, config.COLOR_ACCENT_UI, points)
+
+    # 6. UI/UX: Waiting Highlight (Pop of color for waiting)
+    if is_waiting:
+        # Draw a thick yellow outline to signify it's stationary and waiting
+        pygame.draw.rect(surface, config.COLOR_YELLOW, body_rect, 3, border_radius=5)
+
+    return surface.convert_alpha() if pygame.display.get_surface() else surface
+
+
+class SpriteCache:
+    """Pre-rendered vehicle images, one per (type, color, path, size, moving/waiting, siren phase)."""
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, vehicle_type, color, path, size, is_moving, is_waiting, frame_count=0):
+        """Returns the sprite for this look, rendering it the first time it is needed."""
+        # Only emergency vehicles animate: 15 frames left flash, 15 frames right
+        siren_phase = frame_count % 30 < 15 if vehicle_type in ['Ambulance', 'Police'] else None
+        key = (vehicle_type, color, path, size, is_moving, is_waiting, siren_phase)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = draw_vehicle_sprite(vehicle_type, color, path, size, is_moving, is_waiting, siren_phase)
+            self.sprites[key] = sprite
+        return sprite
+
+    def clear(self):
+        """Forgets every sprite, e.g. after the display has been recreated."""
+        self.sprites.clear()
+
+
+# The set of looks is small and fixed, so this cache never needs eviction
+sprite_cache = SpriteCache()
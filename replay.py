@@ -0,0 +1,164 @@
+# replay.py
+# Plays back a recorded trace (see tracing.py) without running physics or a controller.
+#
+#     python replay.py run.trace                     # the whole run
+#     python replay.py run.trace --start 1200 --end 3600
+#
+# Space pauses, Left/Right step one tick (with Shift, one second), Up/Down
+# double or halve the playback speed, Home/End jump to the ends of the range
+# and clicking or dragging on the timeline scrubs. Q quits.
+import argparse
+import pygame
+import config
+from scenario import Scenario, default_scenario
+from simulation import Intersection
+from rendering import text_cache, sprite_cache
+from tracing import TraceReader, PATHS, PHASES
+from vectorized import VEHICLE_TYPES, TYPE_AMBULANCE, TYPE_POLICE
+
+TIMELINE_HEIGHT = 40
+TYPE_COLORS = {TYPE_AMBULANCE: config.COLOR_AMBULANCE, TYPE_POLICE: config.COLOR_POLICE}
+
+
+class ReplayViewer:
+    """Draws the ticks `start` to `end` (exclusive indices) of a `TraceReader`.
+
+    `scenario` gives the road and vehicle geometry, and should be the one the
+    trace was recorded with (config.py's by default).
+    """
+    def __init__(self, reader, start=0, end=None, scenario=None):
+        if scenario is None:
+            scenario = default_scenario()
+        if len(reader) == 0:
+            raise ValueError(f"{reader.path} has no complete ticks")
+        self.reader = reader
+        self.scenario = scenario
+        self.start = start
+        self.end = len(reader) if end is None else end
+        self.position = float(start)  # Index of the tick on screen; fractional while playing
+        self.speed = 1.0
+        self.render_frame = 0  # Frames drawn so far; times the siren animation, whatever the speed
+        self.paused = False
+        self.scrubbing = False
+        self.running = True
+
+        pygame.init()
+        pygame.font.init()
+        pygame.display.set_caption(f"UrbanFlow - Replay of {reader.path}")
+        self.screen = pygame.display.set_mode((scenario.width, scenario.height))
+        text_cache.clear()
+        sprite_cache.clear()
+        self.clock = pygame.time.Clock()
+
+        self.intersection = Intersection(scenario)
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(config.COLOR_SKY)
+        self.intersection._draw_road(self.background)
+        self.timeline = pygame.Rect(20, scenario.height - TIMELINE_HEIGHT, scenario.width - 40, 12)
+
+    def seek(self, index):
+        """Moves to tick `index` of the trace, kept inside the replayed range."""
+        self.position = float(min(max(index, self.start), self.end - 1))
+
+    def _seek_to_mouse(self, x):
+        fraction = (x - self.timeline.x) / self.timeline.width
+        self.seek(round(self.start + fraction * (self.end - 1 - self.start)))
+
+    def _handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                step = config.SIM_FPS if event.mod & pygame.KMOD_SHIFT else 1
+                if event.key == pygame.K_q:
+                    self.running = False
+                elif event.key == pygame.K_SPACE:
+                    self.paused = not self.paused
+                elif event.key == pygame.K_RIGHT:
+                    self.seek(int(self.position) + step)
+                elif event.key == pygame.K_LEFT:
+                    self.seek(int(self.position) - step)
+                elif event.key == pygame.K_UP:
+                    self.speed = min(self.speed * 2, config.MAX_SPEED_MULTIPLIER)
+                elif event.key == pygame.K_DOWN:
+                    self.speed = max(self.speed / 2, config.MIN_SPEED_MULTIPLIER)
+                elif event.key == pygame.K_HOME:
+                    self.seek(self.start)
+                elif event.key == pygame.K_END:
+                    self.seek(self.end - 1)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if self.timeline.inflate(0, 20).collidepoint(event.pos):
+                    self.scrubbing = True
+                    self._seek_to_mouse(event.pos[0])
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self.scrubbing = False
+            elif event.type == pygame.MOUSEMOTION and self.scrubbing:
+                self._seek_to_mouse(event.pos[0])
+
+    def _draw(self):
+        """Draws the tick at the current position, with its HUD and the timeline."""
+        tick, vehicles = self.reader[int(self.position)]
+        frame_count = int(tick['tick'])
+        self.screen.blit(self.background, (0, 0))
+
+        # 1. Lights
+        self.intersection.set_phase(PHASES[tick['phase']])
+        self.intersection.draw(self.screen, controller_timer=int(tick['timer']))
+
+        # 2. Vehicles, one cached sprite each
+        sprites = []
+        sizes = self.scenario.vehicle_size
+        for vehicle_id, x, y, path, type_code, color, is_waiting in vehicles.tolist():
+            fill = TYPE_COLORS.get(type_code) or config.VEHICLE_COLORS[color]
+            sprite = sprite_cache.get(VEHICLE_TYPES[type_code], fill, PATHS[path], sizes[PATHS[path]],
+                                      not is_waiting, bool(is_waiting), self.render_frame)
+            sprites.append((sprite, (x, y)))
+        self.screen.blits(sprites)
+
+        # 3. HUD and timeline
+        status = "PAUSED" if self.paused else f"{self.speed:g}x"
+        lines = [
+            f"Tick {frame_count} ({frame_count / config.SIM_FPS:.1f} s)  {status}",
+            f"{PHASES[tick['phase']]}  |  {int(tick['count'])} vehicles  |  {int(tick['cars_passed'])} passed",
+        ]
+        for i, line in enumerate(lines):
+            surface = text_cache.render(line, config.COLOR_DARK_TEXT, size=18, bold=i == 0)
+            self.screen.blit(surface, (20, 20 + i * 24))
+
+        pygame.draw.rect(self.screen, config.COLOR_STATS_BACKGROUND, self.timeline, border_radius=6)
+        span = max(self.end - 1 - self.start, 1)
+        done = self.timeline.copy()
+        done.width = round(self.timeline.width * (int(self.position) - self.start) / span)
+        pygame.draw.rect(self.screen, config.COLOR_ACCENT_UI, done, border_radius=6)
+        pygame.draw.circle(self.screen, config.COLOR_ACCENT_UI, (done.right, done.centery), 9)
+        pygame.display.flip()
+
+    def run(self):
+        """Plays the range at `speed` x SIM_FPS recorded ticks per second until closed."""
+        while self.running:
+            self.clock.tick(config.RENDER_FPS)
+            self._handle_events()
+            if not self.paused and not self.scrubbing:
+                self.position = min(self.position + self.speed * config.SIM_FPS / config.RENDER_FPS,
+                                    self.end - 1)
+            self.render_frame += 1
+            self._draw()
+        pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded simulation trace.")
+    parser.add_argument('trace', help="trace file written by tracing.TraceWriter")
+    parser.add_argument('--start', type=int, default=None, help="first tick to show")
+    parser.add_argument('--end', type=int, default=None, help="tick to stop at")
+    args = parser.parse_args()
+
+    reader = TraceReader(args.trace)
+    start = 0 if args.start is None else min(reader.find(args.start), max(len(reader) - 1, 0))
+    end = len(reader) if args.end is None else max(reader.find(args.end), start + 1)
+    scenario = Scenario.load(config.SCENARIO_PATH) if config.SCENARIO_PATH else default_scenario()
+    ReplayViewer(reader, start, min(end, len(reader)), scenario).run()
+
+
+if __name__ == "__main__":
+    main()
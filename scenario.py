@@ -0,0 +1,130 @@
+# scenario.py
+# Immutable scenario parameters: demand, vehicles, road geometry and signal timings.
+#
+# A scenario starts from the values in config.py and can override any of them
+# from a JSON file of lower-case config names:
+#
+#     {"name": "rush hour", "car_spawn_rate": 0.06, "fixed_green_time": 240}
+#
+# Values the simulation derives from them (stop lines, spawn positions, exit
+# positions, speeds per vehicle type) are worked out once when the scenario
+# is built. Engines, intersections and vehicles take a scenario instead of
+# reading config in their loops, so scenarios can run side by side in one
+# process.
+import json
+from types import MappingProxyType
+import config
+
+# Scenario field -> the config.py setting it defaults to
+FIELDS = {
+    'name': None,
+    'car_width': 'CAR_WIDTH',
+    'car_height': 'CAR_HEIGHT',
+    'car_speed': 'CAR_SPEED',
+    'ambulance_speed': 'AMBULANCE_SPEED',
+    'police_speed': 'POLICE_SPEED',
+    'car_spawn_rate': 'CAR_SPAWN_RATE',
+    'ambulance_spawn_rate': 'AMBULANCE_SPAWN_RATE',
+    'police_spawn_rate': 'POLICE_SPAWN_RATE',
+    'min_follow_distance': 'MIN_FOLLOW_DISTANCE',
+    'width': 'SCREEN_WIDTH',
+    'height': 'SCREEN_HEIGHT',
+    'intersection_pos': 'INTERSECTION_POS',
+    'road_width': 'ROAD_WIDTH',
+    'lane_width': 'LANE_WIDTH',
+    'stop_line_offset': 'STOP_LINE_OFFSET',
+    'fixed_green_time': 'FIXED_GREEN_TIME',
+    'fixed_yellow_time': 'FIXED_YELLOW_TIME',
+    'ai_decision_interval': 'AI_DECISION_INTERVAL',
+    'ai_yellow_time': 'AI_YELLOW_TIME',
+}
+
+# Worked out from the fields; all keyed by path ('NS', 'EW') except `speeds`, keyed by vehicle type
+DERIVED = ('stop_pos', 'exit_pos', 'spawn_pos', 'vehicle_size', 'speeds')
+
+
+class Scenario:
+    """A frozen set of simulation parameters; `replace()` makes a changed copy.
+
+        scenario = Scenario.load('rush_hour.json')
+        sim = SimulationEngine(controller, scenario=scenario)
+    """
+    __slots__ = tuple(FIELDS) + DERIVED
+
+    def __init__(self, **values):
+        unknown = set(values) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown scenario settings: {', '.join(sorted(unknown))}")
+        for name, setting in FIELDS.items():
+            default = 'default' if setting is None else getattr(config, setting)
+            object.__setattr__(self, name, values.get(name, default))
+        object.__setattr__(self, 'intersection_pos', tuple(self.intersection_pos))
+        self._derive()
+
+    def _derive(self):
+        center_x, center_y = self.intersection_pos
+        # EW vehicles are rotated, so their width runs along the road
+        derived = {
+            'stop_pos': {'NS': center_y - self.stop_line_offset, 'EW': center_x - self.stop_line_offset},
+            'exit_pos': {'NS': self.height, 'EW': self.width},
+            'spawn_pos': {
+                'NS': (center_x - self.lane_width / 2 - self.car_width / 2, 0 - self.car_height),
+                'EW': (0 - self.car_height, center_y - self.lane_width / 2 - self.car_width / 2),
+            },
+            'vehicle_size': {'NS': (self.car_width, self.car_height), 'EW': (self.car_height, self.car_width)},
+            'speeds': {'Car': self.car_speed, 'Ambulance': self.ambulance_speed, 'Police': self.police_speed},
+        }
+        for name, value in derived.items():
+            object.__setattr__(self, name, MappingProxyType(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Scenario is immutable; use replace({name}=...)")
+
+    def __delattr__(self, name):
+        raise AttributeError("Scenario is immutable")
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in FIELDS)
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return f"Scenario({self.name!r})"
+
+    def as_dict(self):
+        """The scenario's settings, as they would be written to a file."""
+        values = {name: getattr(self, name) for name in FIELDS}
+        values['intersection_pos'] = list(self.intersection_pos)
+        return values
+
+    def replace(self, **changes):
+        """A copy of this scenario with `changes` applied."""
+        return Scenario(**{**self.as_dict(), **changes})
+
+    @classmethod
+    def load(cls, path):
+        """Reads a JSON scenario file; settings it leaves out keep their config.py value."""
+        with open(path) as f:
+            values = json.load(f)
+        if not isinstance(values, dict):
+            raise ValueError(f"{path} must hold one JSON object of scenario settings")
+        return cls(**values)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
+
+
+_default = None
+
+
+def default_scenario():
+    """The scenario of config.py, built on first use and shared from then on."""
+    global _default
+    if _default is None:
+        _default = Scenario()
+    return _default
@@ -0,0 +1,249 @@
+# server.py
+# Serves `env.TrafficEnv` instances to external policies over a local Unix socket.
+#
+#     python server.py                       # listens on config.ENV_SOCKET_PATH
+#
+# Every message, both ways, is an 8-byte header followed by `count` fixed-width
+# little-endian records (the dtypes below):
+#
+#     request op  payload                      response payload
+#     CREATE      count x seed (i8, -1 none)   count x env id (u4)
+#     RESET       count x env id (u4)          count x OBSERVATION
+#     STEP        count x STEP                 count x RESULT
+#     OBSERVE     count x env id (u4)          count x OBSERVATION
+#     CLOSE       count x env id (u4)          nothing
+#
+# A response echoes the request's op; on failure it is ERROR, with the message
+# as `count` bytes of UTF-8, and none of the request's records after the failing
+# one are run. STEP records run in order, so one request can step many envs
+# once each, one env many times, or any mix. Envs belong to the connection
+# that created them and are dropped when it closes.
+import argparse
+import os
+import socketserver
+import socket
+import numpy as np
+import config
+from env import TrafficEnv, OBSERVATION_FIELDS
+
+OP_CREATE, OP_RESET, OP_STEP, OP_OBSERVE, OP_CLOSE = 1, 2, 3, 4, 5
+OP_ERROR = 255
+
+HEADER_DTYPE = np.dtype([
+    ('op', 'u1'),
+    ('reserved', 'V3'),
+    ('count', '<u4'),
+])
+
+SEED_DTYPE = np.dtype('<i8')
+ID_DTYPE = np.dtype('<u4')
+
+STEP_DTYPE = np.dtype([
+    ('env', '<u4'),
+    ('action', 'u1'),        # env.KEEP or env.SWITCH
+    ('reserved', 'V3'),
+])
+
+OBSERVATION_DTYPE = np.dtype([(name, '<i4') for name in OBSERVATION_FIELDS])
+
+RESULT_DTYPE = np.dtype([
+    ('observation', OBSERVATION_DTYPE),
+    ('reserved', 'V3'),
+    ('done', 'u1'),
+    ('reward', '<f8'),
+])
+
+# Records each request op carries
+REQUEST_DTYPES = {OP_CREATE: SEED_DTYPE, OP_RESET: ID_DTYPE, OP_STEP: STEP_DTYPE,
+                  OP_OBSERVE: ID_DTYPE, OP_CLOSE: ID_DTYPE}
+
+# Records each response op carries
+RESPONSE_DTYPES = {OP_CREATE: ID_DTYPE, OP_RESET: OBSERVATION_DTYPE, OP_STEP: RESULT_DTYPE,
+                   OP_OBSERVE: OBSERVATION_DTYPE, OP_CLOSE: ID_DTYPE}
+
+
+def _header(op, count):
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['op'] = op
+    header['count'] = count
+    return header.tobytes()
+
+
+def _recv_exactly(sock, size):
+    """Reads `size` bytes, or returns None if the peer closed the connection first."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while view:
+        received = sock.recv_into(view)
+        if received == 0:
+            return None
+        view = view[received:]
+    return buffer
+
+
+def _recv_message(sock, dtypes):
+    """Reads one message; returns `(op, records)`, or None at the end of the stream."""
+    header = _recv_exactly(sock, HEADER_DTYPE.itemsize)
+    if header is None:
+        return None
+    header = np.frombuffer(header, dtype=HEADER_DTYPE)[0]
+    op, count = int(header['op']), int(header['count'])
+    if op == OP_ERROR:
+        payload = _recv_exactly(sock, count)
+        return op, bytes(payload or b'')
+    dtype = dtypes.get(op)
+    if dtype is None:
+        raise ConnectionError(f"Unknown op {op}")
+    if count > config.ENV_MAX_BATCH:
+        raise ConnectionError(f"Batch of {count} records is over the limit of {config.ENV_MAX_BATCH}")
+    payload = _recv_exactly(sock, count * dtype.itemsize)
+    if payload is None:
+        return None
+    return op, np.frombuffer(payload, dtype=dtype)
+
+
+def _observations(observations):
+    records = np.zeros(len(observations), dtype=OBSERVATION_DTYPE)
+    if len(observations):
+        records[:] = [tuple(observation) for observation in observations]
+    return records
+
+
+class EnvHandler(socketserver.BaseRequestHandler):
+    """Answers one connection's requests in order, against the envs it created."""
+    def handle(self):
+        self.envs = {}
+        self.next_id = 0
+        while True:
+            try:
+                message = _recv_message(self.request, REQUEST_DTYPES)
+            except ConnectionError as error:
+                self._send_error(error)
+                return  # The stream cannot be trusted past a bad header
+            if message is None:
+                return
+            op, records = message
+            try:
+                response = self._dispatch(op, records)
+            except (ValueError, RuntimeError) as error:
+                self._send_error(error)
+                continue
+            self.request.sendall(_header(op, len(response)) + response.tobytes())
+
+    def _send_error(self, error):
+        text = str(error).encode('utf-8')
+        self.request.sendall(_header(OP_ERROR, len(text)) + text)
+
+    def _env(self, env_id):
+        env = self.envs.get(int(env_id))
+        if env is None:
+            raise ValueError(f"No env {int(env_id)} on this connection")
+        return env
+
+    def _dispatch(self, op, records):
+        if op == OP_CREATE:
+            ids = np.zeros(len(records), dtype=ID_DTYPE)
+            for i, seed in enumerate(records.tolist()):
+                self.envs[self.next_id] = TrafficEnv(seed=None if seed < 0 else seed)
+                ids[i] = self.next_id
+                self.next_id += 1
+            return ids
+        if op == OP_RESET:
+            return _observations([self._env(env_id).reset() for env_id in records])
+        if op == OP_OBSERVE:
+            return _observations([self._env(env_id).observe() for env_id in records])
+        if op == OP_CLOSE:
+            for env_id in records.tolist():
+                self.envs.pop(env_id, None)
+            return np.zeros(0, dtype=ID_DTYPE)
+
+        # OP_STEP
+        results = np.zeros(len(records), dtype=RESULT_DTYPE)
+        for i, (env_id, action) in enumerate(zip(records['env'].tolist(), records['action'].tolist())):
+            observation, reward, done = self._env(env_id).step(action)
+            results[i] = (tuple(observation), b'', done, reward)
+        return results
+
+
+class EnvServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A Unix socket server with one thread and one set of envs per connection."""
+    daemon_threads = True
+
+    def __init__(self, path=config.ENV_SOCKET_PATH):
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a server that did not shut down cleanly
+        super().__init__(path, EnvHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class EnvClient:
+    """A Python client for `EnvServer`, mainly for testing; other runtimes speak the protocol directly.
+
+        with EnvClient() as client:
+            ids = client.create([1, 2, 3])
+            observations = client.reset(ids)
+            results = client.step(ids, actions)
+    """
+    def __init__(self, path=config.ENV_SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+    def _request(self, op, records):
+        records = np.ascontiguousarray(records)
+        self.sock.sendall(_header(op, len(records)) + records.tobytes())
+        message = _recv_message(self.sock, {op: RESPONSE_DTYPES[op]})
+        if message is None:
+            raise ConnectionError("Server closed the connection")
+        if message[0] == OP_ERROR:
+            raise RuntimeError(message[1].decode('utf-8'))
+        return message[1]
+
+    def create(self, seeds):
+        """Creates one env per seed (None for unseeded) and returns their ids."""
+        return self._request(OP_CREATE, np.array([-1 if s is None else s for s in seeds], dtype=SEED_DTYPE))
+
+    def reset(self, ids):
+        return self._request(OP_RESET, np.asarray(ids, dtype=ID_DTYPE))
+
+    def observe(self, ids):
+        return self._request(OP_OBSERVE, np.asarray(ids, dtype=ID_DTYPE))
+
+    def step(self, ids, actions):
+        """Runs one step per `(id, action)` pair, in order; returns RESULT_DTYPE records."""
+        records = np.zeros(len(ids), dtype=STEP_DTYPE)
+        records['env'] = ids
+        records['action'] = actions
+        return self._request(OP_STEP, records)
+
+    def close_envs(self, ids):
+        self._request(OP_CLOSE, np.asarray(ids, dtype=ID_DTYPE))
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulation environments over a Unix socket.")
+    parser.add_argument('--socket', default=config.ENV_SOCKET_PATH, help="socket path to listen on")
+    args = parser.parse_args()
+
+    with EnvServer(args.socket) as server:
+        print(f"Serving environments on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,27 @@
  # simulation.py
 import pygame
-import random
 import config
-from collections import deque
 import math
-
-class TrafficLight:
+import time
+import engine
+from engine import SimulationEngine
+from scenario import default_scenario
+from rendering import text_cache, sprite_cache
+from profiling import StageProfiler
+from stats import TrafficStats
+
+class TrafficLight(engine.TrafficLight):
     """Represents a single traffic light (Red, Yellow, Green)."""
     def __init__(self):
-        self.state = 'red'  # 'red', 'yellow', 'green'
+        super().__init__()
         self.colors = {
             'red': config.COLOR_RED,
             'yellow': config.COLOR_YELLOW,
             'green': config.COLOR_GREEN
         }
-        self.timer = 0 
 
     def draw(self, surface, x, y):
+        """Draws the light and returns the screen area it covers."""
         radius = config.LIGHT_RADIUS
         casing_width = config.LIGHT_CASING_WIDTH
         
@@ -26,6 +31,7 @@ class TrafficLight:
         # Use a slight shadow for depth
         pygame.draw.rect(surface, (150, 150, 150), casing_rect.move(2, 2), border_radius=5)
         pygame.draw.rect(surface, config.COLOR_CASING, casing_rect, border_radius=5)
+        drawn_rect = casing_rect.union(casing_rect.move(2, 2))
         
         # Color for unlit lights (darker version of the casing)
         UNLIT_COLOR = (100, 100, 100) 
@@ -54,252 +60,44 @@ class TrafficLight:
         # 3. Draw Timer (Dark text on light casing)
         if self.timer > 0:
             time_sec = math.ceil(self.timer / config.SIM_FPS)
-            font = pygame.font.SysFont('Arial', 14, bold=True)
-            text_surface = font.render(f"{int(time_sec)}", True, config.COLOR_DARK_TEXT)
+            text_surface = text_cache.render(f"{int(time_sec)}", config.COLOR_DARK_TEXT, size=14, bold=True)
             
             # Position the text below the casing
             text_x = x - text_surface.get_width() // 2
             text_y = y + radius * 3 + 10 
-            surface.blit(text_surface, (text_x, text_y))
+            drawn_rect.union_ip(surface.blit(text_surface, (text_x, text_y)))
+
+        return drawn_rect
 
 
-class Vehicle:
+class Vehicle(engine.Vehicle):
     """Represents a single vehicle (car, police, or ambulance) in the simulation."""
-    def __init__(self, path, vehicle_type='Car'):
-        self.path = path  # 'NS' or 'EW'
-        self.type = vehicle_type
-        self.is_emergency = self.type in ['Ambulance', 'Police']
-
-        # Determine dimensions, speed, and color based on type
-        if self.type == 'Ambulance':
-            self.width, self.height = config.CAR_WIDTH, config.CAR_HEIGHT
-            self.speed = config.AMBULANCE_SPEED
-            self.color = config.COLOR_AMBULANCE
-            self.siren_color = config.COLOR_AMBULANCE_SIREN
-        elif self.type == 'Police':
-            self.width, self.height = config.CAR_WIDTH, config.CAR_HEIGHT
-            self.speed = config.POLICE_SPEED
-            self.color = config.COLOR_POLICE
-            self.siren_color = config.COLOR_POLICE_SIREN
-        else: # Car (or any other non-emergency vehicle)
-            self.width, self.height = config.CAR_WIDTH, config.CAR_HEIGHT
-            self.speed = config.CAR_SPEED
-            self.color = random.choice(config.VEHICLE_COLORS)
-
-        # Handle rotation for path
-        if path == 'EW':
-            self.width, self.height = self.height, self.width 
-
-        # Set initial position and stop line
-        if path == 'NS':
-            self.x = config.INTERSECTION_POS[0] - config.LANE_WIDTH / 2 - self.width / 2
-            self.y = 0 - self.height
-            self.stop_pos = config.INTERSECTION_POS[1] - config.STOP_LINE_OFFSET
-        else:  # 'EW'
-            self.x = 0 - self.width
-            self.y = config.INTERSECTION_POS[1] - config.LANE_WIDTH / 2 - self.height / 2
-            self.stop_pos = config.INTERSECTION_POS[0] - config.STOP_LINE_OFFSET
-
-        self.wait_time = 0
-        self.is_waiting = False
-        self.is_moving = False
-
-    def update(self, is_light_green, cars_in_front):
-        """Moves the vehicle or makes it wait."""
-        
-        self.is_waiting = False
-        self.is_moving = True
-        
-        is_at_stop_line = False
-        car_in_front_stopping = False
-
-        # 1. Check for red light stop position
-        if self.path == 'NS':
-            if self.y < self.stop_pos and (self.y + self.height + self.speed) >= self.stop_pos:
-                is_at_stop_line = True
-        else: # 'EW'
-            if self.x < self.stop_pos and (self.x + self.width + self.speed) >= self.stop_pos:
-                is_at_stop_line = True
-
-        # 2. Check for car in front stop
-        if cars_in_front:
-            car_front = cars_in_front[0]
-            required_gap = config.MIN_FOLLOW_DISTANCE
-            
-            if self.path == 'NS':
-                distance = car_front.y - (self.y + self.height)
-            else: # EW
-                distance = car_front.x - (self.x + self.width)
-            
-            if distance < required_gap + self.speed: 
-                car_in_front_stopping = True
-        
-        
-        # 3. Determine if we should stop
-        should_stop = False
-        
-        # Emergency vehicles run the red light IF they are the first car in queue.
-        if self.is_emergency and is_at_stop_line and not is_light_green and not cars_in_front:
-            pass 
-        elif is_at_stop_line and not is_light_green:
-            should_stop = True 
-        elif car_in_front_stopping:
-            should_stop = True 
-
-        # 4. Apply movement
-        if should_stop:
-            self.is_moving = False
-            self.is_waiting = True
-            
-            # Ensure car stops exactly at the stop line, or behind the car in front
-            if is_at_stop_line and not is_light_green:
-                 if self.path == 'NS':
-                    self.y = self.stop_pos - self.height
-                 else:
-                    self.x = self.stop_pos - self.width
-            elif car_in_front_stopping:
-                # Stop directly behind the car in front
-                if self.path == 'NS':
-                    self.y = car_front.y - self.height - config.MIN_FOLLOW_DISTANCE
-                else:
-                    self.x = car_front.x - self.width - config.MIN_FOLLOW_DISTANCE
-        else:
-            self.is_waiting = False
-            self.is_moving = True
-            if self.path == 'NS':
-                self.y += self.speed
-            else:
-                self.x += self.speed
-
-        # 5. Update wait time
-        if self.is_waiting:
-            self.wait_time += 1
-        else:
-            self.wait_time = 0
+    __slots__ = ()
 
+    def sprite(self, frame_count):
+        """Returns the pre-rendered image for the vehicle's current look."""
+        return sprite_cache.get(self.type, self.color, self.path, (self.width, self.height),
+                                self.is_moving, self.is_waiting, frame_count)
 
     def draw(self, surface, frame_count):
-        
-        if self.path == 'NS':
-            body_w, body_h = self.width, self.height
-        else:
-            body_w, body_h = self.width, self.height
+        """Draws the vehicle and returns the screen area it covers."""
+        return surface.blit(self.sprite(frame_count), (self.x, self.y))
 
-        body_rect = pygame.Rect(self.x, self.y, body_w, body_h)
-        
-        # 1. Vehicle Body with Shadow Effect (more appealing/3D)
-        shadow_offset = 2
-        pygame.draw.rect(surface, (100, 100, 100), body_rect.move(shadow_offset, shadow_offset), border_radius=5)
-        pygame.draw.rect(surface, self.color, body_rect, border_radius=5)
-        
-        # 2. Cabin/Roof (using a lighter shade of the body color for contrast)
-        color_r, color_g, color_b = self.color
-        cabin_color = (min(255, color_r + 30), min(255, color_g + 30), min(255, color_b + 30))
-        if self.is_emergency: cabin_color = (200, 200, 200) # Fixed light grey for emergency
 
-        if self.path == 'NS':
-            roof_rect = (self.x + 2, self.y + 10, body_w - 4, 15)
-        else:
-            roof_rect = (self.x + 10, self.y + 2, 15, body_h - 4) # FIXED: Ensuring parenthesis is closed on this logical line
-        pygame.draw.rect(surface, cabin_color, roof_rect, border_radius=2)
-        
-        # 3. Wheels (small, black rectangles)
-        if self.path == 'NS':
-            wheels = [(self.x + 3, self.y + 5, 4, 8), (self.x + body_w - 7, self.y + 5, 4, 8), 
-                      (self.x + 3, self.y + body_h - 13, 4, 8), (self.x + body_w - 7, self.y + body_h - 13, 4, 8)]
-        else:
-            wheels = [(self.x + 5, self.y + 3, 8, 4), (self.x + 5, self.y + body_h - 7, 8, 4), 
-                      (self.x + body_w - 13, self.y + 3, 8, 4), (self.x + body_w - 13, self.y + body_h - 7, 8, 4)]
-        for wheel in wheels:
-             pygame.draw.rect(surface, config.COLOR_TIRE, wheel, border_radius=1)
-
-
-        # 4. Emergency Vehicle Details & Flashing Sirens
-        if self.is_emergency:
-            
-            # Siren Flashing Effect (pop of color)
-            siren_left_color = config.COLOR_AMBULANCE_SIREN if self.type == 'Ambulance' else (255, 0, 0)
-            siren_right_color = config.COLOR_AMBULANCE_SIREN if self.type == 'Ambulance' else config.COLOR_POLICE_SIREN
-            
-            # Simple alternating flash (15 frames left, 15 frames right)
-            is_left_flash = frame_count % 30 < 15
-            
-            flash_color = siren_left_color if is_left_flash else siren_right_color
-            
-            if self.path == 'NS':
-                # Light bar on top
-                light_rect = (self.x + body_w // 2 - 5, self.y, 10, 3)
-                pygame.draw.rect(surface, flash_color, light_rect, border_radius=1)
-                pygame.draw.rect(surface, config.COLOR_DARK_TEXT, light_rect, 1, border_radius=1) # Casing
-            else:
-                # Light bar on front (right side of the vehicle body)
-                light_rect = (self.x + body_w - 3, self.y + body_h // 2 - 5, 3, 10)
-                pygame.draw.rect(surface, flash_color, light_rect, border_radius=1)
-                pygame.draw.rect(surface, config.COLOR_DARK_TEXT, light_rect, 1, border_radius=1) # Casing
-
-
-        # 5. UI/UX: Movement Indicator (Vibrant Arrow)
-        if self.is_moving and not self.is_emergency:
-            arrow_color = config.COLOR_ACCENT_UI # Use the new vibrant UI accent color
-            arrow_size = 5
-            
-            if self.path == 'NS':
-                # Arrow points down (traveling North to South is Y+)
-                points = [(self.x + body_w // 2, self.y + body_h), 
-                          (self.x + body_w // 2 - arrow_size, self.y + body_h - arrow_size * 2), 
-                          (self.x + body_w // 2 + arrow_size, self.y + body_h - arrow_size * 2)]
-            else:
-                # Arrow points right (traveling West to East is X+)
-                points = [(self.x + body_w, self.y + body_h // 2), 
-                          (self.x + body_w - arrow_size * 2, self.y + body_h // 2 - arrow_size), 
-                          (self.x + body_w - arrow_size * 2, self.y + body_h // 2 + arrow_size)]
-            pygame.draw.polygon(surface, arrow_color, points)
-
-        # 6. UI/UX: Waiting Highlight (Pop of color for waiting)
-        if self.is_waiting:
-            # Draw a thick yellow outline to signify it's stationary and waiting
-            pygame.draw.rect(surface, config.COLOR_YELLOW, body_rect, 3, border_radius=5)
-
-
-class Intersection:
+class Intersection(engine.Intersection):
     """Manages the traffic lights and vehicle queues."""
-    def __init__(self):
-        self.ns_light = TrafficLight()
-        self.ew_light = TrafficLight()
-        self.ns_queue = deque()
-        self.ew_queue = deque()
-        self.set_phase('NS_GREEN')  # Start with NS green
-        self.current_phase = 'NS_GREEN'
-        
-        self.center_x = config.INTERSECTION_POS[0]
-        self.center_y = config.INTERSECTION_POS[1]
-
-    def set_phase(self, phase):
-        """Sets the state of the traffic lights based on the phase."""
-        self.current_phase = phase
-        if phase == 'NS_GREEN':
-            self.ns_light.state = 'green'
-            self.ew_light.state = 'red'
-        elif phase == 'NS_YELLOW':
-            self.ns_light.state = 'yellow'
-            self.ew_light.state = 'red'
-        elif phase == 'EW_GREEN':
-            self.ns_light.state = 'red'
-            self.ew_light.state = 'green'
-        elif phase == 'EW_YELLOW':
-            self.ns_light.state = 'red' 
-            self.ew_light.state = 'yellow'
+    light_class = TrafficLight
 
     def _draw_road(self, surface):
         """Draws the intersection and road markings with high visibility."""
-        road_half = config.ROAD_WIDTH
+        road_half = self.scenario.road_width
         ns_road_x = self.center_x - road_half
         ns_road_y = 0
         ew_road_x = 0
         ew_road_y = self.center_y - road_half
         
-        ns_road = (ns_road_x, ns_road_y, config.ROAD_WIDTH * 2, config.SCREEN_HEIGHT)
-        ew_road = (ew_road_x, ew_road_y, config.SCREEN_WIDTH, config.ROAD_WIDTH * 2)
+        ns_road = (ns_road_x, ns_road_y, self.scenario.road_width * 2, self.scenario.height)
+        ew_road = (ew_road_x, ew_road_y, self.scenario.width, self.scenario.road_width * 2)
         
         # Draw roads (overlapping rects creates the intersection block)
         pygame.draw.rect(surface, config.COLOR_ROAD, ns_road)
@@ -307,7 +105,7 @@ class Intersection:
         
         # Draw NS Median Line (Dashed Vibrant Yellow) - Thicker Line
         start_y = 0
-        while start_y < config.SCREEN_HEIGHT:
+        while start_y < self.scenario.height:
             pygame.draw.line(surface, config.COLOR_MEDIAN, 
                              (self.center_x, start_y), 
                              (self.center_x, start_y + 20), 3) # Increased thickness
@@ -315,166 +113,113 @@ class Intersection:
             
         # Draw EW Median Line (Dashed Vibrant Yellow) - Thicker Line
         start_x = 0
-        while start_x < config.SCREEN_WIDTH:
+        while start_x < self.scenario.width:
             pygame.draw.line(surface, config.COLOR_MEDIAN, 
                              (start_x, self.center_y), 
                              (start_x + 20, self.center_y), 3) # Increased thickness
             start_x += 40
             
         # Draw Lane Lines (Dashed White) - NS - Thicker Line
-        ns_lane1_x = self.center_x - config.LANE_WIDTH
+        ns_lane1_x = self.center_x - self.scenario.lane_width
         start_y = 0
-        while start_y < config.SCREEN_HEIGHT:
+        while start_y < self.scenario.height:
             pygame.draw.line(surface, config.COLOR_LINES, 
                              (ns_lane1_x, start_y), 
                              (ns_lane1_x, start_y + 15), 2) # Increased thickness
             start_y += 30
         
         # Draw Lane Lines (Dashed White) - EW - Thicker Line
-        ew_lane1_y = self.center_y - config.LANE_WIDTH
+        ew_lane1_y = self.center_y - self.scenario.lane_width
         start_x = 0
-        while start_x < config.SCREEN_WIDTH:
+        while start_x < self.scenario.width:
             pygame.draw.line(surface, config.COLOR_LINES, 
                              (start_x, ew_lane1_y), 
                              (start_x + 15, ew_lane1_y), 2) # Increased thickness
             start_x += 30
 
         # Draw Stop Lines (Thick White/Highly Visible)
-        stop_ns_y = self.center_y - config.STOP_LINE_OFFSET
-        stop_ew_x = self.center_x - config.STOP_LINE_OFFSET
+        stop_ns_y = self.center_y - self.scenario.stop_line_offset
+        stop_ew_x = self.center_x - self.scenario.stop_line_offset
         
         # NS Stop Line (for NS vehicles)
         pygame.draw.line(surface, config.COLOR_WHITE, 
-                         (self.center_x - config.LANE_WIDTH, stop_ns_y), 
+                         (self.center_x - self.scenario.lane_width, stop_ns_y), 
                          (self.center_x, stop_ns_y), 8) # Thicker line
         
         # EW Stop Line (for EW vehicles)
         pygame.draw.line(surface, config.COLOR_WHITE, 
-                         (stop_ew_x, self.center_y - config.LANE_WIDTH), 
+                         (stop_ew_x, self.center_y - self.scenario.lane_width), 
                          (stop_ew_x, self.center_y), 8) # Thicker line
 
     def draw(self, surface, controller_timer=0):
-        self._draw_road(surface)
+        """Draws both traffic lights and returns the screen areas they cover.
 
+        The road itself is static and is pre-rendered into the background layer.
+        """
         # Traffic light positions (outside the road/near the stop line)
-        stop_ns_y = self.center_y - config.STOP_LINE_OFFSET
+        stop_ns_y = self.center_y - self.scenario.stop_line_offset
         
         # NS light: on the left side of the NS lane, near the stop line
-        light_ns_x = self.center_x - config.LANE_WIDTH - config.ROAD_WIDTH // 2 - 15 
+        light_ns_x = self.center_x - self.scenario.lane_width - self.scenario.road_width // 2 - 15 
         light_ns_y = stop_ns_y - 25 
         
         # EW light: above the EW lane, near the stop line (for visual completeness)
-        stop_ew_x = self.center_x - config.STOP_LINE_OFFSET
+        stop_ew_x = self.center_x - self.scenario.stop_line_offset
         light_ew_x = stop_ew_x - 25
-        light_ew_y = self.center_y - config.LANE_WIDTH - config.ROAD_WIDTH // 2 - 15 
+        light_ew_y = self.center_y - self.scenario.lane_width - self.scenario.road_width // 2 - 15 
         
         # Draw both lights
         self.ns_light.timer = controller_timer
-        self.ns_light.draw(surface, light_ns_x, light_ns_y)
+        ns_rect = self.ns_light.draw(surface, light_ns_x, light_ns_y)
         
         # NOTE: Drawing EW light is only for visual feedback, not functional in the 2-phase controller logic
         # For a cleaner look, the EW light will be drawn below the NS light.
         self.ew_light.timer = controller_timer 
-        self.ew_light.draw(surface, light_ew_x, light_ew_y)
+        ew_rect = self.ew_light.draw(surface, light_ew_x, light_ew_y)
+        return [ns_rect, ew_rect]
 
 
-class Simulation:
+class Simulation(SimulationEngine):
     """The main class that runs the entire simulation."""
-    def __init__(self, controller, mode):
+    vehicle_class = Vehicle
+    intersection_class = Intersection
+
+    def __init__(self, controller, mode, scenario=None):
+        if scenario is None:
+            scenario = default_scenario()
         pygame.init()
         pygame.font.init()
-        pygame.display.set_caption(f"UrbanFlow - {mode} Mode")
-        self.screen = pygame.display.set_mode((config.SCREEN_WIDTH, config.SCREEN_HEIGHT))
+        self.mode = mode
+        self.speed_multiplier = config.SIM_SPEED_MULTIPLIER
+        self.tick_credit = 0.0  # Simulated ticks owed to the display loop
+        self.render_frame = 0  # Frames drawn so far; times the animations, whatever the speed
+        self._update_caption()
+        self.screen = pygame.display.set_mode((scenario.width, scenario.height))
+        # Fonts and converted sprites from an earlier pygame session are no longer valid
+        text_cache.clear()
+        sprite_cache.clear()
         
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont('Arial', 20)
-        self.title_font = pygame.font.SysFont('Arial', 30, bold=True)
-        
-        self.controller = controller
-        self.intersection = Intersection()
-        self.vehicles = []
-        self.running = True
-        self.total_wait_time = 0
-        self.cars_passed = 0
-        self.frame_count = 0
-        self.emergency_vehicles_present = []
-
-
-    def _spawn_vehicle(self):
-        """Randomly spawns new vehicles, including a chance for an ambulance/police."""
-        path = random.choice(['NS', 'EW'])
-        
-        # 1. Spawn Emergency Vehicles (Ambulance/Police)
-        if len(self.emergency_vehicles_present) == 0:
-            if random.random() < config.AMBULANCE_SPAWN_RATE:
-                self.vehicles.append(Vehicle(path, vehicle_type='Ambulance'))
-            elif random.random() < config.POLICE_SPAWN_RATE:
-                self.vehicles.append(Vehicle(path, vehicle_type='Police'))
-        
-        # 2. Spawn Regular Cars
-        if random.random() < config.CAR_SPAWN_RATE:
-            self.vehicles.append(Vehicle(path, vehicle_type='Car'))
-
-
-    def _update_vehicles(self):
-        """Updates all vehicles, manages queues, and calculates rewards."""
-        self.intersection.ns_queue.clear()
-        self.intersection.ew_queue.clear()
-        self.emergency_vehicles_present = [] 
-        
-        current_total_wait = 0
-        cars_to_remove = []
 
-        # Sort cars: NS by y (ascending), EW by x (ascending)
-        ns_cars = sorted([v for v in self.vehicles if v.path == 'NS'], key=lambda v: v.y)
-        ew_cars = sorted([v for v in self.vehicles if v.path == 'EW'], key=lambda v: v.x)
+        # Static scene layer and the screen areas drawn over it last frame
+        self.background = None
+        self.background_key = None
+        self.dirty_rects = None
+        self.profile_lines = None  # Overlay rows, refreshed every PROFILE_OVERLAY_REFRESH frames
         
-        all_cars = ns_cars + ew_cars
-        
-        for car in all_cars:
-            if car.is_emergency:
-                self.emergency_vehicles_present.append(car.type)
-
-            cars_in_front = []
-            if car.path == 'NS':
-                is_green = self.intersection.ns_light.state == 'green'
-                idx = ns_cars.index(car)
-                cars_in_front = ns_cars[idx + 1:] 
-            else: # EW
-                is_green = self.intersection.ew_light.state == 'green'
-                idx = ew_cars.index(car)
-                cars_in_front = ew_cars[idx + 1:]
-
-            car.update(is_green, cars_in_front)
-            
-            if car.is_waiting:
-                current_total_wait += car.wait_time
-                if car.path == 'NS':
-                    self.intersection.ns_queue.append(car)
-                else:
-                    self.intersection.ew_queue.append(car)
-            
-            # Remove cars that are off-screen
-            if (car.path == 'NS' and car.y > config.SCREEN_HEIGHT) or \
-               (car.path == 'EW' and car.x > config.SCREEN_WIDTH):
-                cars_to_remove.append(car)
-                
-                self.total_wait_time += car.wait_time 
-                self.cars_passed += 1 
-
-        for car in cars_to_remove:
-            self.vehicles.remove(car)
-            
-        return -current_total_wait
+        super().__init__(controller, scenario=scenario)
+        self.stats = TrafficStats()
+        if config.PROFILE_STAGES:
+            self.profiler = StageProfiler()
 
 
     def _draw_stats_panel(self):
-        """Draws a dedicated, modern panel for simulation statistics."""
+        """Draws a dedicated, modern panel for simulation statistics and returns its area."""
         # Panel dimensions (Top Right)
-        panel_x = config.SCREEN_WIDTH - 280
+        panel_x = self.scenario.width - 280
         panel_y = 20
         panel_width = 260
-        panel_height = 280
+        panel_height = 370
         
         # 1. Draw Background (White with subtle shadow)
         shadow_offset = 5
@@ -490,7 +235,7 @@ class Simulation:
                          border_radius=10)
         
         # 2. Title (Bold and Accent Colored)
-        title_surface = self.title_font.render("TRAFFIC SIMULATOR", True, config.COLOR_ACCENT_UI)
+        title_surface = text_cache.render("TRAFFIC SIMULATOR", config.COLOR_ACCENT_UI, size=30, bold=True)
         self.screen.blit(title_surface, (panel_x + 10, panel_y + 10))
         
         # Separator
@@ -499,7 +244,12 @@ class Simulation:
                          (panel_x + panel_width - 5, panel_y + 45), 2)
 
         # 3. Stats Data
-        avg_wait = (self.total_wait_time / self.cars_passed / config.SIM_FPS) if self.cars_passed > 0 else 0
+        avg_wait = self.stats.mean_wait() / config.SIM_FPS
+        throughput = self.stats.last_minute(self.frame_count)
+        
+        def wait_percentiles(path):
+            histogram = self.stats.waits[path]
+            return f"{histogram.percentile(50) / config.SIM_FPS:.1f} / {histogram.percentile(95) / config.SIM_FPS:.1f} s"
         
         stats_data = [
             ("Current Phase:", self.intersection.current_phase, config.COLOR_ACCENT_UI),
@@ -507,6 +257,9 @@ class Simulation:
             ("EW Queue Length:", len(self.intersection.ew_queue), config.COLOR_RED if len(self.intersection.ew_queue) > 5 else config.COLOR_DARK_TEXT),
             ("Cars Passed:", self.cars_passed, config.COLOR_DARK_TEXT),
             ("Avg Wait Time:", f"{avg_wait:.2f} s", config.COLOR_GREEN),
+            ("NS Wait p50/p95:", wait_percentiles('NS'), config.COLOR_DARK_TEXT),
+            ("EW Wait p50/p95:", wait_percentiles('EW'), config.COLOR_DARK_TEXT),
+            ("Throughput:", f"{throughput} /min", config.COLOR_DARK_TEXT),
         ]
         
         if hasattr(self.controller, 'agent'): # If AI mode
@@ -515,11 +268,9 @@ class Simulation:
         # Draw stats lines
         y_offset_start = panel_y + 55
         for i, (label, value, color) in enumerate(stats_data):
-            label_font = pygame.font.SysFont('Arial', 18, bold=True)
-            value_font = pygame.font.SysFont('Arial', 18)
-            
-            label_surface = label_font.render(label, True, config.COLOR_DARK_TEXT) 
-            value_surface = value_font.render(str(value), True, color)
+            # Labels never change, so after the first frame only new values get rendered
+            label_surface = text_cache.render(label, config.COLOR_DARK_TEXT, size=18, bold=True)
+            value_surface = text_cache.render(str(value), color, size=18)
             
             y_offset = y_offset_start + i * 30
             self.screen.blit(label_surface, (panel_x + 10, y_offset))
@@ -528,11 +279,11 @@ class Simulation:
         # 4. Emergency Alert (More prominent flash)
         if len(self.emergency_vehicles_present) > 0:
             
-            alert_color = config.COLOR_RED if self.frame_count % 30 < 15 else config.COLOR_DARK_TEXT # Flashing
+            alert_color = config.COLOR_RED if self.render_frame % 30 < 15 else config.COLOR_DARK_TEXT # Flashing
             vehicles_list = ", ".join(self.emergency_vehicles_present)
             alert_text = f"🚨 {vehicles_list.upper()} INCOMING! 🚨"
             
-            alert_surface = self.font.render(alert_text, True, alert_color)
+            alert_surface = text_cache.render(alert_text, alert_color, size=20)
             
             # Position the alert box at the bottom of the panel
             alert_box_width = panel_width - 20
@@ -549,64 +300,145 @@ class Simulation:
             text_y = alert_box_y + 5
             self.screen.blit(alert_surface, (text_x, text_y))
 
+        return pygame.Rect(panel_x, panel_y, panel_width + shadow_offset, panel_height + shadow_offset)
+
+
+    def _draw_profile_overlay(self):
+        """Draws the per-stage timings left of the stats panel and returns their area."""
+        width = 230
+        row_height = 22
+        x = self.scenario.width - 280 - 15 - width
+        y = 20
+
+        # Refresh the numbers a few times a second, so they stay readable and mostly cached
+        if self.profile_lines is None or self.render_frame % config.PROFILE_OVERLAY_REFRESH == 0:
+            bottleneck = self.profiler.bottleneck()
+            self.profile_lines = [
+                (stage, f"{stats['mean_ms']:.2f} / {stats['p99_ms']:.2f} ms",
+                 config.COLOR_RED if stage == bottleneck else config.COLOR_DARK_TEXT)
+                for stage, stats in self.profiler.summary().items()
+            ]
+
+        rect = pygame.Rect(x, y, width, 40 + row_height * len(self.profile_lines))
+        pygame.draw.rect(self.screen, config.COLOR_STATS_BACKGROUND, rect, border_radius=10)
+        pygame.draw.rect(self.screen, config.COLOR_ACCENT_UI, rect, 2, border_radius=10)
+
+        title_surface = text_cache.render("STAGE  mean / p99", config.COLOR_ACCENT_UI, size=16, bold=True)
+        self.screen.blit(title_surface, (x + 10, y + 10))
+
+        # The slowest stage per tick is shown in red
+        for i, (stage, value, color) in enumerate(self.profile_lines):
+            label_surface = text_cache.render(stage, config.COLOR_DARK_TEXT, size=16, bold=True)
+            value_surface = text_cache.render(value, color, size=16)
+            y_offset = y + 35 + i * row_height
+            self.screen.blit(label_surface, (x + 10, y_offset))
+            self.screen.blit(value_surface, (x + width - 10 - value_surface.get_width(), y_offset))
+        return rect
+
+    def _layout_key(self):
+        """Everything the static background depends on; a change triggers a rebuild."""
+        return (self.screen.get_size(), config.COLOR_SKY, config.COLOR_ROAD, config.COLOR_LINES,
+                config.COLOR_MEDIAN, config.COLOR_WHITE, self.scenario)
+
+    def _update_background(self):
+        """Renders the sky and road markings once into a cached surface."""
+        key = self._layout_key()
+        if key == self.background_key:
+            return
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(config.COLOR_SKY)
+        self.intersection._draw_road(self.background)
+        self.background_key = key
+        self.dirty_rects = None  # Repaint the whole screen on the next frame
 
     def _draw(self):
-        """Draws the entire simulation state."""
-        self.screen.fill(config.COLOR_SKY) 
+        """Draws the entire simulation state, updating only the regions that changed."""
+        self._update_background()
+
+        # 1. Erase last frame's moving parts (or everything after a rebuild)
+        if self.dirty_rects is None:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.dirty_rects:
+                self.screen.blit(self.background, rect, rect)
+
+        # 2. Draw lights, vehicles and the stats panel, collecting what they cover
         timer = getattr(self.controller, 'timer', 0)
-        self.intersection.draw(self.screen, controller_timer=timer)
+        rects = self.intersection.draw(self.screen, controller_timer=timer)
         
-        for car in self.vehicles:
-            car.draw(self.screen, self.frame_count)
+        # Every vehicle is a single cached sprite, blitted in one batch
+        sprites = [(car.sprite(self.render_frame), (car.x, car.y)) for car in self.vehicles]
+        rects.extend(self.screen.blits(sprites))
             
-        self._draw_stats_panel()
-            
-        pygame.display.flip()
+        rects.append(self._draw_stats_panel())
+        if self.profiler is not None:
+            rects.append(self._draw_profile_overlay())
+
+        # 3. Push only the erased and newly drawn areas to the display
+        screen_rect = self.screen.get_rect()
+        rects = [rect.clip(screen_rect) for rect in rects]
+        if self.dirty_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty_rects + rects)
+        self.dirty_rects = rects
+
+    def _update_caption(self):
+        caption = f"UrbanFlow - {self.mode} Mode"
+        if self.speed_multiplier != 1:
+            caption += f" ({self.speed_multiplier:g}x)"
+        pygame.display.set_caption(caption)
+
+    def set_speed(self, multiplier):
+        """Runs the simulation at `multiplier` times real time, within the allowed range."""
+        self.speed_multiplier = min(max(multiplier, config.MIN_SPEED_MULTIPLIER), config.MAX_SPEED_MULTIPLIER)
+        self._update_caption()
 
     def run(self):
-        """The main simulation loop."""
+        """The main simulation loop.
+
+        Frames are drawn at RENDER_FPS while the simulation advances
+        `speed_multiplier` x SIM_FPS ticks per second, so several ticks (or
+        none) may run between two frames. +/- double or halve the speed.
+        """
+        tick_budget = 0.75 / config.RENDER_FPS  # Leave a quarter of every frame for drawing
         while self.running:
-            self.clock.tick(config.SIM_FPS)
-            self.frame_count += 1
+            self.clock.tick(config.RENDER_FPS)
+            profiler = self.profiler
             
+            start = time.perf_counter() if profiler else 0
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_q:
                         self.running = False
-
-            # 1. Update vehicles and get reward
-            reward = self._update_vehicles()
-            
-            # 2. Update controller (AI or Fixed)
-            self.controller.update(self.intersection, reward)
-            
-            # 3. Spawn new vehicles
-            self._spawn_vehicle()
+                    elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                        self.set_speed(self.speed_multiplier * 2)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        self.set_speed(self.speed_multiplier / 2)
+            if profiler:
+                profiler.record('events', time.perf_counter() - start)
+
+            # 1-3. Update vehicles, controller and spawns for this frame's share of simulated time.
+            # If the CPU can't keep up, the backlog is dropped instead of freezing the display.
+            self.tick_credit += self.speed_multiplier * config.SIM_FPS / config.RENDER_FPS
+            deadline = time.perf_counter() + tick_budget
+            while self.tick_credit >= 1 and self.running:
+                self.step()
+                self.tick_credit -= 1
+                if time.perf_counter() > deadline:
+                    self.tick_credit = 0.0
+                    break
             
             # 4. Draw everything
+            start = time.perf_counter() if profiler else 0
+            self.render_frame += 1
             self._draw()
+            if profiler:
+                profiler.record('draw', time.perf_counter() - start)
             
         if hasattr(self.controller, 'agent'):
             self.controller.agent.decay_epsilon()
             
         pygame.quit()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
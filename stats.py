@@ -0,0 +1,186 @@
+# stats.py
+# Streaming traffic statistics in constant memory: wait-time percentiles,
+# throughput per minute and queue lengths over time, per approach.
+#
+# Every structure has a fixed size chosen from config, and each vehicle that
+# leaves costs O(1), so a run of any length keeps the same footprint and
+# per-tick cost. Engines feed a `TrafficStats` when one is set as their
+# `stats`; the display does this for its panel.
+import numpy as np
+import config
+
+PATHS = ('NS', 'EW')
+
+
+class WaitHistogram:
+    """Counts of wait times in fixed bins of `bin_ticks`; longer waits share one overflow bin.
+
+    Percentiles are exact to within one bin, except in the overflow bin,
+    which reports the longest wait seen.
+    """
+    def __init__(self, bins=config.STATS_WAIT_BINS, bin_ticks=config.STATS_WAIT_BIN_TICKS):
+        self.bins = bins
+        self.bin_ticks = bin_ticks
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.bins + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0  # Summed wait of every sample, in ticks
+        self.max = 0
+
+    def add(self, ticks):
+        self.counts[min(ticks // self.bin_ticks, self.bins)] += 1
+        self.count += 1
+        self.total += ticks
+        self.max = max(self.max, ticks)
+
+    def add_many(self, ticks):
+        """Adds every wait in the integer array `ticks` at once."""
+        if len(ticks) == 0:
+            return
+        np.add.at(self.counts, np.minimum(ticks // self.bin_ticks, self.bins), 1)
+        self.count += len(ticks)
+        self.total += int(ticks.sum())
+        self.max = max(self.max, int(ticks.max()))
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """The wait (in ticks) that `q` percent of samples do not exceed: the upper edge of its bin."""
+        if self.count == 0:
+            return 0.0
+        rank = max(int(np.ceil(q / 100 * self.count)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        if index == self.bins:
+            return float(self.max)
+        return float(min((index + 1) * self.bin_ticks, self.max))
+
+
+class RingSeries:
+    """The last `capacity` values of a series, oldest first from `values()`."""
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int64)
+        self.count = 0  # Values appended in total, including overwritten ones
+
+    def append(self, value):
+        self.data[self.count % len(self.data)] = value
+        self.count += 1
+
+    def values(self):
+        capacity = len(self.data)
+        if self.count <= capacity:
+            return self.data[:self.count].copy()
+        return np.roll(self.data, -(self.count % capacity))
+
+
+class ThroughputCounter:
+    """Vehicles leaving per simulated minute, for the last `minutes` minutes."""
+    def __init__(self, minutes=config.STATS_HISTORY_MINUTES):
+        self.minute_ticks = config.SIM_FPS * 60
+        self.series = RingSeries(minutes)
+        self.minute = 0  # The minute being counted
+        self.current = 0
+
+    def add(self, tick, count=1):
+        """Counts `count` vehicles leaving at `tick`; ticks never go backwards."""
+        self._roll(tick)
+        self.current += count
+
+    def _roll(self, tick):
+        """Closes every minute that has ended by `tick`; a long gap stores at most a ring of zeros."""
+        minute = tick // self.minute_ticks
+        if minute == self.minute:
+            return
+        self.series.append(self.current)
+        for _ in range(min(minute - self.minute - 1, len(self.series.data))):
+            self.series.append(0)
+        self.minute = minute
+        self.current = 0
+
+    def per_minute(self, tick):
+        """Counts of the completed minutes up to `tick`, oldest first."""
+        self._roll(tick)
+        return self.series.values()
+
+    def last_minute(self, tick):
+        """Vehicles that left in the last completed minute."""
+        values = self.per_minute(tick)
+        return int(values[-1]) if len(values) else 0
+
+
+class TrafficStats:
+    """Wait distributions, throughput and queue-length samples for both approaches.
+
+    A vehicle's wait is every tick it spent waiting on its way through (its
+    `total_wait`), recorded as it leaves. Queue lengths are sampled every
+    `sample_ticks` ticks.
+
+        sim.stats = TrafficStats()
+        sim.run(ticks)
+        print(sim.stats.summary(sim.frame_count))
+    """
+    def __init__(self, sample_ticks=config.STATS_QUEUE_SAMPLE_TICKS, samples=config.STATS_QUEUE_SAMPLES,
+                 minutes=config.STATS_HISTORY_MINUTES):
+        self.sample_ticks = sample_ticks
+        self.samples = samples
+        self.minutes = minutes
+        self.waits = {path: WaitHistogram() for path in PATHS}
+        self.reset()
+
+    def reset(self):
+        """Forgets everything, for a fresh episode."""
+        for histogram in self.waits.values():
+            histogram.reset()
+        self.throughput = {path: ThroughputCounter(self.minutes) for path in PATHS}
+        self.queues = {path: RingSeries(self.samples) for path in PATHS}
+
+    def record_exit(self, path, tick, waited):
+        """One vehicle left on `path` at `tick`, having waited `waited` ticks in total."""
+        self.waits[path].add(waited)
+        self.throughput[path].add(tick)
+
+    def record_exits(self, path, tick, waited):
+        """`record_exit` for every vehicle in the integer array `waited`."""
+        self.waits[path].add_many(waited)
+        self.throughput[path].add(tick, len(waited))
+
+    def tick(self, tick, queue_lengths, ticks=1):
+        """Advances to `tick`, sampling `queue_lengths` ({path: length}) at every sample point passed.
+
+        `ticks` > 1 covers a jump over ticks on which the queues did not change.
+        """
+        samples = tick // self.sample_ticks - (tick - ticks) // self.sample_ticks
+        for path, length in queue_lengths.items():
+            for _ in range(min(samples, len(self.queues[path].data))):
+                self.queues[path].append(length)
+
+    def mean_wait(self):
+        """Mean wait in ticks over both approaches."""
+        count = sum(histogram.count for histogram in self.waits.values())
+        return sum(histogram.total for histogram in self.waits.values()) / count if count else 0.0
+
+    def last_minute(self, tick):
+        """Vehicles that left on either approach in the last completed minute."""
+        return sum(counter.last_minute(tick) for counter in self.throughput.values())
+
+    def summary(self, tick):
+        """Returns `{path: {...}}` with wait statistics in seconds, throughput and queue lengths."""
+        fps = config.SIM_FPS
+        summary = {}
+        for path in PATHS:
+            waits = self.waits[path]
+            queue = self.queues[path].values()
+            summary[path] = {
+                'vehicles': waits.count,
+                'mean_wait_s': waits.mean() / fps,
+                'p50_wait_s': waits.percentile(50) / fps,
+                'p95_wait_s': waits.percentile(95) / fps,
+                'p99_wait_s': waits.percentile(99) / fps,
+                'max_wait_s': waits.max / fps,
+                'last_minute_throughput': self.throughput[path].last_minute(tick),
+                'mean_queue': float(queue.mean()) if len(queue) else 0.0,
+                'max_queue': int(queue.max()) if len(queue) else 0,
+            }
+        return summary
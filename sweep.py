@@ -0,0 +1,223 @@
+# sweep.py
+# Hyperparameter sweeps: grid or random search over headless training runs on a process pool.
+#
+#     python sweep.py                      # the full grid of config.SWEEP_SPACE
+#     python sweep.py --random 40          # 40 random configurations from it
+#
+# Every configuration trains a fresh agent for `episodes` episodes on the same
+# seeded demand, then runs one greedy episode for its final score. Results go
+# into one shared-memory array that every worker writes its own row of:
+#
+#     results[i, :episodes]   mean wait (s) of each training episode, NaN until run
+#     results[i, FINAL]       mean wait (s) of the greedy episode
+#     results[i, STATUS]      PENDING, RUNNING, DONE or STOPPED
+#
+# Early stopping is a median rule over the rows: every `rung` episodes a run
+# compares its recent mean wait with the other runs' at the same episode, and
+# stops if it is worse than `stop_quantile` of them. Which runs get stopped
+# depends on which have got that far, so it can differ between sweeps.
+import argparse
+import itertools
+import json
+import multiprocessing
+import random
+from multiprocessing import shared_memory
+import numpy as np
+import config
+from arrivals import ArrivalStream
+from engine import SimulationEngine
+from controller import QLearningAgent, QLearningController
+from stats import TrafficStats
+from tabular import FlatQLearningAgent
+
+PENDING, RUNNING, DONE, STOPPED = 0, 1, 2, 3
+STATUS_NAMES = ('pending', 'running', 'done', 'stopped')
+FINAL, STATUS = -2, -1  # Columns after the learning curve
+
+_results = None  # The shared results array, attached once per worker process
+_shm = None
+
+
+def grid(space):
+    """Every combination of the values in `space` ({name: [values]})."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_configs(space, count, seed=None):
+    """`count` configurations drawn from `space`.
+
+    A list of values is sampled uniformly; a `(low, high)` tuple of floats is
+    sampled uniformly in that range, and of ints over the integers in it.
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(count):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = rng.randint(low, high)
+                else:
+                    params[name] = rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(values)
+        configs.append(params)
+    return configs
+
+
+def _attach(name, shape):
+    """Pool initializer: maps the shared results array into this worker."""
+    global _results, _shm
+    _shm = shared_memory.SharedMemory(name=name)
+    _results = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+
+
+def _should_stop(index, episode, rung, min_peers, stop_quantile):
+    """True if run `index` did worse over its last `rung` episodes than most runs that got as far."""
+    window = _results[:, episode - rung + 1:episode + 1]
+    reached = ~np.isnan(window).any(axis=1)
+    reached[index] = False
+    if reached.sum() < min_peers:
+        return False
+    peers = window[reached].mean(axis=1)
+    return window[index].mean() > np.quantile(peers, stop_quantile)
+
+
+def _run_job(task):
+    """Trains one configuration, writing its curve and score into its row. Returns `(index, status)`."""
+    index, params, episodes, ticks_per_episode, seed, agent_kind, rung, min_peers, stop_quantile = task
+    row = _results[index]
+    row[STATUS] = RUNNING
+    random.seed(seed)
+    np.random.seed(seed)
+
+    agent_class = FlatQLearningAgent if agent_kind == 'flat' else QLearningAgent
+    agent = agent_class(
+        alpha=params.get('ALPHA', config.ALPHA),
+        gamma=params.get('GAMMA', config.GAMMA),
+        epsilon=config.EPSILON,
+        min_epsilon=config.MIN_EPSILON,
+        decay=params.get('EPSILON_DECAY', config.EPSILON_DECAY),
+        queue_bin_size=params.get('QUEUE_BIN_SIZE', config.QUEUE_BIN_SIZE)
+    )
+    controller = QLearningController(
+        agent=agent,
+        decision_interval=params.get('AI_DECISION_INTERVAL', config.AI_DECISION_INTERVAL),
+        yellow_time=config.AI_YELLOW_TIME
+    )
+    sim = SimulationEngine(controller)
+    sim.stats = TrafficStats()
+
+    def run_episode(episode):
+        # Episode `e` sees the same demand in every configuration
+        sim.arrivals = ArrivalStream(seed=[seed, episode])
+        sim.reset()
+        sim.run(ticks_per_episode, event_driven=True)
+        return sim.stats.mean_wait() / config.SIM_FPS
+
+    # 1. Training episodes, checked against the other runs every `rung` episodes
+    for episode in range(episodes):
+        row[episode] = run_episode(episode)
+        agent.decay_epsilon()
+        if rung and (episode + 1) % rung == 0 and episode + 1 < episodes:
+            if _should_stop(index, episode, rung, min_peers, stop_quantile):
+                row[STATUS] = STOPPED
+                return index, STOPPED
+
+    # 2. One greedy episode on unseen demand for the final score
+    agent.epsilon = 0.0
+    row[FINAL] = run_episode(episodes)
+    row[STATUS] = DONE
+    return index, DONE
+
+
+def run_sweep(configs, episodes=config.SWEEP_EPISODES, ticks_per_episode=config.SWEEP_EPISODE_TICKS,
+              workers=config.SWEEP_WORKERS, seed=0, agent_kind=config.Q_AGENT, rung=config.SWEEP_RUNG_EPISODES,
+              min_peers=config.SWEEP_MIN_PEERS, stop_quantile=config.SWEEP_STOP_QUANTILE, on_result=None):
+    """Runs every configuration in `configs` (dicts of config names to values) on a process pool.
+
+    Names left out of a configuration keep their config.py value. `rung=0`
+    turns early stopping off. `on_result(index, status, results)` is called as
+    each run finishes, with the live shared array. Returns a copy of the
+    results array, one row per configuration (see the module comment).
+    """
+    shape = (len(configs), episodes + 2)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        results = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        results[:] = np.nan
+        results[:, STATUS] = PENDING
+
+        tasks = [(index, params, episodes, ticks_per_episode, seed, agent_kind, rung, min_peers, stop_quantile)
+                 for index, params in enumerate(configs)]
+        with multiprocessing.Pool(processes=workers, initializer=_attach, initargs=(shm.name, shape)) as pool:
+            for index, status in pool.imap_unordered(_run_job, tasks):
+                if on_result is not None:
+                    on_result(index, status, results)
+        output = results.copy()
+        del results
+    finally:
+        shm.close()
+        shm.unlink()
+    return output
+
+
+def summarize(configs, results):
+    """One dict per configuration, best final score first; stopped runs follow, by their last curve value."""
+    rows = []
+    for params, row in zip(configs, results):
+        curve = row[:FINAL]
+        run = curve[~np.isnan(curve)]
+        rows.append({
+            'params': params,
+            'status': STATUS_NAMES[int(row[STATUS])],
+            'episodes': len(run),
+            'final_wait_s': None if np.isnan(row[FINAL]) else float(row[FINAL]),
+            'curve_wait_s': [float(value) for value in run],
+        })
+    rows.sort(key=lambda r: (r['final_wait_s'] is None,
+                             r['final_wait_s'] if r['final_wait_s'] is not None else r['curve_wait_s'][-1]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Q-learning hyperparameters over headless runs.")
+    parser.add_argument('--random', type=int, default=None, metavar='N',
+                        help="sample N random configurations instead of the full grid")
+    parser.add_argument('--episodes', type=int, default=config.SWEEP_EPISODES)
+    parser.add_argument('--ticks', type=int, default=config.SWEEP_EPISODE_TICKS, help="ticks per episode")
+    parser.add_argument('--workers', type=int, default=config.SWEEP_WORKERS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-stop', action='store_true', help="run every configuration to the end")
+    parser.add_argument('--output', default=config.SWEEP_OUTPUT_PATH, help="JSON file for every result")
+    args = parser.parse_args()
+
+    space = config.SWEEP_SPACE
+    configs = grid(space) if args.random is None else random_configs(space, args.random, args.seed)
+    print(f"Sweeping {len(configs)} configurations, {args.episodes} episodes each")
+
+    finished = []
+
+    def report(index, status, results):
+        finished.append(index)
+        final = results[index, FINAL]
+        score = f"final wait {final:.2f} s" if status == DONE else \
+            f"stopped after {int((~np.isnan(results[index, :FINAL])).sum())} episodes"
+        print(f"[{len(finished)}/{len(configs)}] {configs[index]}: {score}")
+
+    results = run_sweep(configs, episodes=args.episodes, ticks_per_episode=args.ticks, workers=args.workers,
+                        seed=args.seed, rung=0 if args.no_stop else config.SWEEP_RUNG_EPISODES, on_result=report)
+    rows = summarize(configs, results)
+    with open(args.output, 'w') as f:
+        json.dump(rows, f, indent=1)
+
+    print(f"\nBest configurations (all results in {args.output}):")
+    for row in rows[:5]:
+        if row['final_wait_s'] is not None:
+            print(f"  {row['final_wait_s']:6.2f} s  {row['params']}")
+
+
+if __name__ == "__main__":
+    main()
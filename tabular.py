@@ -0,0 +1,470 @@
+# tabular.py
+# A flat-array tabular Q-learning core with experience replay.
+#
+# A state is packed into one integer, (ns_bin * NUM_BINS + ew_bin) * phases + phase,
+# so the Q-table is a single float32 (states, actions) array and a lookup is
+# one index. Transitions go into a NumPy ring buffer and are learned in
+# minibatches scattered back with `np.bincount`, so each one is reused for as
+# long as it stays in the buffer and the per-decision cost is a couple of
+# list lookups.
+import math
+import random
+import numpy as np
+import config
+
+NUM_BINS = config.MAX_QUEUE_BIN + 1
+NUM_STATES = NUM_BINS * NUM_BINS * config.NUM_PHASES
+
+
+# Sparse store: key of an unused slot (packed states are never negative) and the key hash
+EMPTY = -1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # 2**64 / golden ratio, so nearby keys land far apart
+HASH_MASK = 2 ** 64 - 1
+
+
+def queue_bins(bin_size=config.QUEUE_BIN_SIZE):
+    """Queue length -> bin for every length up to the first one in the top bin."""
+    return [min(math.ceil(length / bin_size), config.MAX_QUEUE_BIN)
+            for length in range(config.MAX_QUEUE_BIN * bin_size + 1)]
+
+
+def state_index(ns_bin, ew_bin, phase):
+    """Packs a `(ns_bin, ew_bin, phase)` state into its row of the flat Q-table; works on arrays too."""
+    return (ns_bin * NUM_BINS + ew_bin) * config.NUM_PHASES + phase
+
+
+def flat_states(states):
+    """Flat indices for a batch of states: `(n, 3)` rows as `VectorEnv` returns them, or indices already."""
+    states = np.asarray(states)
+    if states.ndim == 2:
+        return state_index(states[:, 0], states[:, 1], states[:, 2])
+    return states
+
+
+class ReplayBuffer:
+    """The last `capacity` transitions as parallel NumPy arrays, overwritten oldest first."""
+    def __init__(self, capacity):
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.count = 0  # Transitions added in total, including overwritten ones
+
+        # Uniform draws for `sample`, made in bulk because small NumPy draws cost more in overhead
+        self.draws = np.zeros(0)
+        self.draws_used = 0
+
+    def __len__(self):
+        return min(self.count, len(self.states))
+
+    def add(self, state, action, reward, next_state):
+        i = self.count % len(self.states)
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.count += 1
+
+    def extend(self, states, actions, rewards, next_states):
+        """Adds a batch of transitions; only the last `capacity` of a huge batch are kept."""
+        capacity = len(self.states)
+        n = len(states)
+        keep = slice(max(n - capacity, 0), n)
+        index = (self.count + np.arange(n)[keep]) % capacity
+        self.states[index] = states[keep]
+        self.actions[index] = actions[keep]
+        self.rewards[index] = rewards[keep]
+        self.next_states[index] = next_states[keep]
+        self.count += n
+
+    def latest(self, n):
+        """Buffer positions of the `n` most recent transitions, oldest first."""
+        return np.arange(self.count - min(n, len(self)), self.count) % len(self.states)
+
+    def sample(self, n):
+        """Buffer positions of `n` transitions drawn uniformly with replacement."""
+        if self.draws_used + n > len(self.draws):
+            self.draws = np.random.random(max(64 * n, 4096))
+            self.draws_used = 0
+        draws = self.draws[self.draws_used:self.draws_used + n]
+        self.draws_used += n
+        return (draws * len(self)).astype(np.intp)
+
+
+class FlatQLearningAgent:
+    """Q-learning on a flat float32 table, learning from replayed minibatches.
+
+    Has the interface of `controller.QLearningAgent`, so `QLearningController`,
+    `VectorEnv`, training and checkpoints work with either. States are ints
+    (see `state_index`). `update_q_table` only stores the transition; every
+    `update_every` transitions `learn()` applies the new ones together with
+    `batch_size` replayed ones in a single vectorized update. With
+    `update_every=0` nothing is learned until `learn()` is called, e.g.
+    between episodes or from another thread.
+    """
+    def __init__(self, alpha, gamma, epsilon, min_epsilon, decay, queue_bin_size=config.QUEUE_BIN_SIZE,
+                 replay_size=config.REPLAY_SIZE, batch_size=config.REPLAY_BATCH_SIZE,
+                 update_every=config.REPLAY_UPDATE_EVERY):
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.min_epsilon = min_epsilon
+        self.epsilon_decay = decay
+        self.queue_bin_size = queue_bin_size
+        self.queue_bins = queue_bins(queue_bin_size)
+        self.batch_size = batch_size
+        self.update_every = update_every
+
+        self._init_table()
+        self.replay = ReplayBuffer(replay_size)
+        self.pending = 0  # Transitions stored since the last `learn`
+
+    def _init_table(self):
+        self.q_table = np.zeros((NUM_STATES, config.NUM_ACTIONS), dtype=np.float32)
+        self.visits = np.zeros((NUM_STATES, config.NUM_ACTIONS), dtype=np.int64)  # Updates per state-action
+
+    def get_state(self, intersection, phase_age=0):
+        """Bins the queue lengths with a table lookup and returns the packed state; `phase_age` is not used."""
+        bins = self.queue_bins
+        top = len(bins) - 1
+        ns_bin = bins[min(len(intersection.ns_queue), top)]
+        ew_bin = bins[min(len(intersection.ew_queue), top)]
+        phase = 0 if intersection.current_phase.startswith('NS') else 1
+        return (ns_bin * NUM_BINS + ew_bin) * config.NUM_PHASES + phase
+
+    def choose_action(self, state):
+        """Chooses an action using an epsilon-greedy policy (same draws as `QLearningAgent`)."""
+        if random.uniform(0, 1) < self.epsilon:
+            return random.randint(0, config.NUM_ACTIONS - 1)  # Explore
+        return int(self.q_table[state].argmax())  # Exploit
+
+    def update_q_table(self, state, action, reward, next_state):
+        """Stores a transition, learning once `update_every` of them have built up."""
+        self.replay.add(state, action, reward, next_state)
+        self.pending += 1
+        if self.update_every and self.pending >= self.update_every:
+            self.learn()
+
+    def learn(self):
+        """Learns from every transition stored since the last call plus `batch_size` replayed ones."""
+        index = self.replay.latest(self.pending)
+        if self.batch_size and len(self.replay):
+            index = np.concatenate((index, self.replay.sample(self.batch_size)))
+        self.pending = 0
+        if len(index):
+            replay = self.replay
+            self._apply(replay.states[index], replay.actions[index],
+                        replay.rewards[index], replay.next_states[index])
+
+    def flush(self):
+        """Learns from the transitions still waiting for a full batch, e.g. before the table is read out."""
+        if self.pending:
+            self.learn()
+
+    def choose_actions(self, states):
+        """Chooses epsilon-greedy actions for a batch of states."""
+        states = self._keys(states)
+        greedy = np.argmax(self.q_table[states], axis=1)
+        explore = np.random.random(len(states)) < self.epsilon
+        random_actions = np.random.randint(0, config.NUM_ACTIONS, len(states))
+        return np.where(explore, random_actions, greedy)
+
+    def update_q_table_batch(self, states, actions, rewards, next_states):
+        """Stores a batch of transitions and learns from it at once, with a replayed minibatch."""
+        self.replay.extend(self._keys(states), np.asarray(actions), np.asarray(rewards),
+                           self._keys(next_states))
+        self.pending += len(actions)
+        self.learn()
+
+    def _keys(self, states):
+        return flat_states(states)
+
+    def _apply(self, states, actions, rewards, next_states):
+        """One Q-learning step per state-action in the batch, by the mean TD error of its transitions.
+
+        Averaging keeps a minibatch full of one state-action from stepping
+        `alpha` times its count, which would diverge.
+        """
+        next_max = self.q_table[next_states].max(axis=1)
+        td_error = rewards + self.gamma * next_max - self.q_table[states, actions]
+
+        # Scatter into the flat table: summed errors and counts per state-action
+        index = states.astype(np.intp) * config.NUM_ACTIONS + actions
+        size = self.q_table.size
+        counts = np.bincount(index, minlength=size)
+        touched = np.flatnonzero(counts)
+        total_error = np.bincount(index, weights=td_error, minlength=size)
+        q_values = self.q_table.reshape(-1)
+        q_values[touched] += self.alpha * total_error[touched] / counts[touched]
+        self.visits.reshape(-1)[touched] += counts[touched]
+
+    def decay_epsilon(self):
+        """Reduces epsilon to decrease exploration over time."""
+        if self.epsilon > self.min_epsilon:
+            self.epsilon *= self.epsilon_decay
+
+
+class StateEncoder:
+    """Packs named integer features into one state key (mixed radix), clamping each to its range.
+
+        encoder = StateEncoder([('ns_bin', 41), ('ew_bin', 41), ('phase', 2)])
+        key = encoder.encode(12, 3, 1)
+    """
+    def __init__(self, fields):
+        self.names = tuple(name for name, _ in fields)
+        self.sizes = tuple(int(size) for _, size in fields)
+        self.num_states = math.prod(self.sizes)
+        if self.num_states > 2 ** 63:
+            raise ValueError(f"{self.num_states} states do not fit in a 64-bit key")
+        # Place value of each feature; the last one varies fastest
+        self.multipliers = np.array([math.prod(self.sizes[i + 1:]) for i in range(len(self.sizes))],
+                                    dtype=np.int64)
+
+    def encode(self, *values):
+        key = 0
+        for value, size in zip(values, self.sizes):
+            key = key * size + min(max(int(value), 0), size - 1)
+        return key
+
+    def encode_rows(self, rows):
+        """`encode` for every row of an `(n, features)` integer array."""
+        rows = np.clip(np.asarray(rows, dtype=np.int64), 0, np.array(self.sizes) - 1)
+        return (rows * self.multipliers).sum(axis=1)
+
+    def decode(self, key):
+        """The features packed into `key`, by name."""
+        values = []
+        for size in reversed(self.sizes):
+            key, value = divmod(key, size)
+            values.append(value)
+        return dict(zip(self.names, reversed(values)))
+
+
+def default_encoder():
+    """Fine queue bins, the phase, decisions spent in it and emergency vehicles waiting per approach."""
+    bins = config.SPARSE_MAX_QUEUE_BIN + 1
+    return StateEncoder([('ns_bin', bins), ('ew_bin', bins), ('phase', config.NUM_PHASES),
+                         ('phase_age', config.SPARSE_PHASE_AGE_BINS),
+                         ('ns_emergency', 2), ('ew_emergency', 2)])
+
+
+def emergency_waiting(queue):
+    """Whether an emergency vehicle waits in `queue`; queues of ids or bare lengths never report one."""
+    if not hasattr(queue, '__iter__'):
+        return False
+    return any(getattr(car, 'is_emergency', False) for car in queue)
+
+
+class SparseQStore:
+    """Q-values of the states seen so far, in open-addressing arrays keyed by packed state.
+
+    `row(key)` and `rows(keys)` return the stored values, or `default` for a
+    state never learned from, without storing anything. `slots(keys)` stores
+    missing states first. The arrays double when half full. With
+    `max_states`, making room past it first evicts the `evict_fraction` of
+    stored states with the fewest visits.
+    """
+    def __init__(self, num_actions, capacity=1024, default=0.0, max_states=None,
+                 evict_fraction=config.SPARSE_EVICT_FRACTION):
+        self.num_actions = num_actions
+        self.default = default
+        self.default_row = np.full(num_actions, default, dtype=np.float32)
+        self.max_states = max_states
+        self.evict_fraction = evict_fraction
+        self.evicted = 0  # States dropped by eviction so far
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """Empty arrays of `capacity` slots (a power of two)."""
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.values = np.full((capacity, self.num_actions), self.default, dtype=np.float32)
+        self.visits = np.zeros((capacity, self.num_actions), dtype=np.int64)
+        self.size = 0
+        self.shift = 64 - (capacity.bit_length() - 1)  # Keep the top bits of the hash
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes + self.visits.nbytes
+
+    def find(self, key):
+        """Slot of `key`, or -1 if that state is not stored."""
+        keys = self.keys
+        mask = len(keys) - 1
+        slot = ((key * HASH_MULTIPLIER) & HASH_MASK) >> self.shift
+        while True:
+            stored = keys[slot]
+            if stored == key:
+                return slot
+            if stored == EMPTY:
+                return -1
+            slot = (slot + 1) & mask
+
+    def row(self, key):
+        """Q-values of one state, read-only."""
+        slot = self.find(key)
+        return self.values[slot] if slot >= 0 else self.default_row
+
+    def find_many(self, keys):
+        """`find` for an array of keys, probing all of them in step."""
+        keys = np.asarray(keys, dtype=np.int64)
+        slots = ((keys.astype(np.uint64) * np.uint64(HASH_MULTIPLIER)) >> np.uint64(self.shift)).astype(np.intp)
+        found = np.full(len(keys), -1, dtype=np.intp)
+        active = np.arange(len(keys))
+        mask = len(self.keys) - 1
+        while len(active):
+            stored = self.keys[slots[active]]
+            hit = stored == keys[active]
+            found[active[hit]] = slots[active[hit]]
+            active = active[~hit & (stored != EMPTY)]
+            slots[active] = (slots[active] + 1) & mask
+        return found
+
+    def rows(self, keys):
+        """Q-values of every state in `keys` as a new `(n, actions)` array."""
+        slots = self.find_many(keys)
+        rows = self.values[slots]
+        rows[slots < 0] = self.default
+        return rows
+
+    def slots(self, keys, pinned=None):
+        """Slots of every state in `keys`, storing the missing ones with default values first.
+
+        Making room never evicts a state in `keys` or `pinned`. With
+        `max_states`, new states are stored only while there is room that
+        evicting other states can make; keys left over get slot -1.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        found = self.find_many(keys)
+        if (found >= 0).all():
+            return found
+
+        # 1. New keys in first-seen order, capped by what eviction can free
+        new = keys[found < 0]
+        _, first = np.unique(new, return_index=True)
+        missing = new[np.sort(first)]
+        protected = keys if pinned is None else np.concatenate((keys, np.asarray(pinned, dtype=np.int64)))
+        if self.max_states is not None:
+            stored_protected = int((self.find_many(np.unique(protected)) >= 0).sum())
+            missing = missing[:max(self.max_states - stored_protected, 0)]
+
+        # 2. Evict and grow, then store them
+        self._make_room(len(missing), protected)
+        for key in missing.tolist():
+            self._insert(key)
+        resolved = self.find_many(keys)
+        assert (resolved[(found >= 0) | np.isin(keys, missing)] >= 0).all(), "a batch key was evicted"
+        return resolved
+
+    def _insert(self, key):
+        """Stores a key known to be missing and returns its slot."""
+        keys = self.keys
+        mask = len(keys) - 1
+        slot = ((key * HASH_MULTIPLIER) & HASH_MASK) >> self.shift
+        while keys[slot] != EMPTY:
+            slot = (slot + 1) & mask
+        keys[slot] = key
+        self.size += 1
+        return slot
+
+    def _make_room(self, n, protected=None):
+        """Evicts (none of `protected`) and grows as needed so `n` more states can be stored."""
+        if self.max_states is not None and self.size + n > self.max_states:
+            self.evict(self.size + n - self.max_states, protected)
+        capacity = len(self.keys)
+        while 2 * (self.size + n) > capacity:
+            capacity *= 2
+        if capacity != len(self.keys):
+            self._rehash(capacity, np.flatnonzero(self.keys != EMPTY))
+
+    def evict(self, at_least=0, protected=None):
+        """Drops the least visited states: `evict_fraction` of them, or `at_least` if that is more.
+
+        States in `protected` are kept whatever their visits.
+        """
+        used = np.flatnonzero(self.keys != EMPTY)
+        keep = np.isin(self.keys[used], protected) if protected is not None else np.zeros(len(used), dtype=bool)
+        candidates = used[~keep]
+        drop = min(max(int(len(used) * self.evict_fraction), at_least), len(candidates))
+        order = np.argsort(self.visits[candidates].sum(axis=1), kind='stable')
+        self._rehash(len(self.keys), np.concatenate((used[keep], candidates[order[drop:]])))
+        self.evicted += drop
+
+    def _rehash(self, capacity, keep):
+        """Rebuilds the arrays at `capacity` slots with only the states in slots `keep`."""
+        keys, values, visits = self.keys[keep], self.values[keep], self.visits[keep]
+        self._allocate(capacity)
+        slots = [self._insert(key) for key in keys.tolist()]
+        self.values[slots] = values
+        self.visits[slots] = visits
+
+
+class SparseQLearningAgent(FlatQLearningAgent):
+    """`FlatQLearningAgent` over a `SparseQStore`, for state spaces too large for a dense table.
+
+    States are packed by `encoder` (`default_encoder()` unless given; a
+    custom encoder needs a matching `get_state`), and memory grows only with
+    the states actually learned from. Batch methods take packed keys or
+    `(n, features)` rows in the encoder's field order. There is no dense
+    `q_table`, so checkpoints and parallel-training merges do not apply.
+    """
+    def __init__(self, alpha, gamma, epsilon, min_epsilon, decay, encoder=None,
+                 max_states=config.SPARSE_MAX_STATES, **replay_options):
+        self.encoder = default_encoder() if encoder is None else encoder
+        self.max_states = max_states
+        super().__init__(alpha, gamma, epsilon, min_epsilon, decay, **replay_options)
+
+    def _init_table(self):
+        self.store = SparseQStore(config.NUM_ACTIONS, max_states=self.max_states)
+
+    def get_state(self, intersection, phase_age=0):
+        """Packs fine queue bins, the phase, its age in decisions and waiting emergency vehicles.
+
+        The controller counts `phase_age`, the decisions made since the phase
+        last changed, and resets it with each episode.
+        """
+        size = config.SPARSE_QUEUE_BIN_SIZE
+        phase = 0 if intersection.current_phase.startswith('NS') else 1
+        return self.encoder.encode(-(-len(intersection.ns_queue) // size), -(-len(intersection.ew_queue) // size),
+                                   phase, phase_age,
+                                   emergency_waiting(intersection.ns_queue), emergency_waiting(intersection.ew_queue))
+
+    def choose_action(self, state):
+        """Chooses an action using an epsilon-greedy policy."""
+        if random.uniform(0, 1) < self.epsilon:
+            return random.randint(0, config.NUM_ACTIONS - 1)  # Explore
+        return int(self.store.row(state).argmax())  # Exploit
+
+    def choose_actions(self, states):
+        """Chooses epsilon-greedy actions for a batch of states."""
+        states = self._keys(states)
+        greedy = np.argmax(self.store.rows(states), axis=1)
+        explore = np.random.random(len(states)) < self.epsilon
+        random_actions = np.random.randint(0, config.NUM_ACTIONS, len(states))
+        return np.where(explore, random_actions, greedy)
+
+    def _keys(self, states):
+        states = np.asarray(states)
+        return self.encoder.encode_rows(states) if states.ndim == 2 else states
+
+    def _apply(self, states, actions, rewards, next_states):
+        """`FlatQLearningAgent._apply` on the store; states learned from are stored if new.
+
+        Room for new states is made before anything is read, never by evicting
+        a state of this batch. Transitions whose state found no room under
+        `max_states` are not learned from.
+        """
+        slots = self.store.slots(states, pinned=next_states)
+        stored = slots >= 0
+        if not stored.all():
+            slots, actions, rewards, next_states = slots[stored], actions[stored], rewards[stored], next_states[stored]
+        next_max = self.store.rows(next_states).max(axis=1)
+        td_error = rewards + self.gamma * next_max - self.store.values[slots, actions]
+
+        pairs, inverse, counts = np.unique(slots * config.NUM_ACTIONS + actions,
+                                           return_inverse=True, return_counts=True)
+        total_error = np.bincount(inverse, weights=td_error)
+        self.store.values.reshape(-1)[pairs] += self.alpha * total_error / counts
+        self.store.visits.reshape(-1)[pairs] += counts
@@ -0,0 +1,31 @@
+# test_controller.py
+# Tests for the batched Q-learning update of `QLearningAgent`.
+import numpy as np
+from controller import QLearningAgent
+
+
+def _agent():
+    return QLearningAgent(alpha=0.5, gamma=0.9, epsilon=0.0, min_epsilon=0.0, decay=1.0)
+
+
+def test_repeated_transition_steps_once():
+    agent = _agent()
+    states = np.tile([[1, 2, 0]], (50, 1))
+    next_states = np.tile([[1, 2, 0]], (50, 1))
+    for _ in range(20):
+        agent.update_q_table_batch(states, np.ones(50, dtype=np.int64), np.full(50, -10.0), next_states)
+
+    # A fixed point of Q = r + gamma * max Q is -100; averaged steps approach it from above
+    assert -100 <= agent.q_table.min() <= agent.q_table.max() <= 0
+    assert agent.visits[1, 2, 0, 1] == 1000
+
+
+def test_batch_matches_one_update_of_the_mean_error():
+    agent, single = _agent(), _agent()
+    rewards = np.array([-4.0, -8.0, -12.0])
+    agent.update_q_table_batch(np.tile([[3, 0, 1]], (3, 1)), np.zeros(3, dtype=np.int64), rewards,
+                               np.tile([[0, 0, 0]], (3, 1)))
+    single.update_q_table((3, 0, 1), 0, rewards.mean(), (0, 0, 0))
+
+    assert np.array_equal(agent.q_table, single.q_table)
+    assert agent.visits[3, 0, 1, 0] == 3
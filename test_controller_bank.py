@@ -0,0 +1,30 @@
+# test_controller_bank.py
+# A shared agent learning from every node of a grid at once must stay bounded.
+import random
+import numpy as np
+import pytest
+from controller import QLearningAgent
+from controller_bank import QLearningBank
+from network import GridNetwork
+from tabular import FlatQLearningAgent
+
+
+@pytest.mark.parametrize('agent_class', [QLearningAgent, FlatQLearningAgent])
+def test_shared_agent_stays_bounded(agent_class):
+    random.seed(0)
+    np.random.seed(0)
+    agent = agent_class(alpha=0.5, gamma=0.9, epsilon=0.3, min_epsilon=0.3, decay=1.0)
+    bank = QLearningBank(100, agent, decision_interval=5, yellow_time=2)
+    network = GridNetwork(10, 10, controller_bank=bank, seed=0)
+
+    lowest = 0.0
+    for _ in range(3000):
+        lowest = min(lowest, network.step().min())
+    if hasattr(agent, 'learn'):
+        agent.learn()
+
+    # Every reward is at most 0 and at least `lowest`, so every Q-value must be too, over 1 - gamma
+    assert bank.decisions > 10000
+    assert agent.visits.sum() > 0
+    assert agent.q_table.max() <= 0
+    assert agent.q_table.min() >= lowest / (1 - agent.gamma)
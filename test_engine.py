@@ -0,0 +1,100 @@
+# test_engine.py
+# The headless engine must match the pygame loop, and event-driven runs must match stepped ones, tick for tick.
+import os
+import random
+import numpy as np
+import pytest
+import config
+from arrivals import ArrivalStream
+from controller import FixedTimeController, QLearningAgent, QLearningController
+from engine import SimulationEngine
+from stats import TrafficStats
+
+TICKS = 6000
+
+
+def _engine(kind, seed, arrivals):
+    if kind == 'fixed':
+        controller = FixedTimeController(config.FIXED_GREEN_TIME, config.FIXED_YELLOW_TIME)
+    else:
+        agent = QLearningAgent(alpha=0.1, gamma=0.9, epsilon=0.5, min_epsilon=0.05, decay=0.999)
+        controller = QLearningController(agent, config.AI_DECISION_INTERVAL, config.AI_YELLOW_TIME)
+    sim = SimulationEngine(controller, ArrivalStream(seed=seed) if arrivals else None)
+    sim.stats = TrafficStats()
+    return sim
+
+
+def _state(sim):
+    """Everything a run leaves behind: vehicles, counters, signals, statistics and what was learned."""
+    controller = sim.controller
+    agent = getattr(controller, 'agent', None)
+    return {
+        'vehicles': [(car.id, car.path, car.type, car.color, car.x, car.y, car.wait_time, car.total_wait,
+                      car.is_waiting, car.is_moving) for car in sim.vehicles],
+        'counters': (sim.frame_count, sim.cars_passed, sim.total_wait_time, sim.total_reward),
+        'signals': (sim.intersection.current_phase, controller.timer, controller.is_yellow),
+        'queues': (len(sim.intersection.ns_queue), len(sim.intersection.ew_queue)),
+        'stats': sim.stats.summary(sim.frame_count),
+        'q_table': None if agent is None else agent.q_table.tobytes(),
+    }
+
+
+def _count_jumps(sim):
+    """Records how many ticks each of `sim`'s `fast_forward` calls jumped over."""
+    jumped = []
+    fast_forward = sim.fast_forward
+
+    def counted(max_ticks):
+        skipped, arrivals = fast_forward(max_ticks)
+        jumped.append(skipped)
+        return skipped, arrivals
+
+    sim.fast_forward = counted
+    return jumped
+
+
+@pytest.mark.parametrize('arrivals', [False, True], ids=['random', 'arrival-stream'])
+@pytest.mark.parametrize('kind', ['fixed', 'q-learning'])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_event_driven_matches_stepped(kind, seed, arrivals):
+    finals = []
+    for event_driven in (False, True):
+        random.seed(seed)
+        np.random.seed(seed)
+        sim = _engine(kind, seed, arrivals)
+        jumped = _count_jumps(sim)
+        sim.run(TICKS, event_driven=event_driven)
+        if event_driven:
+            assert sum(jumped) > 0  # Some ticks really were jumped over
+        finals.append((_state(sim), random.getstate()))
+
+    stepped, event_driven = finals
+    assert event_driven[0] == stepped[0]
+    assert event_driven[1] == stepped[1]  # Both runs made the same random draws
+
+
+@pytest.mark.parametrize('kind', ['fixed', 'q-learning'])
+def test_headless_engine_matches_simulation(kind, monkeypatch):
+    pygame = pytest.importorskip('pygame')
+    monkeypatch.setitem(os.environ, 'SDL_VIDEODRIVER', 'dummy')
+    from simulation import Simulation
+
+    finals = []
+    for display in (False, True):
+        random.seed(3)
+        np.random.seed(3)
+        sim = _engine(kind, 3, arrivals=False)
+        if display:
+            sim = Simulation(sim.controller, mode='AI' if kind == 'q-learning' else 'FIXED')
+            sim.stats = TrafficStats()
+        # The display loop steps the same engine between frames; drawing must not change its state
+        for tick in range(3000):
+            sim.step()
+            if display and tick % 10 == 0:
+                sim._draw()
+        finals.append(_state(sim))
+    pygame.quit()
+
+    headless, displayed = finals
+    assert headless['counters'][1] > 0  # Some cars made it through
+    assert displayed == headless
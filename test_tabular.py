@@ -0,0 +1,58 @@
+# test_tabular.py
+# Tests for the sparse Q-value store under its `max_states` cap, and the sparse agent's states.
+import numpy as np
+from controller import QLearningController
+from engine import SimulationEngine
+from tabular import SparseQStore, SparseQLearningAgent, EMPTY
+
+
+def _fill(store):
+    """Stores states 1-4, each with its own values and some visits."""
+    slots = store.slots([1, 2, 3, 4])
+    store.values[slots] = [[1, 2], [3, 4], [5, 6], [7, 8]]
+    store.visits[slots] = 1
+
+
+def test_slots_never_evicts_batch_keys():
+    store = SparseQStore(2, max_states=6)
+    _fill(store)
+    slots = store.slots([1, 2, 10, 11, 12, 13, 14])
+
+    # Only 1 and 2 are in the batch: 3 and 4 make way, and four of the five new states fit
+    assert len(store) == 6
+    assert np.array_equal(store.keys[slots[:6]], [1, 2, 10, 11, 12, 13])
+    assert slots[6] == -1
+    assert (store.find_many([3, 4]) == -1).all()
+    assert np.array_equal(store.rows([1, 2]), [[1, 2], [3, 4]])
+
+
+def test_batch_past_max_states_leaves_other_states_alone():
+    agent = SparseQLearningAgent(alpha=0.5, gamma=0.9, epsilon=0.0, min_epsilon=0.0, decay=1.0,
+                                 max_states=8, batch_size=0)
+    store = agent.store
+    _fill(store)
+    before = store.rows([1, 2, 3, 4]).copy()
+
+    # Twenty new states in one batch, bootstrapping from the four stored ones
+    states = np.arange(100, 120)
+    next_states = np.tile([1, 2, 3, 4], 5)
+    agent._apply(states, np.zeros(20, dtype=np.int64), np.ones(20), next_states)
+
+    assert len(store) <= 8
+    assert np.array_equal(store.rows([1, 2, 3, 4]), before)
+    assert store.visits[store.keys == EMPTY].sum() == 0
+    learned = store.find_many(states) >= 0
+    assert learned.sum() == 4
+    assert (store.rows(states[learned])[:, 0] != 0).all()
+
+
+def test_sparse_state_is_pure_and_phase_age_resets():
+    agent = SparseQLearningAgent(alpha=0.5, gamma=0.9, epsilon=0.0, min_epsilon=0.0, decay=1.0)
+    controller = QLearningController(agent, decision_interval=5, yellow_time=2)
+    sim = SimulationEngine(controller)
+    assert agent.get_state(sim.intersection, 3) == agent.get_state(sim.intersection, 3)
+
+    sim.run(200)
+    assert controller.phase_age > 0  # A greedy agent on an empty table keeps the phase
+    sim.reset()
+    assert controller.phase_age == 0
@@ -0,0 +1,188 @@
+# tracing.py
+# Append-only binary traces of a run, for replaying it tick by tick later.
+#
+# A trace is two files of fixed-width little-endian records behind a short
+# header: `<path>` holds one record per tick (signal phase, controller timer
+# and where the tick's vehicles are), `<path>.vehicles` one record per vehicle
+# per tick. Records are collected in NumPy buffers and written in bulk, and
+# the reader memory-maps both files, so any tick can be reached without
+# reading the ones before it. Nothing here imports pygame; `replay.py` is the
+# viewer.
+import os
+import numpy as np
+import config
+from scenario import default_scenario
+from vectorized import VehicleArrays, VEHICLE_TYPES
+
+MAGIC = b'UFTR'
+VERSION = 1
+PATHS = ('NS', 'EW')
+PHASES = ('NS_GREEN', 'NS_YELLOW', 'EW_GREEN', 'EW_YELLOW')
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u2'),
+    ('fps', '<u2'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('tick_size', '<u2'),
+    ('vehicle_size', '<u2'),
+    ('reserved', 'V16'),
+])
+
+TICK_DTYPE = np.dtype([
+    ('tick', '<u4'),         # The engine's frame_count after the tick
+    ('timer', '<i4'),        # Controller timer, as shown on the lights
+    ('first', '<u8'),        # Index of the tick's first record in the vehicles file
+    ('count', '<u4'),        # Vehicles on the road after the tick
+    ('cars_passed', '<u4'),
+    ('phase', 'u1'),         # Index into PHASES
+    ('reserved', 'V7'),
+])
+
+VEHICLE_DTYPE = np.dtype([
+    ('id', '<u4'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('path', 'u1'),          # Index into PATHS
+    ('type', 'u1'),          # Index into vectorized.VEHICLE_TYPES
+    ('color', 'i1'),         # Index into config.VEHICLE_COLORS; -1 for emergency vehicles
+    ('is_waiting', 'u1'),
+])
+
+TYPE_CODES = {name: code for code, name in enumerate(VEHICLE_TYPES)}
+COLOR_CODES = {tuple(color): code for code, color in enumerate(config.VEHICLE_COLORS)}
+
+
+def _header(scenario):
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['fps'] = config.SIM_FPS
+    header['width'] = scenario.width
+    header['height'] = scenario.height
+    header['tick_size'] = TICK_DTYPE.itemsize
+    header['vehicle_size'] = VEHICLE_DTYPE.itemsize
+    return header
+
+
+class TraceWriter:
+    """Records every tick of an engine to a new trace at `path`.
+
+    Set it as the engine's `tracer` and `record` is called after each step;
+    event-driven runs then step every tick, since every tick is recorded.
+    Call `close()` at the end to write out what is still buffered. The
+    header records the screen size of `scenario` (config.py's by default),
+    which should be the one the engine runs.
+
+        sim.tracer = TraceWriter('run.trace')
+        sim.run(ticks)
+        sim.tracer.close()
+    """
+    def __init__(self, path, buffer_ticks=config.TRACE_BUFFER_TICKS, scenario=None):
+        if scenario is None:
+            scenario = default_scenario()
+        self.path = path
+        self.tick_file = open(path, 'wb')
+        self.vehicle_file = open(path + '.vehicles', 'wb')
+        _header(scenario).tofile(self.tick_file)
+        _header(scenario).tofile(self.vehicle_file)
+
+        self.ticks = np.zeros(buffer_ticks, dtype=TICK_DTYPE)
+        self.vehicles = np.zeros(buffer_ticks * 32, dtype=VEHICLE_DTYPE)
+        self.tick_count = 0      # Buffered tick records
+        self.vehicle_count = 0   # Buffered vehicle records
+        self.vehicles_written = 0
+
+    def record(self, sim):
+        """Appends the current state of `sim` as one tick."""
+        count = sum(len(lane) for lane in sim.lanes.values())
+        if self.tick_count == len(self.ticks) or self.vehicle_count + count > len(self.vehicles):
+            self.flush()
+        if count > len(self.vehicles):
+            self.vehicles = np.zeros(2 * count, dtype=VEHICLE_DTYPE)
+
+        # 1. One record per vehicle, lane by lane
+        start = self.vehicle_count
+        for path, lane in sim.lanes.items():
+            n = len(lane)
+            if n == 0:
+                continue
+            block = self.vehicles[self.vehicle_count:self.vehicle_count + n]
+            if isinstance(lane, VehicleArrays):
+                block['id'] = lane.id
+                block['x'] = lane.x
+                block['y'] = lane.y
+                block['type'] = lane.type
+                block['color'] = lane.color
+                block['is_waiting'] = lane.is_waiting
+            else:
+                block[:] = [(car.id, car.x, car.y, 0, TYPE_CODES[car.type],
+                             COLOR_CODES.get(car.color, -1), car.is_waiting) for car in lane]
+            block['path'] = PATHS.index(path)
+            self.vehicle_count += n
+
+        # 2. The tick record points at them (one tuple in TICK_DTYPE field order)
+        self.ticks[self.tick_count] = (sim.frame_count, getattr(sim.controller, 'timer', 0),
+                                       self.vehicles_written + start, count, sim.cars_passed,
+                                       PHASES.index(sim.intersection.current_phase), b'')
+        self.tick_count += 1
+
+    def flush(self):
+        """Writes the buffered records, vehicles first, so no tick points past the end of its file."""
+        self.vehicles[:self.vehicle_count].tofile(self.vehicle_file)
+        self.vehicle_file.flush()
+        self.ticks[:self.tick_count].tofile(self.tick_file)
+        self.tick_file.flush()
+        self.vehicles_written += self.vehicle_count
+        self.vehicle_count = 0
+        self.tick_count = 0
+
+    def close(self):
+        self.flush()
+        self.tick_file.close()
+        self.vehicle_file.close()
+
+
+class TraceReader:
+    """Random access to the ticks of a trace, straight from the memory-mapped files.
+
+    `len(reader)` is the number of recorded ticks and `reader[i]` returns the
+    i-th tick record with its vehicle records. A trace cut short by a crash
+    reads up to its last complete tick.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.ticks = self._map(path, TICK_DTYPE)
+        self.vehicles = self._map(path + '.vehicles', VEHICLE_DTYPE)
+
+        # Drop ticks whose vehicles never made it to disk
+        if len(self.ticks):
+            complete = self.ticks['first'] + self.ticks['count'] <= len(self.vehicles)
+            self.ticks = self.ticks[:int(np.argmin(complete)) if not complete.all() else len(self.ticks)]
+
+    @staticmethod
+    def _map(path, dtype):
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        if header['version'][0] != VERSION:
+            raise ValueError(f"{path} has trace version {header['version'][0]}, expected {VERSION}")
+
+        records = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // dtype.itemsize
+        if records == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_DTYPE.itemsize, shape=(records,))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def __getitem__(self, index):
+        """Returns `(tick, vehicles)`: one TICK_DTYPE record and its VEHICLE_DTYPE records."""
+        tick = self.ticks[index]
+        first = int(tick['first'])
+        return tick, self.vehicles[first:first + int(tick['count'])]
+
+    def find(self, tick):
+        """Index of the first recorded tick at or after `tick`; ticks must increase (one episode)."""
+        return int(np.searchsorted(self.ticks['tick'], tick))
@@ -0,0 +1,135 @@
+# training.py
+# Trains the Q-learning controller on many headless episodes across a process pool.
+import os
+import random
+import multiprocessing
+import numpy as np
+import config
+from engine import SimulationEngine
+from controller import QLearningAgent, QLearningController
+from tabular import FlatQLearningAgent
+from checkpoint import load_agent, save_agent
+from scenario import Scenario, default_scenario
+
+
+def make_agent():
+    """Creates a fresh agent of the `config.Q_AGENT` kind with the hyperparameters from config."""
+    agent_class = FlatQLearningAgent if config.Q_AGENT == 'flat' else QLearningAgent
+    return agent_class(
+        alpha=config.ALPHA,
+        gamma=config.GAMMA,
+        epsilon=config.EPSILON,
+        min_epsilon=config.MIN_EPSILON,
+        decay=config.EPSILON_DECAY
+    )
+
+
+def _run_worker(task):
+    """Runs headless episodes with a private copy of the shared Q-table.
+
+    Returns the worker's Q-table, the visits it made this round and one summary per episode.
+    """
+    q_table, epsilon, episodes, ticks_per_episode, seed, settings = task
+    random.seed(seed)
+    np.random.seed(seed)
+    scenario = Scenario(**settings)
+
+    agent = make_agent()
+    agent.q_table = q_table
+    agent.epsilon = epsilon
+    controller = QLearningController(
+        agent=agent,
+        decision_interval=scenario.ai_decision_interval,
+        yellow_time=scenario.ai_yellow_time
+    )
+    sim = SimulationEngine(controller, scenario=scenario)
+
+    # Epsilon is decayed by the driver, so every worker explores at the same rate
+    results = []
+    for _ in range(episodes):
+        sim.reset()
+        sim.run(ticks_per_episode, event_driven=True)
+        results.append({
+            'cars_passed': sim.cars_passed,
+            'total_reward': sim.total_reward,
+        })
+    if hasattr(agent, 'flush'):
+        agent.flush()  # Transitions short of a batch would otherwise never reach the table
+    return agent.q_table, agent.visits, results
+
+
+def merge_q_tables(base, q_tables, visits, method='visits'):
+    """Combines the workers' Q-tables into one.
+
+    'mean' averages every table. 'visits' weights each worker's value by how
+    often it updated that state-action this round; entries no worker touched
+    keep the value from `base`.
+    """
+    dtype = np.asarray(base).dtype
+    q_tables = np.stack(q_tables)
+    if method == 'mean':
+        return q_tables.mean(axis=0).astype(dtype, copy=False)
+    if method != 'visits':
+        raise ValueError(f"Unknown merge method: {method}")
+
+    visits = np.stack(visits)
+    total = visits.sum(axis=0)
+    weighted = (q_tables * visits).sum(axis=0)
+    return np.where(total > 0, weighted / np.maximum(total, 1), base).astype(dtype, copy=False)
+
+
+def train_parallel(rounds=config.TRAIN_ROUNDS, episodes_per_round=config.TRAIN_EPISODES_PER_ROUND,
+                   ticks_per_episode=config.EPISODE_TICKS, workers=config.TRAIN_WORKERS,
+                   merge=config.TRAIN_MERGE, agent=None, seed=None, on_round=None, scenario=None):
+    """Trains `agent` (or a new one) with one worker process per core, on `scenario` (config.py's by default).
+
+    Each round broadcasts the current Q-table and epsilon, lets every worker
+    run `episodes_per_round` episodes, then merges the tables and decays
+    epsilon once for every episode run anywhere. `on_round(round, agent,
+    results)` is called after each merge. Returns the trained agent.
+    """
+    if agent is None:
+        agent = make_agent()
+    workers = workers or os.cpu_count()
+    settings = (scenario or default_scenario()).as_dict()  # Scenarios go to the workers as plain settings
+    seeds = np.random.SeedSequence(seed)
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        for round_index in range(rounds):
+            round_seeds = seeds.spawn(workers)
+            tasks = [(np.asarray(agent.q_table), agent.epsilon, episodes_per_round, ticks_per_episode,
+                      int(s.generate_state(1)[0]), settings) for s in round_seeds]
+            outputs = pool.map(_run_worker, tasks)
+
+            q_tables = [q for q, _, _ in outputs]
+            visits = [v for _, v, _ in outputs]
+            agent.q_table = merge_q_tables(agent.q_table, q_tables, visits, merge)
+            agent.visits = agent.visits + sum(visits)
+
+            for _ in range(workers * episodes_per_round):
+                agent.decay_epsilon()
+
+            if on_round is not None:
+                on_round(round_index, agent, [r for _, _, rs in outputs for r in rs])
+    return agent
+
+
+def main():
+    # Continue from the last checkpoint, and save after every round
+    scenario = Scenario.load(config.SCENARIO_PATH) if config.SCENARIO_PATH else default_scenario()
+    agent = make_agent()
+    if load_agent(agent):
+        print(f"Resuming from {config.CHECKPOINT_PATH} (epsilon {agent.epsilon:.4f})")
+
+    def report(round_index, agent, results):
+        save_agent(agent)
+        avg_reward = sum(r['total_reward'] for r in results) / len(results)
+        avg_passed = sum(r['cars_passed'] for r in results) / len(results)
+        print(f"Round {round_index + 1}: avg reward {avg_reward:.0f}, "
+              f"avg cars passed {avg_passed:.1f}, epsilon {agent.epsilon:.4f}")
+
+    train_parallel(agent=agent, on_round=report, scenario=scenario)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# vector_env.py
+# Many independent intersections stepped in lockstep, for fast Q-learning experience collection.
+import numpy as np
+import config
+from scenario import default_scenario
+from vectorized import advance, type_speeds, FlatVehicleStore, TYPE_CAR, TYPE_AMBULANCE, TYPE_POLICE
+
+
+class VectorEnv(FlatVehicleStore):
+    """N copies of the intersection and its traffic, advanced together with NumPy.
+
+    Each env follows `QLearningController` timing. `reset()` runs every env to
+    its first decision point and returns the states seen there. `step(actions)`
+    applies one action per env (0 = keep phase, 1 = switch) and runs each env
+    to its next decision point. Envs that get there early wait for the others.
+    States are `(num_envs, 3)` rows of `(ns_bin, ew_bin, phase)`, the same
+    binning as `QLearningAgent.get_state`. Rewards are each env's reward on its
+    decision tick, which is what `QLearningController` passes to the Q update.
+    Geometry, demand and signal timings come from `scenario` (config.py's by
+    default) unless the timings are given.
+
+        states = env.reset()
+        while training:
+            actions = agent.choose_actions(states)
+            next_states, rewards = env.step(actions)
+            agent.update_q_table_batch(states, actions, rewards, next_states)
+            states = next_states
+    """
+    def __init__(self, num_envs, decision_interval=None, yellow_time=None, seed=None, scenario=None,
+                 queue_bin_size=config.QUEUE_BIN_SIZE):
+        if scenario is None:
+            scenario = default_scenario()
+        self.num_envs = num_envs
+        self.scenario = scenario
+        self.decision_interval = scenario.ai_decision_interval if decision_interval is None else decision_interval
+        self.yellow_time = scenario.ai_yellow_time if yellow_time is None else yellow_time
+        self.rng = np.random.default_rng(seed)
+
+        # State binning, which belongs to the agent rather than the scenario
+        self.queue_bin_size = queue_bin_size
+        self.max_queue_bin = config.MAX_QUEUE_BIN
+
+        # Geometry per path code (0 = NS, 1 = EW)
+        self.stop_pos = np.array([scenario.stop_pos['NS'], scenario.stop_pos['EW']], dtype=float)
+        self.exit_pos = np.array([scenario.exit_pos['NS'], scenario.exit_pos['EW']], dtype=float)
+        self.vehicle_length = scenario.car_height
+        self.min_gap = scenario.min_follow_distance
+        self.type_speeds = type_speeds(scenario)
+        self.car_rate = scenario.car_spawn_rate
+        self.ambulance_rate = scenario.ambulance_spawn_rate
+        self.police_rate = scenario.police_spawn_rate
+
+    def reset(self):
+        """Clears all traffic and runs every env to its first decision point."""
+        n = self.num_envs
+
+        # Vehicles of every env in one flat store, ordered by lane then rear to front.
+        # Lane `2 * env + path` holds the vehicles on that env's approach.
+        self._clear_vehicles()
+
+        # Signal state per env, mirroring QLearningController
+        self.phase = np.zeros(n, dtype=np.int64)  # 0 = NS, 1 = EW
+        self.is_yellow = np.zeros(n, dtype=bool)
+        self.timer = np.full(n, self.decision_interval, dtype=np.int64)
+
+        self.queue_lengths = np.zeros((n, 2), dtype=np.int64)
+        self.emergency_present = np.zeros(n, dtype=bool)
+        self.cars_passed = np.zeros(n, dtype=np.int64)
+        self.total_wait_time = np.zeros(n, dtype=np.int64)
+        self.frame_count = np.zeros(n, dtype=np.int64)
+
+        states, _ = self._run_to_decision()
+        return states
+
+    def step(self, actions):
+        """Applies one decision per env and returns the next states and rewards."""
+        switch = np.asarray(actions) == 1
+        self.is_yellow[switch] = True
+        self.timer[switch] = self.yellow_time
+        self.timer[~switch] = self.decision_interval
+        return self._run_to_decision()
+
+    def get_states(self):
+        """Discretizes every env's queue lengths into bins, like `QLearningAgent.get_state`."""
+        bins = np.minimum(-(-self.queue_lengths // self.queue_bin_size), self.max_queue_bin)
+        return np.column_stack((bins, self.phase))
+
+    def _run_to_decision(self):
+        """Ticks every env in lockstep until each one reaches a decision point."""
+        n = self.num_envs
+        states = np.zeros((n, 3), dtype=np.int64)
+        rewards = np.zeros(n)
+        pending = np.ones(n, dtype=bool)
+
+        while pending.any():
+            self.frame_count[pending] += 1
+
+            # 1. Update vehicles and get rewards
+            reward = self._update_vehicles(pending)
+
+            # 2. Update controllers
+            decided = self._update_controllers(pending)
+            if decided.any():
+                states[decided] = self.get_states()[decided]
+                rewards[decided] = reward[decided]
+
+            # 3. Spawn new vehicles (after the decision, as in `SimulationEngine.step`)
+            self._spawn_vehicles(pending)
+            pending &= ~decided
+
+        return states, rewards
+
+    def _update_vehicles(self, active):
+        """Advances the vehicles of every active env by one tick and returns per-env rewards."""
+        n = self.num_envs
+        env = self.lane >> 1
+        path = self.lane & 1
+        moving = active[env]
+
+        # Emergency vehicles on the road before this tick gate the next spawn
+        present = np.bincount(env[self.is_emergency], minlength=n) > 0
+        self.emergency_present = np.where(active, present, self.emergency_present)
+
+        # Each vehicle's leader is the next one in the store if it shares the lane
+        has_leader = np.zeros(len(self.lane), dtype=bool)
+        has_leader[:-1] = self.lane[1:] == self.lane[:-1]
+        leader_pos = np.full(len(self.pos), np.inf)
+        leader_pos[:-1] = self.pos[1:]
+
+        lane_green = (self.phase[:, None] == np.arange(2)) & ~self.is_yellow[:, None]
+        is_green = lane_green.ravel()[self.lane]
+        new_pos, new_wait, waiting = advance(
+            self.pos, self.vehicle_length, self.speed, self.is_emergency, self.wait_time,
+            has_leader, leader_pos, is_green, self.stop_pos[path], self.min_gap)
+
+        if active.all():
+            self.pos, self.wait_time, self.is_waiting = new_pos, new_wait, waiting
+        else:
+            self.pos = np.where(moving, new_pos, self.pos)
+            self.wait_time = np.where(moving, new_wait, self.wait_time)
+            self.is_waiting = np.where(moving, waiting, self.is_waiting)
+
+        # Queues and rewards come from the waiting vehicles
+        queues = np.bincount(self.lane[self.is_waiting], minlength=2 * n).reshape(n, 2)
+        self.queue_lengths[active] = queues[active]
+        # The store is grouped by env, so per-env sums are differences of a running total
+        env_ends = np.searchsorted(env, np.arange(n + 1))
+        waited = np.concatenate(([0], np.cumsum(self.wait_time * self.is_waiting)))
+        reward = -np.diff(waited[env_ends]).astype(float)
+
+        # Remove cars that are off-screen
+        exited = moving & (self.pos > self.exit_pos[path])
+        if exited.any():
+            self.cars_passed += np.bincount(env[exited], minlength=n)
+            self.total_wait_time += np.bincount(
+                env[exited], weights=self.wait_time[exited], minlength=n).astype(np.int64)
+            self._keep(~exited)
+        return reward
+
+    def _update_controllers(self, active):
+        """Runs one `QLearningController.update` tick per active env; returns the envs that must decide."""
+        yellow = active & self.is_yellow
+        green = active & ~self.is_yellow
+        self.timer[active] -= 1
+
+        # Yellow finished: switch to the other green and start a new decision timer
+        switched = yellow & (self.timer <= 0)
+        self.is_yellow[switched] = False
+        self.phase[switched] = 1 - self.phase[switched]
+        self.timer[switched] = self.decision_interval
+
+        return green & (self.timer <= 0)
+
+    def _spawn_vehicles(self, active):
+        """Draws this tick's arrivals for every active env, following `_spawn_vehicle`."""
+        n = self.num_envs
+        path = self.rng.integers(0, 2, n)
+        draws = self.rng.random((3, n))
+
+        # 1. Emergency vehicles only when none is on the road
+        allowed = active & ~self.emergency_present
+        ambulance = allowed & (draws[0] < self.ambulance_rate)
+        police = allowed & ~ambulance & (draws[1] < self.police_rate)
+
+        # 2. Regular cars
+        car = active & (draws[2] < self.car_rate)
+
+        emergency_envs = np.flatnonzero(ambulance | police)
+        car_envs = np.flatnonzero(car)
+        if len(emergency_envs) == 0 and len(car_envs) == 0:
+            return
+
+        # Same-env spawns keep their order: the emergency vehicle first, then the car
+        new_env = np.concatenate((emergency_envs, car_envs))
+        new_type = np.concatenate((np.where(ambulance[emergency_envs], TYPE_AMBULANCE, TYPE_POLICE),
+                                   np.full(len(car_envs), TYPE_CAR)))
+        self._insert_vehicles(2 * new_env + path[new_env], new_type)
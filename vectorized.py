@@ -0,0 +1,268 @@
+# vectorized.py
+# Struct-of-arrays vehicle store: every vehicle on an approach is advanced in one NumPy step.
+import random
+from collections import namedtuple
+import numpy as np
+import config
+from engine import SimulationEngine
+from scenario import default_scenario
+
+VEHICLE_TYPES = ('Car', 'Ambulance', 'Police')
+TYPE_CAR, TYPE_AMBULANCE, TYPE_POLICE = 0, 1, 2
+LANE_SPAN = 2.0 ** 32  # Separates lanes in the combined (lane, position) ordering key
+
+# A read-only snapshot of one vehicle in `VehicleArrays`, with the attributes `engine.Vehicle` has for it
+VehicleView = namedtuple('VehicleView', ('id', 'path', 'type', 'is_emergency', 'color', 'speed', 'width',
+                                         'height', 'x', 'y', 'wait_time', 'total_wait', 'is_waiting',
+                                         'is_moving'))
+
+
+def type_speeds(scenario):
+    """The speed of each vehicle type in `scenario`, indexed by type code."""
+    return np.array([scenario.speeds[name] for name in VEHICLE_TYPES])
+
+
+def advance(pos, length, speed, is_emergency, wait_time, has_leader, leader_pos, is_green, stop_pos,
+            min_gap=config.MIN_FOLLOW_DISTANCE):
+    """Applies one tick of `Vehicle.update` to a batch of vehicles.
+
+    Positions are measured along the direction of travel. `leader_pos` is the
+    position of each vehicle's leader *before* this tick, exactly like the
+    `cars_in_front[0]` lookup; `min_gap` is the following distance. Scalars
+    and arrays may be mixed freely.
+    Returns the new positions, wait times and waiting flags.
+    """
+    # `~` on a plain Python bool is integer negation, so force boolean arrays
+    is_green = np.asarray(is_green, dtype=bool)
+    is_emergency = np.asarray(is_emergency, dtype=bool)
+    has_leader = np.asarray(has_leader, dtype=bool)
+
+    # 1. Check for red light stop position
+    front = pos + length
+    is_at_stop_line = (pos < stop_pos) & (front + speed >= stop_pos)
+    red_stop = is_at_stop_line & ~is_green
+
+    # 2. Check for car in front stop
+    distance = leader_pos - front
+    car_in_front_stopping = has_leader & (distance < min_gap + speed)
+
+    # 3. Emergency vehicles run the red light IF they are the first car in queue.
+    runs_red = is_emergency & red_stop & ~has_leader
+    is_waiting = (red_stop | car_in_front_stopping) & ~runs_red
+
+    # 4. Apply movement: stop at the line, stop behind the leader, or drive on
+    stopped_pos = np.where(red_stop, stop_pos - length,
+                           leader_pos - length - min_gap)
+    new_pos = np.where(is_waiting, stopped_pos, pos + speed)
+
+    # 5. Update wait time
+    new_wait = np.where(is_waiting, wait_time + 1, 0)
+    return new_pos, new_wait, is_waiting
+
+
+class VehicleArrays:
+    """All vehicles of one approach as parallel arrays, ordered from rearmost to frontmost."""
+    FIELDS = {
+        'id': np.int64,
+        'x': np.float64,
+        'y': np.float64,
+        'speed': np.float64,
+        'wait_time': np.int64,
+        'total_wait': np.int64,
+        'type': np.int8,
+        'color': np.int8,
+        'is_emergency': np.bool_,
+        'is_waiting': np.bool_,
+    }
+
+    def __init__(self, path, scenario=None):
+        if scenario is None:
+            scenario = default_scenario()
+        self.path = path  # 'NS' or 'EW'
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+        # Every vehicle has the same footprint; EW vehicles are rotated
+        self.length = scenario.car_height
+        self.min_gap = scenario.min_follow_distance
+        self.stop_pos = scenario.stop_pos[path]
+        self.exit_pos = scenario.exit_pos[path]
+        x, y = scenario.spawn_pos[path]
+        self.lane_pos = x if path == 'NS' else y
+        self.size = scenario.vehicle_size[path]
+        self.type_speeds = type_speeds(scenario)
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def pos(self):
+        """Position along the direction of travel (y for NS, x for EW)."""
+        return self.y if self.path == 'NS' else self.x
+
+    def views(self):
+        """A `VehicleView` of every vehicle, rearmost first."""
+        width, height = self.size
+        emergency_colors = {TYPE_AMBULANCE: config.COLOR_AMBULANCE, TYPE_POLICE: config.COLOR_POLICE}
+        return [VehicleView(vehicle_id, self.path, VEHICLE_TYPES[type_code], is_emergency,
+                            emergency_colors.get(type_code) or config.VEHICLE_COLORS[color], speed,
+                            width, height, x, y, wait_time, total_wait, is_waiting, not is_waiting)
+                for vehicle_id, type_code, is_emergency, color, speed, x, y, wait_time, total_wait, is_waiting
+                in zip(self.id.tolist(), self.type.tolist(), self.is_emergency.tolist(), self.color.tolist(),
+                       self.speed.tolist(), self.x.tolist(), self.y.tolist(), self.wait_time.tolist(),
+                       self.total_wait.tolist(), self.is_waiting.tolist())]
+
+    def add(self, vehicle_id, vehicle_type, color):
+        """Inserts a vehicle at the start of the approach, keeping rear-to-front order."""
+        start = 0 - self.length
+        # Ties go in front of older vehicles, the same rule `engine.Lane.add` uses
+        index = int(np.searchsorted(self.pos, start, side='right'))
+        values = {
+            'id': vehicle_id,
+            'x': start if self.path == 'EW' else self.lane_pos,
+            'y': start if self.path == 'NS' else self.lane_pos,
+            'speed': self.type_speeds[vehicle_type],
+            'wait_time': 0,
+            'total_wait': 0,
+            'type': vehicle_type,
+            'color': color,
+            'is_emergency': vehicle_type != TYPE_CAR,
+            'is_waiting': False,
+        }
+        for name, value in values.items():
+            setattr(self, name, np.insert(getattr(self, name), index, value))
+
+    def step(self, is_green):
+        """Advances every vehicle by one tick and returns the mask of vehicles that left the screen."""
+        pos = self.pos
+        has_leader = np.ones(len(pos), dtype=bool)
+        has_leader[-1:] = False
+        leader_pos = np.empty_like(pos)
+        leader_pos[:-1] = pos[1:]
+        leader_pos[-1:] = np.inf
+
+        new_pos, self.wait_time, self.is_waiting = advance(
+            pos, self.length, self.speed, self.is_emergency, self.wait_time,
+            has_leader, leader_pos, is_green, self.stop_pos, self.min_gap)
+
+        if self.path == 'NS':
+            self.y = new_pos
+        else:
+            self.x = new_pos
+        return new_pos > self.exit_pos
+
+    def keep(self, mask):
+        """Drops every vehicle whose entry in `mask` is False."""
+        for name in self.FIELDS:
+            setattr(self, name, getattr(self, name)[mask])
+
+
+class FlatVehicleStore:
+    """Vehicles of many lanes in one set of flat arrays, ordered by lane, then rear to front.
+
+    For engines that advance every lane in one `advance` call. The lane of
+    each vehicle is in the array named by `LANE_FIELD`; vehicles enter at
+    position `-vehicle_length` with their speed from `type_speeds`, both set
+    by the subclass.
+    """
+    LANE_FIELD = 'lane'
+    FIELDS = {
+        'pos': np.float64,
+        'speed': np.float64,
+        'wait_time': np.int64,
+        'is_emergency': np.bool_,
+        'is_waiting': np.bool_,
+    }
+
+    def _clear_vehicles(self):
+        """Empties the store."""
+        setattr(self, self.LANE_FIELD, np.empty(0, dtype=np.int64))
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    def _insert_vehicles(self, new_lane, new_type):
+        """Adds vehicles of type codes `new_type` at the entry of lanes `new_lane`.
+
+        Vehicles bound for the same lane enter in the order given. They
+        normally join at the rear of their lane; if a queue has backed up past
+        the entry, a full ordered search places them instead, ties going in
+        front of older vehicles as in `engine.Lane.add`.
+        """
+        order = np.argsort(new_lane, kind='stable')
+        new_lane, new_type = new_lane[order], new_type[order]
+        new_pos = np.full(len(new_lane), 0.0 - self.vehicle_length)
+
+        lane = getattr(self, self.LANE_FIELD)
+        index = np.searchsorted(lane, new_lane, side='left')
+        rear = np.minimum(index, len(lane) - 1)
+        if len(lane) and np.any((lane[rear] == new_lane) & (self.pos[rear] <= new_pos)):
+            index = np.searchsorted(lane * LANE_SPAN + self.pos, new_lane * LANE_SPAN + new_pos, side='right')
+        setattr(self, self.LANE_FIELD, np.insert(lane, index, new_lane))
+        self.pos = np.insert(self.pos, index, new_pos)
+        self.speed = np.insert(self.speed, index, self.type_speeds[new_type])
+        self.wait_time = np.insert(self.wait_time, index, 0)
+        self.is_emergency = np.insert(self.is_emergency, index, new_type != TYPE_CAR)
+        self.is_waiting = np.insert(self.is_waiting, index, False)
+
+    def _keep(self, mask):
+        """Drops every vehicle whose entry in `mask` is False."""
+        for name in (self.LANE_FIELD, *self.FIELDS):
+            setattr(self, name, getattr(self, name)[mask])
+
+
+class VectorizedEngine(SimulationEngine):
+    """A headless engine that stores vehicles in `VehicleArrays` instead of `Vehicle` objects."""
+    lane_class = VehicleArrays
+
+    def _make_lane(self, path):
+        return self.lane_class(path, self.scenario)
+
+    def _add_vehicle(self, path, vehicle_type):
+        type_code = VEHICLE_TYPES.index(vehicle_type)
+        # Draw the color exactly as `Vehicle.__init__` does so both engines share one RNG stream
+        color = random.randrange(len(config.VEHICLE_COLORS)) if type_code == TYPE_CAR else -1
+        self.lanes[path].add(self.next_vehicle_id, type_code, color)
+        self.next_vehicle_id += 1
+
+    @property
+    def vehicles(self):
+        """A `VehicleView` of every vehicle currently on the road; changing them changes nothing."""
+        return [view for lane in self.lanes.values() for view in lane.views()]
+
+    def fast_forward(self, max_ticks):
+        """Event-driven jumps need `Lane` leader links; this engine always steps tick by tick."""
+        return 0, None
+
+    def _update_vehicles(self):
+        """Updates all vehicles, manages queues, and calculates rewards."""
+        self.intersection.ns_queue.clear()
+        self.intersection.ew_queue.clear()
+        self.emergency_vehicles_present = []
+
+        current_total_wait = 0
+        lights = {'NS': self.intersection.ns_light, 'EW': self.intersection.ew_light}
+        queues = {'NS': self.intersection.ns_queue, 'EW': self.intersection.ew_queue}
+
+        for path, lane in self.lanes.items():
+            if len(lane) == 0:
+                continue
+            self.emergency_vehicles_present.extend(
+                VEHICLE_TYPES[t] for t in lane.type[lane.is_emergency])
+
+            waited = lane.wait_time
+            exited = lane.step(lights[path].state == 'green')
+            lane.total_wait += np.where(lane.is_waiting, 0, waited)  # Waits that ended this tick
+
+            waiting_wait = lane.wait_time[lane.is_waiting]
+            current_total_wait += int(waiting_wait.sum())
+            queues[path].extend(lane.id[lane.is_waiting].tolist())
+
+            # Remove cars that are off-screen
+            if exited.any():
+                self.total_wait_time += int(lane.wait_time[exited].sum())
+                self.cars_passed += int(exited.sum())
+                if self.stats is not None:
+                    self.stats.record_exits(path, self.frame_count, lane.total_wait[exited])
+                lane.keep(~exited)
+
+        return -current_total_wait